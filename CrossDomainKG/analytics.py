@@ -0,0 +1,268 @@
+import time
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+from metrics import timed
+from models import db, Dataset, Entity, Relation, GraphAnalysis, EntityMetric
+from nlp.graph_builder import build_knowledge_graph
+
+PAGERANK_ALPHA = 0.85
+PAGERANK_TOL = 1e-8  # L1 change per node at which power iteration stops
+PAGERANK_MAX_ITER = 100
+# Source nodes sampled for approximate betweenness; exact when the graph is smaller
+BETWEENNESS_SAMPLES = 64
+BETWEENNESS_SEED = 42
+
+SORT_COLUMNS = {
+    'pagerank': EntityMetric.pagerank,
+    'degree': EntityMetric.degree,
+    'cross_domain_degree': EntityMetric.cross_domain_degree,
+    'betweenness': EntityMetric.betweenness,
+}
+
+def load_graph(datasets):
+    """build_knowledge_graph over the datasets, keeping only relations with both ends inside them"""
+    dataset_ids = [d.id for d in datasets]
+    entities = db.session.execute(
+        db.select(Entity.id, Entity.name, Entity.type, Entity.dataset_id)
+        .where(Entity.dataset_id.in_(dataset_ids))
+    ).all()
+    inside = db.select(Entity.id).where(Entity.dataset_id.in_(dataset_ids))
+    relations = db.session.execute(
+        db.select(Relation.entity1_id, Relation.entity2_id, Relation.relation_type,
+                  Relation.confidence, Relation.approved)
+        .where(Relation.dataset_id.in_(dataset_ids),
+               Relation.entity1_id.in_(inside), Relation.entity2_id.in_(inside))
+    ).all()
+    return build_knowledge_graph(entities, relations, {d.id: d.domain for d in datasets})
+
+def adjacency(G):
+    """Node list and symmetric CSR adjacency (weights = edge confidence) of an undirected graph"""
+    nodes = list(G.nodes())
+    position = {node: i for i, node in enumerate(nodes)}
+    n = len(nodes)
+    rows, cols, weights = [], [], []
+    for u, v, confidence in G.edges(data='confidence', default=1.0):
+        if u == v:
+            continue
+        rows.append(position[u])
+        cols.append(position[v])
+        weights.append(confidence if confidence is not None else 1.0)
+    rows, cols = np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64)
+    weights = np.array(weights, dtype=np.float64)
+    matrix = sparse.coo_matrix(
+        (np.concatenate([weights, weights]), (np.concatenate([rows, cols]), np.concatenate([cols, rows]))),
+        shape=(n, n)).tocsr()
+    return nodes, matrix
+
+def pagerank(matrix, alpha=PAGERANK_ALPHA, tol=PAGERANK_TOL, max_iter=PAGERANK_MAX_ITER):
+    """Weighted PageRank by power iteration on the sparse transition matrix"""
+    n = matrix.shape[0]
+    if n == 0:
+        return np.zeros(0)
+    out_weight = np.asarray(matrix.sum(axis=1)).ravel()
+    dangling = out_weight == 0
+    inverse = np.divide(1.0, out_weight, out=np.zeros(n), where=~dangling)
+    transition_t = (sparse.diags(inverse) @ matrix).T.tocsr()
+
+    rank = np.full(n, 1.0 / n)
+    for _ in range(max_iter):
+        previous = rank
+        rank = alpha * (transition_t @ rank + rank[dangling].sum() / n) + (1 - alpha) / n
+        if np.abs(rank - previous).sum() < n * tol:
+            break
+    return rank / rank.sum()
+
+def approximate_betweenness(matrix, samples=BETWEENNESS_SAMPLES, seed=BETWEENNESS_SEED):
+    """Brandes betweenness (unweighted, normalised like NetworkX) from sampled sources.
+
+    Every BFS level is one sparse matrix-vector product: shortest-path counts
+    flow forward level by level, dependencies flow back the same way.
+    """
+    n = matrix.shape[0]
+    if n <= 2:
+        return np.zeros(n)
+    pattern = matrix.copy()
+    pattern.data[:] = 1.0
+    k = min(samples, n)
+    sources = np.random.default_rng(seed).choice(n, size=k, replace=False) if k < n else np.arange(n)
+
+    centrality = np.zeros(n)
+    for source in sources:
+        sigma = np.zeros(n)
+        sigma[source] = 1.0
+        visited = np.zeros(n, dtype=bool)
+        visited[source] = True
+        levels = [np.array([source])]
+        frontier = np.zeros(n)
+        frontier[source] = 1.0
+        while True:
+            paths = pattern @ (frontier * sigma)
+            reached = (paths > 0) & ~visited
+            if not reached.any():
+                break
+            sigma[reached] = paths[reached]
+            visited |= reached
+            frontier = reached.astype(np.float64)
+            levels.append(np.flatnonzero(reached))
+
+        delta = np.zeros(n)
+        for depth in range(len(levels) - 1, 0, -1):
+            coefficient = np.zeros(n)
+            children = levels[depth]
+            coefficient[children] = (1.0 + delta[children]) / sigma[children]
+            parents = levels[depth - 1]
+            delta[parents] += sigma[parents] * (pattern @ coefficient)[parents]
+        delta[source] = 0.0
+        centrality += delta
+
+    return centrality * (n / k) / ((n - 1) * (n - 2))
+
+def compute_metrics(G):
+    """Per-node PageRank, degree, cross-domain degree, betweenness and component of a graph"""
+    nodes, matrix = adjacency(G)
+    n = len(nodes)
+    pattern = matrix.copy()
+    pattern.data[:] = 1.0
+    degree = np.asarray(pattern.sum(axis=1)).ravel().astype(np.int64)
+
+    # Neighbours whose domain differs: compare domain codes at both ends of every stored edge
+    domains = [G.nodes[node].get('domain') for node in nodes]
+    _, codes = np.unique(np.array([d or '' for d in domains], dtype=object), return_inverse=True)
+    coo = pattern.tocoo()
+    cross = codes[coo.row] != codes[coo.col]
+    cross_degree = np.bincount(coo.row[cross], minlength=n).astype(np.int64)
+
+    component_count, labels = connected_components(matrix, directed=False)
+    sizes = np.bincount(labels, minlength=component_count)
+    return {
+        'nodes': nodes,
+        'pagerank': pagerank(matrix),
+        'degree': degree,
+        'cross_domain_degree': cross_degree,
+        'betweenness': approximate_betweenness(matrix),
+        'component': labels,
+        'component_size': sizes[labels] if n else np.zeros(0, dtype=np.int64),
+        'component_count': int(component_count),
+        'edge_count': G.number_of_edges(),
+        'samples': min(BETWEENNESS_SAMPLES, n),
+    }
+
+def graph_signature(datasets):
+    """Changes whenever a dataset gets a new version or its entities or relations change"""
+    parts = []
+    for dataset in datasets:
+        entity_count, max_entity = db.session.execute(
+            db.select(db.func.count(Entity.id), db.func.max(Entity.id)).where(Entity.dataset_id == dataset.id)
+        ).one()
+        relation_count, max_relation = db.session.execute(
+            db.select(db.func.count(Relation.id), db.func.max(Relation.id)).where(Relation.dataset_id == dataset.id)
+        ).one()
+        parts.append(f'{dataset.id}:{dataset.version or 1}:{entity_count}:{max_entity or 0}:'
+                     f'{relation_count}:{max_relation or 0}')
+    return ','.join(parts)
+
+def run_analysis(user_id, datasets):
+    """Compute and store metrics for the datasets, replacing earlier runs of the same scope"""
+    datasets = sorted(datasets, key=lambda d: d.id)
+    scope = ','.join(str(d.id) for d in datasets)
+    start = time.perf_counter()
+    with timed('analytics'):
+        result = compute_metrics(load_graph(datasets))
+
+    for old in GraphAnalysis.query.filter_by(user_id=user_id, scope=scope).all():
+        db.session.execute(db.delete(EntityMetric).where(EntityMetric.analysis_id == old.id))
+        db.session.delete(old)
+
+    analysis = GraphAnalysis(
+        user_id=user_id,
+        dataset_id=datasets[0].id if len(datasets) == 1 else None,
+        scope=scope,
+        signature=graph_signature(datasets),
+        node_count=len(result['nodes']),
+        edge_count=result['edge_count'],
+        component_count=result['component_count'],
+        betweenness_samples=result['samples'],
+        seconds=round(time.perf_counter() - start, 4),
+    )
+    db.session.add(analysis)
+    db.session.flush()
+    if result['nodes']:
+        db.session.execute(db.insert(EntityMetric), [
+            {'analysis_id': analysis.id, 'entity_id': node, 'pagerank': float(pr), 'degree': int(deg),
+             'cross_domain_degree': int(cross), 'betweenness': float(btw),
+             'component': int(comp), 'component_size': int(size)}
+            for node, pr, deg, cross, btw, comp, size in zip(
+                result['nodes'], result['pagerank'], result['degree'], result['cross_domain_degree'],
+                result['betweenness'], result['component'], result['component_size'])
+        ])
+    db.session.commit()
+    return analysis
+
+def current_analysis(user_id, datasets):
+    """Last stored analysis of the datasets (None if never computed) and whether the graph changed since"""
+    datasets = sorted(datasets, key=lambda d: d.id)
+    scope = ','.join(str(d.id) for d in datasets)
+    analysis = GraphAnalysis.query.filter_by(user_id=user_id, scope=scope) \
+        .order_by(GraphAnalysis.id.desc()).first()
+    stale = analysis is None or analysis.signature != graph_signature(datasets)
+    return analysis, stale
+
+def refresh_scope(user_id, dataset_ids, force=False):
+    """Recompute the analysis of exactly these datasets if it is missing or stale"""
+    datasets = Dataset.query.filter(Dataset.id.in_(dataset_ids), Dataset.deleted.is_(False)).all()
+    if not datasets or len(datasets) != len(set(dataset_ids)):
+        return None
+    analysis, stale = current_analysis(user_id, datasets)
+    if force or stale:
+        analysis = run_analysis(user_id, datasets)
+    return analysis
+
+def refresh_analyses(user_id, dataset_ids=None):
+    """Bring the user's analyses up to date after the datasets changed (all datasets when None).
+
+    Covers each changed dataset on its own, the user's whole graph and every
+    stored scope that includes a changed dataset; runs on the background worker.
+    """
+    live_ids = db.session.execute(
+        db.select(Dataset.id).where(Dataset.user_id == user_id, Dataset.deleted.is_(False)).order_by(Dataset.id)
+    ).scalars().all()
+    changed = set(live_ids if dataset_ids is None else dataset_ids) & set(live_ids)
+    scopes = {(dataset_id,) for dataset_id in changed}
+    if live_ids:
+        scopes.add(tuple(live_ids))
+    for (scope,) in db.session.execute(db.select(GraphAnalysis.scope).where(GraphAnalysis.user_id == user_id)):
+        ids = tuple(int(i) for i in scope.split(',') if i)
+        if changed & set(ids):
+            scopes.add(ids)
+    for ids in sorted(scopes):
+        refresh_scope(user_id, ids)
+
+def ranked_entities(analysis, sort='pagerank', page=1, per_page=50, entity_type=None):
+    """One page of an analysis' entities, highest first by the sort metric; returns (rows, total)"""
+    column = SORT_COLUMNS[sort]
+    query = db.select(EntityMetric, Entity.name, Entity.type, Entity.dataset_id, Dataset.domain) \
+        .join(Entity, Entity.id == EntityMetric.entity_id) \
+        .join(Dataset, Dataset.id == Entity.dataset_id) \
+        .where(EntityMetric.analysis_id == analysis.id)
+    if entity_type:
+        query = query.where(Entity.type == entity_type)
+    total = db.session.execute(db.select(db.func.count()).select_from(query.subquery())).scalar()
+    rows = db.session.execute(
+        query.order_by(column.desc(), EntityMetric.entity_id).limit(per_page).offset((page - 1) * per_page)
+    ).all()
+    return [{
+        'entity_id': metric.entity_id,
+        'name': name,
+        'type': type,
+        'dataset_id': dataset_id,
+        'domain': domain,
+        'pagerank': round(metric.pagerank, 8),
+        'degree': metric.degree,
+        'cross_domain_degree': metric.cross_domain_degree,
+        'betweenness': round(metric.betweenness, 8),
+        'component': metric.component,
+        'component_size': metric.component_size,
+    } for metric, name, type, dataset_id, domain in rows], total
@@ -1,34 +1,55 @@
 import os
-import spacy
 import networkx as nx
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session
-from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
-from flask_sqlalchemy import SQLAlchemy
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, Response, stream_with_context
+from flask_login import LoginManager, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 from datetime import datetime
 import json
+import time
+from contextlib import contextmanager
 import numpy as np
 from pyvis.network import Network
 import secrets
-from difflib import SequenceMatcher
+
+import metrics
+import http_cache
+from http_cache import conditional_response
+from metrics import timed, record_stages, CROSS_DOMAIN_PAIRS, JOBS
+from models import db, User, Dataset, Entity, Relation, EntityEmbedding, ProcessingJob, ProfileReport, upgrade_schema, bump_dataset_versions, enable_sqlite_foreign_keys
+from profiling import profiled, profiling_requested
+from user_cache import get_user
+from ingestion import ingest_file
+from storage import save_upload, unpin_uploads, release_upload, adopt_legacy_uploads
+from cleanup import schedule_purge, resume_purges, run_in_background
+from analytics import current_analysis, refresh_analyses, refresh_scope, ranked_entities, SORT_COLUMNS
+from graph_io import export_graph, import_graph, detect_format, FORMATS as EXPORT_FORMATS, MIMETYPES, EXTENSIONS
+from graph_query import parse_facets, accessible_dataset_ids, filter_graph, facet_counts
+from paths import get_path_index, find_paths, describe_path, DEFAULT_MAX_HOPS, MAX_HOPS_LIMIT, DEFAULT_TIME_LIMIT, MAX_TIME_LIMIT, MAX_PATHS
+from linking import link_new_entities, index_entities, encode_names, load_entity_vectors, remove_from_index
 
 # NLP imports
 from nlp.preprocessing import preprocess_text
 from nlp.ner import extract_entities
 from nlp.relation_extraction import extract_relations
 from nlp.graph_builder import build_knowledge_graph, get_subgraph
-from nlp.semantic_search import semantic_search, initialize_encoder
+from nlp.semantic_search import semantic_search
+from nlp.model_registry import get_model, get_encoder, model_stats, preload
+from nlp.cross_domain import check_entity_similarity, cross_domain_relation_type
+from nlp.embedding_similarity import embedding_similarity_pairs
+from nlp.parallel_scoring import score_pairs_parallel
 
 # ============================================
 # 1. INITIALIZE FLASK APP FIRST (MOST IMPORTANT!)
 # ============================================
 app = Flask(__name__)
 app.config['SECRET_KEY'] = secrets.token_hex(16)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///knowledge_graph.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('KG_DATABASE_URI', 'sqlite:///knowledge_graph.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['UPLOAD_FOLDER'] = 'uploads'
+app.config['UPLOAD_FOLDER'] = os.environ.get('KG_UPLOAD_FOLDER', 'uploads')
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['CROSS_DOMAIN_MODE'] = os.environ.get('KG_CROSS_DOMAIN_MODE', 'string')  # string or embedding
+app.config['CROSS_DOMAIN_WORKERS'] = int(os.environ.get('KG_CROSS_DOMAIN_WORKERS', '1'))  # >1 scores on a process pool
 
 # Ensure upload folder exists
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
@@ -36,91 +57,28 @@ os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 # ============================================
 # 2. INITIALIZE DATABASE AND LOGIN MANAGER
 # ============================================
-db = SQLAlchemy(app)
+db.init_app(app)
+with app.app_context():
+    enable_sqlite_foreign_keys(db.engine)  # ON DELETE CASCADE on SQLite
+metrics.init_app(app, db)  # request latency, DB write timing and the /metrics endpoint
+http_cache.init_app(app)  # gzip/brotli for JSON and HTML responses
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
-# Load NLP models
-nlp = spacy.load("en_core_web_sm")
-encoder = initialize_encoder()
-
-# ============================================
-# 3. DATABASE MODELS
-# ============================================
-class User(UserMixin, db.Model):
-    __tablename__ = 'users'
-    
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(80), unique=True, nullable=False)
-    email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(200), nullable=False)
-    is_admin = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    
-    # Relationships
-    datasets = db.relationship('Dataset', backref='user', lazy=True, cascade='all, delete-orphan')
-    
-    def __repr__(self):
-        return f'<User {self.username}>'
-
-class Dataset(db.Model):
-    __tablename__ = 'datasets'
-    
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(200), nullable=False)
-    domain = db.Column(db.String(50), nullable=False)
-    filename = db.Column(db.String(200), nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
-    processed = db.Column(db.Boolean, default=False)
-    
-    # Relationships
-    entities = db.relationship('Entity', backref='dataset', lazy=True, cascade='all, delete-orphan')
-    relations = db.relationship('Relation', backref='dataset', lazy=True, cascade='all, delete-orphan')
-    
-    def __repr__(self):
-        return f'<Dataset {self.name}>'
-
-class Entity(db.Model):
-    __tablename__ = 'entities'
-    
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(200), nullable=False)
-    type = db.Column(db.String(50), nullable=False)
-    dataset_id = db.Column(db.Integer, db.ForeignKey('datasets.id'), nullable=False)
-    confidence = db.Column(db.Float, default=1.0)
-    merged_with = db.Column(db.Integer, nullable=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    
-    def __repr__(self):
-        return f'<Entity {self.name} ({self.type})>'
-
-class Relation(db.Model):
-    __tablename__ = 'relations'
-    
-    id = db.Column(db.Integer, primary_key=True)
-    entity1_id = db.Column(db.Integer, db.ForeignKey('entities.id'), nullable=False)
-    entity2_id = db.Column(db.Integer, db.ForeignKey('entities.id'), nullable=False)
-    relation_type = db.Column(db.String(100), nullable=False)
-    confidence = db.Column(db.Float, default=1.0)
-    dataset_id = db.Column(db.Integer, db.ForeignKey('datasets.id'), nullable=False)
-    approved = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    
-    # Relationships
-    entity1 = db.relationship('Entity', foreign_keys=[entity1_id])
-    entity2 = db.relationship('Entity', foreign_keys=[entity2_id])
-    
-    def __repr__(self):
-        return f'<Relation {self.entity1.name if self.entity1 else None} - {self.relation_type} - {self.entity2.name if self.entity2 else None}>'
+# NLP models are loaded lazily, once per process, through the model registry.
+# Set KG_PRELOAD_MODELS=1 when a pre-forking server imports the app (e.g. gunicorn --preload).
+SPACY_MODEL = ("en_core_web_sm", ("lemmatizer",))
+if os.environ.get('KG_PRELOAD_MODELS') == '1':
+    preload(SPACY_MODEL, encoder=True)
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # Runs on every authenticated request; served from a short-TTL cache
+    return get_user(int(user_id))
 
 # ============================================
-# 4. ALL ROUTES GO HERE (AFTER app IS DEFINED)
+# 3. ALL ROUTES GO HERE (AFTER app IS DEFINED)
 # ============================================
 
 @app.route('/')
@@ -173,7 +131,7 @@ def logout():
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    datasets = Dataset.query.filter_by(user_id=current_user.id).all()
+    datasets = Dataset.query.filter_by(user_id=current_user.id, deleted=False).all()
     
     # Calculate cross-domain stats
     cross_domain_datasets = 0
@@ -190,8 +148,10 @@ def dashboard():
     
     stats = {
         'total_datasets': len(datasets),
-        'total_entities': Entity.query.join(Dataset).filter(Dataset.user_id == current_user.id).count(),
-        'total_relations': Relation.query.join(Dataset).filter(Dataset.user_id == current_user.id).count(),
+        'total_entities': Entity.query.join(Dataset).filter(Dataset.user_id == current_user.id,
+                                                            Dataset.deleted.is_(False)).count(),
+        'total_relations': Relation.query.join(Dataset).filter(Dataset.user_id == current_user.id,
+                                                               Dataset.deleted.is_(False)).count(),
         'cross_domain_datasets': cross_domain_datasets,
         'cross_domain_relations': cross_domain_relations
     }
@@ -214,30 +174,52 @@ def upload():
             return redirect(request.url)
         
         if file and file.filename.endswith(('.txt', '.csv')):
-            filename = secure_filename(f"{current_user.id}_{datetime.now().timestamp()}_{file.filename}")
+            # Stored once per distinct content, however often it is uploaded
+            filename, content_hash = save_upload(file, app.config['UPLOAD_FOLDER'])
             filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(filepath)
             
-            # Create dataset record
-            dataset = Dataset(
-                name=file.filename,
-                domain=domain,
-                filename=filename,
-                user_id=current_user.id
-            )
-            db.session.add(dataset)
-            db.session.commit()
+            # Create dataset record, or a new version of an existing one
+            try:
+                dataset, is_new = get_or_create_dataset(file.filename, domain, filename, content_hash)
+                db.session.commit()
+            finally:
+                unpin_uploads([filename])
             
-            # Process the dataset
+            # Process the dataset (only new or changed chunks on re-upload)
             process_dataset(dataset.id, filepath)
             
-            flash('Dataset uploaded and processing started!')
+            if is_new:
+                flash('Dataset uploaded and processing started!')
+            else:
+                flash(f'Dataset updated to version {dataset.version}; only changed content was re-processed.')
             return redirect(url_for('dashboard'))
     
     return render_template('upload.html')
 
+def get_or_create_dataset(name, domain, filename, content_hash=None):
+    """Return the user's dataset with this name and domain, creating it if needed"""
+    dataset = Dataset.query.filter_by(user_id=current_user.id, name=name, domain=domain, deleted=False).first()
+    if dataset is None:
+        dataset = Dataset(
+            name=name,
+            domain=domain,
+            filename=filename,
+            content_hash=content_hash,
+            user_id=current_user.id
+        )
+        db.session.add(dataset)
+        return dataset, True
+    
+    # Re-upload: keep the dataset and its chunks, replace the stored file
+    if dataset.filename != filename:
+        release_upload(dataset.filename, app.config['UPLOAD_FOLDER'], keep_dataset_id=dataset.id)
+    dataset.filename = filename
+    dataset.content_hash = content_hash
+    dataset.version = (dataset.version or 1) + 1
+    return dataset, False
+
 # ============================================
-# 5. MULTI-FILE UPLOAD ROUTE (NOW app IS DEFINED)
+# 4. MULTI-FILE UPLOAD ROUTE (NOW app IS DEFINED)
 # ============================================
 @app.route('/upload_multi', methods=['GET', 'POST'])
 @login_required
@@ -257,36 +239,34 @@ def upload_multi():
             flash('Please select different domains for cross-domain processing', 'error')
             return redirect(request.url)
         
+        # Validate file extensions before anything is stored
+        for file in files:
+            if file and file.filename and not file.filename.endswith(('.txt', '.csv')):
+                flash(f'File {file.filename} must be .txt or .csv', 'error')
+                return redirect(request.url)
+        
         dataset_ids = []
         uploaded_files = []
+        stored = []
         
-        for i, file in enumerate(files):
-            if file and file.filename:
-                # Validate file extension
-                if not file.filename.endswith(('.txt', '.csv')):
-                    flash(f'File {file.filename} must be .txt or .csv', 'error')
-                    return redirect(request.url)
-                
-                # Secure filename and save
-                timestamp = datetime.now().timestamp()
-                filename = secure_filename(f"{current_user.id}_{timestamp}_{file.filename}")
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(filepath)
-                uploaded_files.append(filepath)
-                
-                # Create dataset record
-                dataset = Dataset(
-                    name=file.filename,
-                    domain=domains[i],
-                    filename=filename,
-                    user_id=current_user.id
-                )
-                db.session.add(dataset)
-                db.session.flush()
-                dataset_ids.append(dataset.id)
-        
-        # Commit to get dataset IDs
-        db.session.commit()
+        try:
+            for i, file in enumerate(files):
+                if file and file.filename:
+                    # Stored once per distinct content
+                    filename, content_hash = save_upload(file, app.config['UPLOAD_FOLDER'])
+                    stored.append(filename)
+                    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+                    uploaded_files.append(filepath)
+                    
+                    # Create dataset record, or a new version of an existing one
+                    dataset, _ = get_or_create_dataset(file.filename, domains[i], filename, content_hash)
+                    db.session.flush()
+                    dataset_ids.append(dataset.id)
+            
+            # Commit to get dataset IDs
+            db.session.commit()
+        finally:
+            unpin_uploads(stored)
         
         # Process all datasets and find cross-domain relations
         try:
@@ -301,13 +281,17 @@ def upload_multi():
     return render_template('upload_multi.html')
 
 # ============================================
-# 6. OTHER ROUTES (graph, search, admin, etc.)
+# 5. OTHER ROUTES (graph, search, admin, etc.)
 # ============================================
 
+def get_dataset_or_404(dataset_id):
+    """Dataset by id; datasets waiting for background deletion are already gone"""
+    return Dataset.query.filter_by(id=dataset_id, deleted=False).first_or_404()
+
 @app.route('/graph/<int:dataset_id>')
 @login_required
 def view_graph(dataset_id):
-    dataset = Dataset.query.get_or_404(dataset_id)
+    dataset = get_dataset_or_404(dataset_id)
     if dataset.user_id != current_user.id and not current_user.is_admin:
         flash('Access denied')
         return redirect(url_for('dashboard'))
@@ -317,31 +301,43 @@ def view_graph(dataset_id):
 @app.route('/api/graph/<int:dataset_id>')
 @login_required
 def get_graph_data(dataset_id):
-    dataset = Dataset.query.get_or_404(dataset_id)
-    
-    entities = Entity.query.filter_by(dataset_id=dataset_id).all()
-    relations = Relation.query.filter_by(dataset_id=dataset_id).all()
-    
-    nodes = []
-    for entity in entities:
-        nodes.append({
-            'id': entity.id,
-            'label': entity.name,
-            'type': entity.type,
-            'confidence': entity.confidence
-        })
-    
-    edges = []
-    for relation in relations:
-        edges.append({
-            'from': relation.entity1_id,
-            'to': relation.entity2_id,
-            'label': relation.relation_type,
-            'confidence': relation.confidence,
-            'approved': relation.approved
-        })
-    
-    return jsonify({'nodes': nodes, 'edges': edges})
+    """Graph of a dataset, optionally narrowed by the facet filters of /api/graph/filter.
+    Revalidated by ETag/Last-Modified: unchanged datasets answer 304 without rebuilding the graph."""
+    dataset = get_dataset_or_404(dataset_id)
+    if dataset.user_id != current_user.id and not current_user.is_admin:
+        return jsonify({'error': 'Access denied'}), 403
+    
+    try:
+        facets = parse_facets(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    def build():
+        nodes, edges = filter_graph([dataset.id], facets)
+        return {'nodes': nodes, 'edges': edges}
+    return conditional_response([dataset.id], build, 'graph')
+
+@app.route('/api/graph/filter')
+@login_required
+def filter_graph_data():
+    """Graph across the user's datasets filtered by any combination of facets:
+    dataset_ids, domains, types, relation_types, approved, min_confidence, confidence (buckets).
+    ?counts=1 adds the value counts of each facet over the selected datasets.
+    """
+    try:
+        facets = parse_facets(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    dataset_ids = accessible_dataset_ids(current_user, facets)
+    
+    def build():
+        nodes, edges = filter_graph(dataset_ids, facets)
+        result = {'dataset_ids': dataset_ids, 'nodes': nodes, 'edges': edges}
+        if request.args.get('counts') == '1':
+            result['facets'] = facet_counts(dataset_ids)
+        return result
+    return conditional_response(dataset_ids, build, 'filter')
 
 @app.route('/search', methods=['GET', 'POST'])
 @login_required
@@ -351,7 +347,7 @@ def search():
         dataset_id = request.form.get('dataset_id')
         
         if dataset_id:
-            dataset = Dataset.query.get(dataset_id)
+            dataset = get_dataset_or_404(dataset_id)
             if dataset.user_id != current_user.id and not current_user.is_admin:
                 return jsonify({'error': 'Access denied'})
             
@@ -360,11 +356,13 @@ def search():
             relations = Relation.query.filter_by(dataset_id=dataset_id).all()
             
             # Perform semantic search
-            results = semantic_search(query, entities, relations, encoder)
+            with profiled('semantic_search', profiling_requested(), dataset.id, context=(query or '')[:200]), \
+                    timed('semantic_search'):
+                results = semantic_search(query, entities, relations, get_encoder())
             
             return jsonify(results)
     
-    datasets = Dataset.query.filter_by(user_id=current_user.id, processed=True).all()
+    datasets = Dataset.query.filter_by(user_id=current_user.id, processed=True, deleted=False).all()
     return render_template('search.html', datasets=datasets)
 
 @app.route('/admin')
@@ -375,16 +373,18 @@ def admin():
         return redirect(url_for('dashboard'))
     
     users = User.query.all()
-    datasets = Dataset.query.all()
-    entities = Entity.query.all()
-    relations = Relation.query.all()
+    datasets = Dataset.query.filter_by(deleted=False).all()
+    # Rows of datasets waiting for the background purge are left out
+    entities = Entity.query.join(Dataset).filter(Dataset.deleted.is_(False)).all()
+    relations = Relation.query.join(Dataset).filter(Dataset.deleted.is_(False)).all()
     
     stats = {
         'total_users': len(users),
         'total_datasets': len(datasets),
         'total_entities': len(entities),
         'total_relations': len(relations),
-        'pending_relations': Relation.query.filter_by(approved=False).count()
+        'pending_relations': Relation.query.filter_by(approved=False)
+                             .join(Dataset).filter(Dataset.deleted.is_(False)).count()
     }
     
     return render_template('admin.html', users=users, datasets=datasets, 
@@ -393,44 +393,188 @@ def admin():
 @app.route('/api/dataset_stats/<int:dataset_id>')
 @login_required
 def dataset_stats(dataset_id):
-    dataset = Dataset.query.get_or_404(dataset_id)
+    dataset = get_dataset_or_404(dataset_id)
     if dataset.user_id != current_user.id and not current_user.is_admin:
         return jsonify({'error': 'Access denied'}), 403
     
-    # Get entity types
-    entity_types = {}
-    for entity in dataset.entities:
-        entity_types[entity.type] = entity_types.get(entity.type, 0) + 1
+    def build():
+        # Counted by the (dataset_id, type) indexes instead of loading every row
+        counts = facet_counts([dataset.id])
+        last_job = ProcessingJob.query.filter_by(dataset_id=dataset_id).order_by(ProcessingJob.id.desc()).first()
+        return {
+            'entity_types': counts['types'],
+            'relation_types': counts['relation_types'],
+            'last_job': last_job.to_dict() if last_job else None
+        }
+    return conditional_response([dataset.id], build, 'stats')
+
+@app.route('/api/dataset/<int:dataset_id>', methods=['DELETE'])
+@login_required
+def delete_dataset(dataset_id):
+    dataset = get_dataset_or_404(dataset_id)
+    if dataset.user_id != current_user.id and not current_user.is_admin:
+        return jsonify({'error': 'Access denied'}), 403
     
-    # Get relation types
-    relation_types = {}
-    for relation in dataset.relations:
-        relation_types[relation.relation_type] = relation_types.get(relation.relation_type, 0) + 1
+    # Other datasets' cross-domain relations into this one change with it
+    entity_ids = db.select(Entity.id).where(Entity.dataset_id == dataset.id)
+    linked = db.session.execute(
+        db.select(Relation.dataset_id).distinct()
+        .where(Relation.entity1_id.in_(entity_ids) | Relation.entity2_id.in_(entity_ids))
+    ).scalars().all()
+    bump_dataset_versions(set(linked) - {dataset.id})
     
+    # Hidden right away; rows, file and caches are purged in the background
+    dataset.deleted = True
+    db.session.commit()
+    schedule_purge(app, dataset.id)
+    
+    return jsonify({'success': True, 'status': 'deleting'}), 202
+
+def analytics_response(datasets):
+    """Sorted, paginated page of the last stored metrics of a dataset set.
+    
+    Never computes inline: a missing or stale analysis (or ?refresh=1) is
+    recomputed on the background worker and the stored one is served meanwhile.
+    """
+    sort = request.args.get('sort', 'pagerank')
+    if sort not in SORT_COLUMNS:
+        return jsonify({'error': f'sort must be one of {", ".join(SORT_COLUMNS)}'}), 400
+    try:
+        page = max(int(request.args.get('page', 1)), 1)
+        per_page = min(max(int(request.args.get('per_page', 50)), 1), 200)
+    except ValueError:
+        return jsonify({'error': 'page and per_page must be integers'}), 400
+    
+    analysis, stale = current_analysis(current_user.id, datasets)
+    refresh = request.args.get('refresh') == '1'
+    if stale or refresh:
+        dataset_ids = tuple(sorted(d.id for d in datasets))
+        run_in_background(app, refresh_scope, current_user.id, dataset_ids, refresh,
+                          key=('analysis', current_user.id, dataset_ids))
+    if analysis is None:
+        return jsonify({'analysis': None, 'stale': True, 'status': 'computing', 'entities': []}), 202
+    
+    entities, total = ranked_entities(analysis, sort, page, per_page, request.args.get('type'))
     return jsonify({
-        'entity_types': entity_types,
-        'relation_types': relation_types
+        'analysis': analysis.to_dict(),
+        'stale': stale,
+        'sort': sort,
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'entities': entities
     })
 
-@app.route('/api/dataset/<int:dataset_id>', methods=['DELETE'])
+@app.route('/api/analytics/<int:dataset_id>')
 @login_required
-def delete_dataset(dataset_id):
-    dataset = Dataset.query.get_or_404(dataset_id)
+def dataset_analytics(dataset_id):
+    """Most central entities of one dataset: ?sort=pagerank|degree|cross_domain_degree|betweenness"""
+    dataset = get_dataset_or_404(dataset_id)
     if dataset.user_id != current_user.id and not current_user.is_admin:
         return jsonify({'error': 'Access denied'}), 403
+    return analytics_response([dataset])
+
+@app.route('/api/analytics')
+@login_required
+def user_analytics():
+    """Most central entities across the user's datasets (or ?dataset_ids=1,2), cross-domain links included"""
+    query = Dataset.query.filter_by(user_id=current_user.id, deleted=False)
+    if request.args.get('dataset_ids'):
+        try:
+            ids = [int(i) for i in request.args['dataset_ids'].split(',') if i.strip()]
+        except ValueError:
+            return jsonify({'error': 'dataset_ids must be integers'}), 400
+        query = query.filter(Dataset.id.in_(ids))
+    datasets = query.all()
+    if not datasets:
+        return jsonify({'error': 'No datasets'}), 404
+    return analytics_response(datasets)
+
+@app.route('/api/paths')
+@login_required
+def find_entity_paths():
+    """Top-k paths between two entities (id or name) across the user's datasets:
+    ?source=&target=&k=3&mode=shortest|confidence&max_hops=4&cross_domain=1&time_limit=2"""
+    mode = request.args.get('mode', 'shortest')
+    if mode not in ('shortest', 'confidence'):
+        return jsonify({'error': 'mode must be shortest or confidence'}), 400
+    try:
+        k = min(max(int(request.args.get('k', 3)), 1), MAX_PATHS)
+        max_hops = min(max(int(request.args.get('max_hops', DEFAULT_MAX_HOPS)), 1), MAX_HOPS_LIMIT)
+        time_limit = min(max(float(request.args.get('time_limit', DEFAULT_TIME_LIMIT)), 0.01), MAX_TIME_LIMIT)
+    except ValueError:
+        return jsonify({'error': 'k, max_hops and time_limit must be numbers'}), 400
+    
+    index = get_path_index(current_user.id)
+    sources = index.resolve(request.args.get('source'))
+    targets = index.resolve(request.args.get('target'))
+    if not sources or not targets:
+        return jsonify({'error': 'Source or target entity not found'}), 404
+    
+    with timed('paths'):
+        paths, stats = find_paths(index, sources, targets, k=k, mode=mode, max_hops=max_hops,
+                                  cross_domain=request.args.get('cross_domain') == '1', time_limit=time_limit)
+    return jsonify({
+        'mode': mode,
+        'k': k,
+        'max_hops': max_hops,
+        'paths': [describe_path(index, path) for path in paths],
+        **stats
+    })
+
+@app.route('/api/export')
+@app.route('/api/export/<int:dataset_id>')
+@login_required
+def export_graph_data(dataset_id=None):
+    """Stream one dataset's graph, or all of the user's, as ?format=ndjson|parquet|arrow|graphml"""
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f'format must be one of {", ".join(EXPORT_FORMATS)}'}), 400
+    
+    if dataset_id is not None:
+        dataset = get_dataset_or_404(dataset_id)
+        if dataset.user_id != current_user.id and not current_user.is_admin:
+            return jsonify({'error': 'Access denied'}), 403
+        datasets = [dataset]
+        name = f'dataset_{dataset.id}'
+    else:
+        datasets = Dataset.query.filter_by(user_id=current_user.id, deleted=False).order_by(Dataset.id).all()
+        name = f'knowledge_graph_{current_user.id}'
     
-    # Delete file
     try:
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], dataset.filename)
-        if os.path.exists(filepath):
-            os.remove(filepath)
-    except:
-        pass
+        chunks = export_graph(datasets, fmt)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return Response(stream_with_context(chunks), mimetype=MIMETYPES[fmt],
+                    headers={'Content-Disposition': f'attachment; filename={name}.{EXTENSIONS[fmt]}'})
+
+@app.route('/api/import', methods=['POST'])
+@login_required
+def import_graph_data():
+    """Load an exported graph back as new datasets of the current user"""
+    file = request.files.get('file')
+    if not file or not file.filename:
+        return jsonify({'error': 'No file selected'}), 400
     
-    db.session.delete(dataset)
-    db.session.commit()
+    try:
+        fmt = request.form.get('format') or detect_format(file.filename)
+        # Entities are indexed as they are inserted, so later uploads link against them
+        importer, datasets = import_graph(file.stream, fmt, current_user.id,
+                                          default_domain=request.form.get('domain') or 'general',
+                                          name=secure_filename(file.filename), encoder=get_encoder())
+    except Exception as e:
+        print(f"Error importing graph: {e}")
+        db.session.rollback()
+        return jsonify({'error': f'Import failed: {e}'}), 400
+    schedule_analytics(current_user.id, [d.id for d in datasets])
     
-    return jsonify({'success': True})
+    return jsonify({
+        'success': True,
+        'datasets': [{'id': d.id, 'name': d.name, 'domain': d.domain} for d in datasets],
+        'entities': len(importer.entity_ids),
+        'relations': importer.relation_count,
+        'skipped_relations': importer.skipped_edges
+    })
 
 @app.route('/api/merge_entities', methods=['POST'])
 @login_required
@@ -456,6 +600,9 @@ def merge_entities():
         if rel.entity2_id == entity2_id:
             rel.entity2_id = entity1_id
     
+    entity1 = Entity.query.get(entity1_id)
+    bump_dataset_versions({entity2.dataset_id, entity1.dataset_id if entity1 else None}
+                          | {rel.dataset_id for rel in relations})
     db.session.commit()
     
     return jsonify({'success': True})
@@ -468,153 +615,197 @@ def approve_relation(relation_id):
     
     relation = Relation.query.get(relation_id)
     relation.approved = True
+    bump_dataset_versions([relation.dataset_id])
     db.session.commit()
     
     return jsonify({'success': True})
 
+@app.route('/api/models')
+@login_required
+def loaded_models():
+    if not current_user.is_admin:
+        return jsonify({'error': 'Access denied'}), 403
+    
+    return jsonify({'models': model_stats()})
+
+MAX_PROFILES_LISTED = 100
+
+@app.route('/api/admin/profiles')
+@login_required
+def list_profiles():
+    if not current_user.is_admin:
+        return jsonify({'error': 'Access denied'}), 403
+    
+    dataset_id = request.args.get('dataset_id', type=int)
+    limit = request.args.get('limit', type=int)
+    if (request.args.get('dataset_id') and dataset_id is None) or (request.args.get('limit') and limit is None):
+        return jsonify({'error': 'dataset_id and limit must be integers'}), 400
+    limit = min(max(limit or MAX_PROFILES_LISTED, 1), MAX_PROFILES_LISTED)
+    
+    query = ProfileReport.query
+    if dataset_id is not None:
+        query = query.filter_by(dataset_id=dataset_id)
+    reports = query.order_by(ProfileReport.id.desc()).limit(limit).all()
+    return jsonify({'profiles': [r.to_dict() for r in reports]})
+
+@app.route('/api/admin/profiles/<int:profile_id>')
+@login_required
+def view_profile(profile_id):
+    if not current_user.is_admin:
+        return jsonify({'error': 'Access denied'}), 403
+    
+    return jsonify(ProfileReport.query.get_or_404(profile_id).to_dict(full=True))
+
+@app.route('/api/admin/profiles/<int:profile_id>/download')
+@login_required
+def download_profile(profile_id):
+    """Raw .prof file for pstats/snakeviz, or ?format=txt for the text report"""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Access denied'}), 403
+    
+    report = ProfileReport.query.get_or_404(profile_id)
+    name = f'profile_{report.id}_{report.target}'
+    if request.args.get('format') == 'txt':
+        body = f"{report.stats_text}\nPeak traced memory: {report.peak_memory_bytes} bytes\n\n{report.memory_text}\n"
+        return Response(body, mimetype='text/plain',
+                        headers={'Content-Disposition': f'attachment; filename={name}.txt'})
+    return Response(report.profile_data, mimetype='application/octet-stream',
+                    headers={'Content-Disposition': f'attachment; filename={name}.prof'})
+
+@app.route('/api/admin/users/<int:user_id>/profiling', methods=['POST'])
+@login_required
+def set_user_profiling(user_id):
+    """Profile every upload and search of a user until switched off"""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Access denied'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    
+    user = User.query.get_or_404(user_id)
+    user.profiling_enabled = bool(data.get('enabled', True))
+    db.session.commit()
+    return jsonify({'success': True, 'profiling_enabled': user.profiling_enabled})
+
 # ============================================
-# 7. PROCESSING FUNCTIONS
+# 6. PROCESSING FUNCTIONS
 # ============================================
 
+@contextmanager
+def processing_job(dataset):
+    """Record one processing run of a dataset as a ProcessingJob with per-stage timings"""
+    job = ProcessingJob(dataset_id=dataset.id, status='processing', started_at=datetime.utcnow())
+    db.session.add(job)
+    bump_dataset_versions([dataset.id])
+    db.session.commit()
+    
+    relations_before = Relation.query.filter_by(dataset_id=dataset.id).count()
+    start = time.perf_counter()
+    with record_stages() as stages:
+        try:
+            yield job
+            job.status = 'completed'
+            job.progress = 100
+            # Net change: re-uploads also retract relations of removed chunks
+            job.relation_count = Relation.query.filter_by(dataset_id=dataset.id).count() - relations_before
+        except Exception as e:
+            db.session.rollback()
+            job.status = 'failed'
+            job.error_message = str(e)
+            raise
+        finally:
+            stages['total'] = time.perf_counter() - start
+            job.stage_timings = json.dumps({stage: round(seconds, 4) for stage, seconds in stages.items()})
+            job.completed_at = datetime.utcnow()
+            JOBS.labels(job.status).inc()
+            bump_dataset_versions([dataset.id])
+            db.session.commit()
+
+def schedule_analytics(user_id, dataset_ids=None):
+    """Recompute the user's graph analytics affected by changed datasets on the background worker"""
+    key = ('analytics', user_id, tuple(sorted(dataset_ids)) if dataset_ids is not None else None)
+    run_in_background(app, refresh_analyses, user_id, dataset_ids, key=key)
+
 def process_dataset(dataset_id, filepath):
-    """Process a single dataset"""
+    """Process a single dataset, returns the entities created by this run"""
     try:
         dataset = Dataset.query.get(dataset_id)
         
-        # Read file
-        with open(filepath, 'r', encoding='utf-8') as f:
-            text = f.read()
-        
-        # Preprocess
-        clean_text = preprocess_text(text)
-        
-        # Extract entities
-        doc = nlp(clean_text)
-        entity_objects = []
-        
-        for ent in doc.ents:
-            entity = Entity(
-                name=ent.text,
-                type=ent.label_,
-                dataset_id=dataset_id,
-                confidence=0.95
-            )
-            db.session.add(entity)
-            db.session.flush()
-            entity_objects.append(entity)
-        
-        # Extract relations
-        for sent in doc.sents:
-            for token in sent:
-                if token.dep_ in ('nsubj', 'nsubjpass') and token.head.pos_ == 'VERB':
-                    subject = token.text
-                    verb = token.head.text
-                    
-                    for child in token.head.children:
-                        if child.dep_ in ('dobj', 'attr', 'prep'):
-                            object_text = child.text
-                            
-                            entity1 = find_entity_in_text(subject, entity_objects)
-                            entity2 = find_entity_in_text(object_text, entity_objects)
-                            
-                            if entity1 and entity2:
-                                relation = Relation(
-                                    entity1_id=entity1.id,
-                                    entity2_id=entity2.id,
-                                    relation_type=verb,
-                                    confidence=0.85,
-                                    dataset_id=dataset_id
-                                )
-                                db.session.add(relation)
-        
-        dataset.processed = True
-        db.session.commit()
+        with profiled('process_dataset', profiling_requested(), dataset.id, context=dataset.name) as report, \
+                processing_job(dataset) as job:
+            if report:
+                report.job_id = job.id
+            
+            # Only new or changed chunks go through NLP
+            with timed('ingest'):
+                new_entities = ingest_file(dataset, filepath, get_model(*SPACY_MODEL))
+            
+            # Link the new entities against everything already indexed for the user
+            with timed('link'):
+                link_count = link_new_entities(dataset, new_entities, get_encoder())
+            if link_count:
+                print(f"Linked {link_count} cross-domain relations for dataset {dataset_id}")
+            
+            dataset.processed = True
+            job.entity_count = len(new_entities)
+        schedule_analytics(dataset.user_id, [dataset.id])
+        return new_entities
         
     except Exception as e:
         print(f"Error processing dataset: {e}")
         db.session.rollback()
-
-def find_entity_in_text(text, entities):
-    """Find entity by text match"""
-    text_lower = text.lower()
-    for entity in entities:
-        if text_lower in entity.name.lower() or entity.name.lower() in text_lower:
-            return entity
-    return None
+        return []
 
 def process_cross_domain_datasets(dataset_ids, filepaths):
     """Process multiple datasets and find cross-domain relationships"""
     try:
-        all_entities = []
+        new_entities_by_dataset = {}
         
         # First, process each dataset individually
         for idx, dataset_id in enumerate(dataset_ids):
             dataset = Dataset.query.get(dataset_id)
-            filepath = filepaths[idx]
-            
-            # Read file content
-            with open(filepath, 'r', encoding='utf-8') as f:
-                text = f.read()
-            
-            # Preprocess text
-            clean_text = preprocess_text(text)
-            
-            # Extract entities using spaCy
-            doc = nlp(clean_text)
-            entity_objects = []
-            
-            for ent in doc.ents:
-                entity = Entity(
-                    name=ent.text,
-                    type=ent.label_,
-                    dataset_id=dataset_id,
-                    confidence=0.95
-                )
-                db.session.add(entity)
-                db.session.flush()
-                entity_objects.append(entity)
-                all_entities.append(entity)
-            
-            # Extract relations within the same dataset
-            for sent in doc.sents:
-                for token in sent:
-                    if token.dep_ in ('nsubj', 'nsubjpass') and token.head.pos_ == 'VERB':
-                        subject = token.text
-                        verb = token.head.text
-                        
-                        for child in token.head.children:
-                            if child.dep_ in ('dobj', 'attr', 'prep'):
-                                object_text = child.text
-                                
-                                entity1 = find_entity_in_text(subject, entity_objects)
-                                entity2 = find_entity_in_text(object_text, entity_objects)
-                                
-                                if entity1 and entity2:
-                                    relation = Relation(
-                                        entity1_id=entity1.id,
-                                        entity2_id=entity2.id,
-                                        relation_type=verb,
-                                        confidence=0.85,
-                                        dataset_id=dataset_id,
-                                        approved=False
-                                    )
-                                    db.session.add(relation)
-            
-            dataset.processed = True
-            db.session.commit()
+            with processing_job(dataset) as job:
+                with timed('ingest'):
+                    new_entities = ingest_file(dataset, filepaths[idx], get_model(*SPACY_MODEL))
+                
+                dataset.processed = True
+                job.entity_count = len(new_entities)
+            new_entities_by_dataset[dataset_id] = [e.id for e in new_entities]
+        
+        # Now find CROSS-DOMAIN relationships, only for pairs involving new entities
+        new_entity_ids = {eid for ids in new_entities_by_dataset.values() for eid in ids}
+        all_entities = Entity.query.filter(Entity.dataset_id.in_(dataset_ids)).all()
+        with profiled('find_cross_domain_relations', profiling_requested(), dataset_ids[0],
+                      context=f'datasets {dataset_ids}'), timed('cross_domain'):
+            find_cross_domain_relations(all_entities, dataset_ids, new_entity_ids)
         
-        # Now find CROSS-DOMAIN relationships
-        find_cross_domain_relations(all_entities, dataset_ids)
+        # Then link each dataset against previously stored datasets of the user
+        for dataset_id in dataset_ids:
+            dataset = Dataset.query.get(dataset_id)
+            new_entities = Entity.query.filter(Entity.id.in_(new_entities_by_dataset[dataset_id])).all()
+            with timed('link'):
+                link_new_entities(dataset, new_entities, get_encoder(), exclude_dataset_ids=dataset_ids)
+            # Cross-domain and linked relations were added after its processing job ended
+            bump_dataset_versions([dataset_id])
+            db.session.commit()
         
         print(f"Cross-domain processing complete for {len(dataset_ids)} datasets")
+        schedule_analytics(dataset.user_id, dataset_ids)
         
     except Exception as e:
         print(f"Error in cross-domain processing: {e}")
         db.session.rollback()
         raise e
 
-def find_cross_domain_relations(all_entities, dataset_ids):
-    """Find relationships between entities from different domains"""
+def find_cross_domain_relations(all_entities, dataset_ids, new_entity_ids=None, mode=None):
+    """Find relationships between entities from different domains.
+    
+    When new_entity_ids is given, only pairs with at least one new entity are scored.
+    mode is 'string' (pairwise heuristic) or 'embedding' (vectorised top-k
+    candidates re-ranked by the string score) and defaults to CROSS_DOMAIN_MODE.
+    """
+    mode = mode or app.config['CROSS_DOMAIN_MODE']
     try:
         # Group entities by dataset
         entities_by_dataset = {}
@@ -623,62 +814,56 @@ def find_cross_domain_relations(all_entities, dataset_ids):
                 entities_by_dataset[entity.dataset_id] = []
             entities_by_dataset[entity.dataset_id].append(entity)
         
-        relation_count = 0
+        # Every name is encoded at most once for the whole run
+        vectors = load_entity_vectors(all_entities, get_encoder()) if mode == 'embedding' else None
         
         # Compare entities across different datasets
-        for i in range(len(dataset_ids)):
-            for j in range(i + 1, len(dataset_ids)):
-                dataset1_id = dataset_ids[i]
-                dataset2_id = dataset_ids[j]
+        dataset_pairs = [
+            (dataset_ids[i], dataset_ids[j])
+            for i in range(len(dataset_ids))
+            for j in range(i + 1, len(dataset_ids))
+        ]
+        
+        for d1, d2 in dataset_pairs:
+            CROSS_DOMAIN_PAIRS.labels(mode).observe(
+                len(entities_by_dataset.get(d1, [])) * len(entities_by_dataset.get(d2, [])))
+        
+        workers = app.config['CROSS_DOMAIN_WORKERS']
+        if vectors is None and workers > 1:
+            scored_pairs = score_entity_pairs_parallel(entities_by_dataset, dataset_pairs, new_entity_ids, workers)
+        else:
+            scored_pairs = (
+                score_entity_pairs(entities_by_dataset.get(d1, []), entities_by_dataset.get(d2, []),
+                                   vectors, new_entity_ids)
+                for d1, d2 in dataset_pairs
+            )
+        
+        relation_count = 0
+        
+        for (dataset1_id, _), candidates in zip(dataset_pairs, scored_pairs):
+            # Look for potential cross-domain relationships
+            for entity1, entity2, similarity in candidates:
+                relation_type = cross_domain_relation_type(entity1, entity2, similarity)
+                if not relation_type:
+                    continue
                 
-                entities1 = entities_by_dataset.get(dataset1_id, [])
-                entities2 = entities_by_dataset.get(dataset2_id, [])
+                # Check if relation already exists
+                existing = Relation.query.filter(
+                    ((Relation.entity1_id == entity1.id) & (Relation.entity2_id == entity2.id)) |
+                    ((Relation.entity1_id == entity2.id) & (Relation.entity2_id == entity1.id))
+                ).first()
                 
-                # Look for potential cross-domain relationships
-                for entity1 in entities1:
-                    for entity2 in entities2:
-                        # Check for semantic similarity
-                        similarity = check_entity_similarity(entity1.name, entity2.name)
-                        
-                        if similarity > 0.7:  # High similarity - likely same concept
-                            # Check if relation already exists
-                            existing = Relation.query.filter(
-                                ((Relation.entity1_id == entity1.id) & (Relation.entity2_id == entity2.id)) |
-                                ((Relation.entity1_id == entity2.id) & (Relation.entity2_id == entity1.id))
-                            ).first()
-                            
-                            if not existing:
-                                relation = Relation(
-                                    entity1_id=entity1.id,
-                                    entity2_id=entity2.id,
-                                    relation_type='same_as',
-                                    confidence=similarity,
-                                    dataset_id=dataset1_id,
-                                    approved=False
-                                )
-                                db.session.add(relation)
-                                relation_count += 1
-                        
-                        elif similarity > 0.4:  # Medium similarity - possible relation
-                            relation_type = infer_cross_domain_relation(entity1, entity2)
-                            if relation_type:
-                                # Check if relation already exists
-                                existing = Relation.query.filter(
-                                    ((Relation.entity1_id == entity1.id) & (Relation.entity2_id == entity2.id)) |
-                                    ((Relation.entity1_id == entity2.id) & (Relation.entity2_id == entity1.id))
-                                ).first()
-                                
-                                if not existing:
-                                    relation = Relation(
-                                        entity1_id=entity1.id,
-                                        entity2_id=entity2.id,
-                                        relation_type=relation_type,
-                                        confidence=similarity,
-                                        dataset_id=dataset1_id,
-                                        approved=False
-                                    )
-                                    db.session.add(relation)
-                                    relation_count += 1
+                if not existing:
+                    relation = Relation(
+                        entity1_id=entity1.id,
+                        entity2_id=entity2.id,
+                        relation_type=relation_type,
+                        confidence=similarity,
+                        dataset_id=dataset1_id,
+                        approved=False
+                    )
+                    db.session.add(relation)
+                    relation_count += 1
         
         db.session.commit()
         print(f"Created {relation_count} cross-domain relations")
@@ -688,96 +873,98 @@ def find_cross_domain_relations(all_entities, dataset_ids):
         db.session.rollback()
         raise e
 
-def check_entity_similarity(name1, name2):
-    """Check if two entity names are similar"""
-    if not name1 or not name2:
-        return 0.0
-    
-    name1 = name1.lower().strip()
-    name2 = name2.lower().strip()
+def score_entity_pairs(entities1, entities2, vectors=None, new_entity_ids=None):
+    """Yield (entity1, entity2, similarity) for candidate pairs of two datasets.
     
-    # Exact match
-    if name1 == name2:
-        return 1.0
-    
-    # Direct string similarity
-    direct_similarity = SequenceMatcher(None, name1, name2).ratio()
-    
-    # Check if one is substring of another
-    if name1 in name2 or name2 in name1:
-        substring_boost = 0.2
+    With new_entity_ids, pairs of two already stored entities are never scored.
+    """
+    if new_entity_ids is None:
+        new1, old1, new2 = entities1, [], entities2
     else:
-        substring_boost = 0
-    
-    # Check for word overlap
-    words1 = set(name1.split())
-    words2 = set(name2.split())
-    if words1 and words2:
-        word_overlap = len(words1.intersection(words2)) / max(len(words1), len(words2))
-        word_boost = word_overlap * 0.1
-    else:
-        word_boost = 0
-    
-    final_score = min(direct_similarity + substring_boost + word_boost, 1.0)
-    return final_score
-
-def infer_cross_domain_relation(entity1, entity2):
-    """Infer possible relation between entities from different domains"""
-    
-    # Common cross-domain relation patterns
-    relation_patterns = [
-        ('PERSON', 'ORG', 'works_for'),
-        ('PERSON', 'GPE', 'lives_in'),
-        ('ORG', 'GPE', 'located_in'),
-        ('PRODUCT', 'ORG', 'produced_by'),
-        ('TECHNOLOGY', 'SCIENCE', 'based_on'),
-        ('DISEASE', 'MEDICINE', 'treated_by'),
-        ('LAW', 'COUNTRY', 'applicable_in'),
-        ('PERSON', 'PRODUCT', 'invented'),
-        ('ORG', 'PRODUCT', 'develops'),
-        ('SCIENCE', 'TECHNOLOGY', 'enables')
+        new1 = [e for e in entities1 if e.id in new_entity_ids]
+        old1 = [e for e in entities1 if e.id not in new_entity_ids]
+        new2 = [e for e in entities2 if e.id in new_entity_ids]
+    
+    if vectors is None:
+        for entity1 in new1:
+            for entity2 in entities2:
+                yield entity1, entity2, check_entity_similarity(entity1.name, entity2.name)
+        for entity1 in old1:
+            for entity2 in new2:
+                yield entity1, entity2, check_entity_similarity(entity1.name, entity2.name)
+        return
+    
+    # Only new entities are used as queries: new ones of the first dataset against all
+    # of the second, then new ones of the second against the old ones of the first
+    yield from embedding_candidates(new1, entities2, vectors)
+    for entity2, entity1, similarity in embedding_candidates(new2, old1, vectors):
+        yield entity1, entity2, similarity
+
+def embedding_candidates(queries, keys, vectors):
+    """(query entity, key entity, similarity) of the embedding top-k candidates of each query"""
+    if not queries or not keys:
+        return
+    pairs = embedding_similarity_pairs(
+        [e.name for e in queries], [vectors[e.id] for e in queries],
+        [e.name for e in keys], [vectors[e.id] for e in keys]
+    )
+    for i, j, similarity in pairs:
+        yield queries[i], keys[j], similarity
+
+def score_entity_pairs_parallel(entities_by_dataset, dataset_pairs, new_entity_ids, max_workers):
+    """Process-pool counterpart of score_entity_pairs, one candidate list per dataset pair"""
+    dataset_keys = {d for pair in dataset_pairs for d in pair}
+    
+    # Workers only receive plain name tuples and new-entity flags, never ORM objects
+    name_lists = {d: tuple(e.name for e in entities_by_dataset.get(d, [])) for d in dataset_keys}
+    new_masks = None
+    if new_entity_ids is not None:
+        new_masks = {
+            d: bytes(e.id in new_entity_ids for e in entities_by_dataset.get(d, []))
+            for d in dataset_keys
+        }
+    
+    results = score_pairs_parallel(name_lists, dataset_pairs, new_masks, max_workers)
+    return [
+        [(entities_by_dataset[d1][i], entities_by_dataset[d2][j], score) for i, j, score in pair_results]
+        for (d1, d2), pair_results in zip(dataset_pairs, results)
     ]
-    
-    for type1, type2, relation in relation_patterns:
-        if (entity1.type == type1 and entity2.type == type2):
-            return relation
-        elif (entity1.type == type2 and entity2.type == type1):
-            return reverse_relation(relation)
-    
-    return None
-
-def reverse_relation(relation):
-    """Get reverse of a relation"""
-    reversals = {
-        'works_for': 'employs',
-        'lives_in': 'has_resident',
-        'located_in': 'contains',
-        'produced_by': 'produces',
-        'based_on': 'used_in',
-        'treated_by': 'treats',
-        'applicable_in': 'has_law',
-        'invented': 'was_invented_by',
-        'develops': 'developed_by',
-        'enables': 'enabled_by'
-    }
-    return reversals.get(relation, 'related_to')
+
+def index_unindexed_entities():
+    """Backfill the linking index for entities stored before it existed"""
+    indexed = db.select(EntityEmbedding.entity_id)
+    for dataset in Dataset.query.filter_by(deleted=False).all():
+        entities = Entity.query.filter(Entity.dataset_id == dataset.id, Entity.id.not_in(indexed)).all()
+        if entities:
+            vectors = encode_names([e.name for e in entities], get_encoder())
+            remove_from_index(e.id for e in entities)
+            index_entities(dataset, entities, vectors)
+    db.session.commit()
 
 # ============================================
-# 8. RUN THE APPLICATION
+# 7. RUN THE APPLICATION
 # ============================================
+def init_db():
+    """Create tables, apply schema upgrades and make sure the admin user exists"""
+    db.create_all()
+    upgrade_schema()
+    adopt_legacy_uploads(app.config['UPLOAD_FOLDER'])
+    index_unindexed_entities()
+    resume_purges(app)
+    
+    # Create admin user if not exists
+    if not User.query.filter_by(email='admin@example.com').first():
+        admin = User(
+            username='admin',
+            email='admin@example.com',
+            password_hash=generate_password_hash('admin123'),
+            is_admin=True
+        )
+        db.session.add(admin)
+        db.session.commit()
+
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
-        
-        # Create admin user if not exists
-        if not User.query.filter_by(email='admin@example.com').first():
-            admin = User(
-                username='admin',
-                email='admin@example.com',
-                password_hash=generate_password_hash('admin123'),
-                is_admin=True
-            )
-            db.session.add(admin)
-            db.session.commit()
+        init_db()
     
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,108 @@
+"""Compare the array-based relation engine with the token loop it replaced.
+
+Parses the text part of the synthetic corpus once, then times both
+extractors over the same Docs and checks they produce identical relations:
+
+    python benchmarks/bench_relations.py --rows 5000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from corpus import generate_corpus
+from ingestion import iter_chunks
+from nlp.preprocessing import preprocess_text
+from nlp.relation_extraction import doc_relations, find_entity, relation_triples_many
+
+class _Entity:
+    def __init__(self, name):
+        self.name = name
+
+def legacy_relations(doc, entities):
+    """The per-token loop relation extraction used before the array engine"""
+    relations = []
+    for sent in doc.sents:
+        for token in sent:
+            if token.dep_ in ('nsubj', 'nsubjpass') and token.head.pos_ == 'VERB':
+                subject = token.text
+                verb = token.head.text
+                for child in token.head.children:
+                    if child.dep_ in ('dobj', 'attr', 'prep'):
+                        entity1 = find_entity(subject, entities)
+                        entity2 = find_entity(child.text, entities)
+                        if entity1 and entity2:
+                            relations.append({
+                                'entity1': entity1,
+                                'entity2': entity2,
+                                'type': verb,
+                                'confidence': 0.85
+                            })
+    return relations
+
+def engine_relations_many(docs, entities):
+    """The array engine as ingestion runs it: triples for the whole batch, then per-Doc matching"""
+    triples = relation_triples_many(docs)
+    return [doc_relations(doc, ents, triples=t) for doc, ents, t in zip(docs, entities, triples)]
+
+def legacy_relations_many(docs, entities):
+    return [legacy_relations(doc, ents) for doc, ents in zip(docs, entities)]
+
+def _key(relations):
+    return [(r['entity1'].name, r['entity2'].name, r['type'], r['confidence']) for r in relations]
+
+def relation_benchmark(docs, repeat=3):
+    """Best-of-repeat seconds of both extractors over parsed Docs, and whether their output matches"""
+    entities = [[_Entity(ent.text) for ent in doc.ents] for doc in docs]
+    results = {}
+    for name, extract in (('legacy', legacy_relations_many), ('engine', engine_relations_many)):
+        best, output = None, None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            output = extract(docs, entities)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[name] = (best, output)
+
+    legacy_seconds, legacy_output = results['legacy']
+    seconds, output = results['engine']
+    mismatches = sum(_key(a) != _key(b) for a, b in zip(legacy_output, output))
+    return {
+        'seconds': round(seconds, 4),
+        'legacy_seconds': round(legacy_seconds, 4),
+        'speedup': round(legacy_seconds / seconds, 2) if seconds else None,
+        'docs': len(docs),
+        'tokens': sum(len(doc) for doc in docs),
+        'relations': sum(len(r) for r in output),
+        'mismatched_docs': mismatches,
+    }
+
+def parse_corpus(nlp_model, path):
+    return list(nlp_model.pipe(preprocess_text(text) for text in iter_chunks(path)))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--model', default='en_core_web_sm')
+    args = parser.parse_args()
+
+    from nlp.model_registry import get_model
+
+    with tempfile.TemporaryDirectory(prefix='kg_bench_') as work_dir:
+        corpus = generate_corpus(work_dir, args.rows, args.seed)
+        docs = parse_corpus(get_model(args.model, ('lemmatizer',)), corpus['text'])
+    result = relation_benchmark(docs, args.repeat)
+    print(json.dumps(result, indent=2))
+    if result['mismatched_docs']:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
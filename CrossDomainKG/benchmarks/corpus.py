@@ -0,0 +1,110 @@
+"""Seeded synthetic cross-domain corpus shaped like the files in uploads/.
+
+Healthcare and AI CSVs share doctors, hospitals and diseases so that
+cross-domain linking has real work to do. Free text uses the same
+vocabulary in short sentences for the NLP path.
+
+    python benchmarks/corpus.py --rows 10000 --out /tmp/kg_corpus
+"""
+import argparse
+import csv
+import os
+import random
+from datetime import date, timedelta
+
+FIRST_NAMES = ['Arjun', 'Neha', 'Ravi', 'Pooja', 'Amit', 'Kiran', 'Sunil', 'Meera', 'Rahul', 'Anita',
+               'Vikram', 'Priya', 'Sanjay', 'Divya', 'Rohan', 'Kavya', 'Manish', 'Sneha', 'Aditya', 'Isha']
+LAST_NAMES = ['Mehta', 'Singh', 'Patel', 'Desai', 'Verma', 'Nair', 'Gupta', 'Kulkarni', 'Jain', 'Roy',
+              'Reddy', 'Shah', 'Das', 'Bose', 'Chopra', 'Malhotra', 'Pillai', 'Iyer', 'Menon', 'Rao']
+DOCTORS = ['Dr. Sharma', 'Dr. Rao', 'Dr. Iyer', 'Dr. Kapoor', 'Dr. Joshi', 'Dr. Menon', 'Dr. Banerjee',
+           'Dr. Reddy', 'Dr. Ghosh', 'Dr. Saxena', 'Dr. Fernandes', 'Dr. Khan']
+HOSPITALS = ['CityCare Hospital', 'Metro Health', 'Sunrise Clinic', 'Wellness Center', 'Apollo Care',
+             'Lifeline Hospital', 'Green Valley Clinic', 'Unity Medical']
+TREATMENTS = [('Diabetes', 'Metformin'), ('Hypertension', 'Amlodipine'), ('Asthma', 'Salbutamol'),
+              ('Migraine', 'Sumatriptan'), ('Heart Disease', 'Aspirin'), ('Arthritis', 'Ibuprofen'),
+              ('Depression', 'Sertraline'), ('Thyroid Disorder', 'Levothyroxine'),
+              ('Cholesterol', 'Atorvastatin'), ('Anemia', 'Iron Supplements')]
+ALGORITHMS = ['CNN', 'Random Forest', 'RNN', 'NLP', 'Reinforcement Learning', 'Decision Tree', 'SVM',
+              'Gradient Boosting', 'Naive Bayes', 'Transformer']
+APPLICATIONS = ['Detection', 'Risk Prediction', 'Patient Monitoring', 'Symptom Analysis', 'Management']
+TECHNOLOGIES = ['AI-Powered {} Monitor', 'AI {} Tracker', 'Smart {} Assistant', 'AI {} Analyzer']
+
+HEALTHCARE_HEADER = ['PatientID', 'Name', 'Age', 'Gender', 'Diagnosis', 'Medication', 'Doctor',
+                     'VisitDate', 'Hospital', 'Cost']
+AI_HEADER = ['ProjectID', 'ProjectName', 'Domain', 'Algorithm', 'ApplicationArea', 'TechnologyUsed',
+             'LeadResearcher', 'Institution', 'Year']
+
+def healthcare_rows(rows, rng):
+    start = date(2026, 1, 1)
+    for i in range(rows):
+        diagnosis, medication = rng.choice(TREATMENTS)
+        yield [
+            f'P{i + 1:07d}',
+            f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+            rng.randint(18, 90),
+            rng.choice('MF'),
+            diagnosis,
+            medication,
+            rng.choice(DOCTORS),
+            (start + timedelta(days=rng.randint(0, 364))).isoformat(),
+            rng.choice(HOSPITALS),
+            rng.randint(5, 300) * 10,
+        ]
+
+def ai_rows(rows, rng):
+    for i in range(rows):
+        diagnosis, _ = rng.choice(TREATMENTS)
+        yield [
+            f'A{i + 1:07d}',
+            f'{diagnosis.split()[0]}{rng.choice(["AI", "Vision", "Predict", "Care", "Track"])}{i + 1}',
+            'Healthcare',
+            rng.choice(ALGORITHMS),
+            f'{diagnosis} {rng.choice(APPLICATIONS)}',
+            rng.choice(TECHNOLOGIES).format(diagnosis.split()[0]),
+            rng.choice(DOCTORS),
+            rng.choice(HOSPITALS),
+            rng.randint(2018, 2026),
+        ]
+
+def text_paragraphs(paragraphs, rng):
+    for _ in range(paragraphs):
+        diagnosis, medication = rng.choice(TREATMENTS)
+        doctor, hospital = rng.choice(DOCTORS), rng.choice(HOSPITALS)
+        yield (
+            f'{doctor} treats {diagnosis} patients at {hospital}. '
+            f'{hospital} prescribes {medication} for {diagnosis}. '
+            f'Researchers at {hospital} use {rng.choice(ALGORITHMS)} to study {diagnosis}.'
+        )
+
+def write_csv(path, header, rows):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+    return path
+
+def generate_corpus(out_dir, rows, seed=42):
+    """Write healthcare.csv, AI.csv and notes.txt with `rows` records each; returns their paths"""
+    os.makedirs(out_dir, exist_ok=True)
+    rng = random.Random(seed)
+
+    paths = {
+        'healthcare': write_csv(os.path.join(out_dir, 'healthcare.csv'), HEALTHCARE_HEADER,
+                                healthcare_rows(rows, rng)),
+        'ai': write_csv(os.path.join(out_dir, 'AI.csv'), AI_HEADER, ai_rows(rows, rng)),
+        'text': os.path.join(out_dir, 'notes.txt'),
+    }
+    with open(paths['text'], 'w', encoding='utf-8') as f:
+        for paragraph in text_paragraphs(rows, rng):
+            f.write(paragraph + '\n\n')
+    return paths
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out', default='benchmark_corpus')
+    args = parser.parse_args()
+
+    for kind, path in generate_corpus(args.out, args.rows, args.seed).items():
+        print(f'{kind}: {path}')
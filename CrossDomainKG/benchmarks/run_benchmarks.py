@@ -0,0 +1,163 @@
+"""Time ingestion, cross-domain linking, semantic search and /api/graph.
+
+Runs against a throw-away SQLite database and a seeded synthetic corpus,
+and writes JSON that can be compared across commits:
+
+    python benchmarks/run_benchmarks.py --rows 1000 10000 --output bench.json
+    python benchmarks/run_benchmarks.py --rows 1000 --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(HERE)
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, HERE)
+
+from bench_relations import parse_corpus, relation_benchmark
+from corpus import generate_corpus
+from linking import clear_embedding_cache
+from user_cache import clear_user_cache
+
+SEARCH_QUERIES = ['diabetes treatment', 'hospital in the city', 'machine learning for heart disease']
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=APP_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def run_size(kg, rows, seed, work_dir):
+    """Run every benchmark for one corpus size inside a fresh database"""
+    app, db = kg.app, kg.db
+    corpus = generate_corpus(os.path.join(work_dir, f'corpus_{rows}'), rows, seed)
+    results = {}
+
+    with app.app_context():
+        db.drop_all()
+        clear_embedding_cache()
+        clear_user_cache()
+        kg.init_db()
+        user = kg.User(username='bench', email='bench@example.com',
+                       password_hash=kg.generate_password_hash('bench'))
+        db.session.add(user)
+        db.session.commit()
+
+        datasets = {}
+        for kind, domain in (('healthcare', 'healthcare'), ('ai', 'technology'), ('text', 'healthcare')):
+            dataset = kg.Dataset(name=os.path.basename(corpus[kind]), domain=domain,
+                                 filename=corpus[kind], user_id=user.id)
+            db.session.add(dataset)
+            db.session.commit()
+            datasets[kind] = dataset.id
+
+            _, seconds = timed(kg.process_dataset, dataset.id, corpus[kind])
+            results[f'ingest_{kind}'] = {
+                'seconds': round(seconds, 4),
+                'rows_per_second': round(rows / seconds, 1) if seconds else None,
+                'entities': kg.Entity.query.filter_by(dataset_id=dataset.id).count(),
+                'relations': kg.Relation.query.filter_by(dataset_id=dataset.id).count(),
+            }
+
+        # Array relation engine against the token loop, on the same parsed text
+        docs = parse_corpus(kg.get_model(*kg.SPACY_MODEL), corpus['text'])
+        results['relation_extraction'] = relation_benchmark(docs)
+
+        # Cross-domain linking over the two CSV datasets, for every configured mode
+        pair = [datasets['healthcare'], datasets['ai']]
+        entities = kg.Entity.query.filter(kg.Entity.dataset_id.in_(pair)).all()
+        for mode in ('string', 'embedding'):
+            before = kg.Relation.query.count()
+            _, seconds = timed(kg.find_cross_domain_relations, entities, pair, None, mode)
+            results[f'cross_domain_{mode}'] = {
+                'seconds': round(seconds, 4),
+                'entities': len(entities),
+                'relations_created': kg.Relation.query.count() - before,
+            }
+
+        dataset_id = datasets['healthcare']
+        entities = kg.Entity.query.filter_by(dataset_id=dataset_id).all()
+        relations = kg.Relation.query.filter_by(dataset_id=dataset_id).all()
+        encoder = kg.get_encoder()
+        search_times = []
+        for query in SEARCH_QUERIES:
+            _, seconds = timed(kg.semantic_search, query, entities, relations, encoder)
+            search_times.append(seconds)
+        results['semantic_search'] = {
+            'seconds_mean': round(sum(search_times) / len(search_times), 4),
+            'seconds_max': round(max(search_times), 4),
+            'entities': len(entities),
+            'relations': len(relations),
+        }
+
+    client = app.test_client()
+    client.post('/login', data={'email': 'bench@example.com', 'password': 'bench'})
+    response, seconds = timed(client.get, f'/api/graph/{dataset_id}')
+    results['api_graph'] = {
+        'seconds': round(seconds, 4),
+        'status': response.status_code,
+        'bytes': len(response.get_data()),
+    }
+    return results
+
+def compare(current, baseline):
+    """Print per-benchmark timing ratios against an earlier results file"""
+    for size, benchmarks in current['sizes'].items():
+        old = baseline.get('sizes', {}).get(size, {})
+        for name, values in benchmarks.items():
+            key = 'seconds' if 'seconds' in values else 'seconds_mean'
+            before = old.get(name, {}).get(key)
+            if before:
+                print(f'{size:>8} {name:<24} {before:9.4f}s -> {values[key]:9.4f}s  x{values[key] / before:.2f}')
+            else:
+                print(f'{size:>8} {name:<24} {"-":>10} -> {values[key]:9.4f}s')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000])
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write JSON results to this file')
+    parser.add_argument('--compare', help='earlier JSON results to compare against')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='kg_bench_') as work_dir:
+        # The app reads its database and upload locations at import time
+        os.environ['KG_DATABASE_URI'] = 'sqlite:///' + os.path.join(work_dir, 'bench.db')
+        os.environ['KG_UPLOAD_FOLDER'] = os.path.join(work_dir, 'uploads')
+        import app as kg
+
+        report = {
+            'commit': git_commit(),
+            'timestamp': datetime.utcnow().isoformat() + 'Z',
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count(),
+            'seed': args.seed,
+            'sizes': {},
+        }
+        for rows in args.rows:
+            print(f'Running benchmarks for {rows} rows...')
+            report['sizes'][str(rows)] = run_size(kg, rows, args.seed, work_dir)
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+if __name__ == '__main__':
+    main()
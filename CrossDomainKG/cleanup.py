@@ -0,0 +1,103 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from linking import remove_from_index
+from models import (db, Dataset, DatasetChunk, Entity, Relation,
+                    ProcessingJob, ProfileReport, GraphAnalysis, EntityMetric, ExtractionCache, Feedback,
+                    chunk_entities)
+from paths import clear_path_indexes
+from storage import release_upload
+
+# One worker for maintenance kept out of requests (purges, analytics): tasks run one at
+# a time, so two purges never race on a shared upload file and SQLite sees a single
+# background writer
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='kg-cleanup')
+# Keys of tasks submitted but not started yet
+_queued = set()
+_queued_lock = threading.Lock()
+
+def run_in_background(app, function, *args, key=None):
+    """Run function(*args) in an app context on the background worker; returns its Future.
+
+    A task with the key of one that is still queued is not submitted twice (returns None).
+    """
+    if key is not None:
+        with _queued_lock:
+            if key in _queued:
+                return None
+            _queued.add(key)
+
+    def run():
+        if key is not None:
+            with _queued_lock:
+                _queued.discard(key)
+        with app.app_context():
+            try:
+                return function(*args)
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error in background task {function.__name__}{args}: {e}")
+                return None
+    return _executor.submit(run)
+
+def purge_statements(dataset_id):
+    """Set-based DELETEs removing a dataset and everything derived from it, children first.
+
+    With ON DELETE CASCADE the last statement alone would do; the explicit
+    order keeps purging correct on SQLite files created before the cascades.
+    """
+    entity_ids = db.select(Entity.id).where(Entity.dataset_id == dataset_id)
+    job_ids = db.select(ProcessingJob.id).where(ProcessingJob.dataset_id == dataset_id)
+    # Runs over the dataset alone, or over several datasets including it
+    analyses = (GraphAnalysis.dataset_id == dataset_id) | \
+        (',' + GraphAnalysis.scope + ',').like(f'%,{int(dataset_id)},%')
+    analysis_ids = db.select(GraphAnalysis.id).where(analyses)
+    relations = (Relation.dataset_id == dataset_id) | \
+        Relation.entity1_id.in_(entity_ids) | Relation.entity2_id.in_(entity_ids)
+    return [
+        db.update(Feedback).where(Feedback.relation_id.in_(db.select(Relation.id).where(relations)))
+        .values(relation_id=None),
+        db.delete(EntityMetric).where(EntityMetric.analysis_id.in_(analysis_ids) | EntityMetric.entity_id.in_(entity_ids)),
+        db.delete(GraphAnalysis).where(analyses),
+        db.delete(Relation).where(relations),
+        chunk_entities.delete().where(chunk_entities.c.entity_id.in_(entity_ids) | chunk_entities.c.chunk_id.in_(
+            db.select(DatasetChunk.id).where(DatasetChunk.dataset_id == dataset_id))),
+        db.delete(DatasetChunk).where(DatasetChunk.dataset_id == dataset_id),
+        db.delete(Entity).where(Entity.dataset_id == dataset_id),
+        db.delete(ProfileReport).where((ProfileReport.dataset_id == dataset_id) | ProfileReport.job_id.in_(job_ids)),
+        db.delete(ProcessingJob).where(ProcessingJob.dataset_id == dataset_id),
+        db.delete(ExtractionCache).where(ExtractionCache.dataset_id == dataset_id),
+        db.delete(Dataset).where(Dataset.id == dataset_id),
+    ]
+
+def purge_dataset(dataset_id, upload_folder):
+    """Delete a dataset marked as deleted: its rows in one transaction, then its file and in-process caches"""
+    dataset = db.session.get(Dataset, dataset_id)
+    if dataset is None or not dataset.deleted:
+        return False
+    user_id, filename = dataset.user_id, dataset.filename
+
+    # Term and embedding index rows, and the in-process embedding copies
+    remove_from_index(db.session.execute(
+        db.select(Entity.id).where(Entity.dataset_id == dataset_id)).scalars().all())
+    for statement in purge_statements(dataset_id):
+        db.session.execute(statement.execution_options(synchronize_session=False))
+    db.session.commit()
+
+    try:
+        release_upload(filename, upload_folder)
+    except OSError as e:
+        print(f"Could not remove upload {filename}: {e}")
+    clear_path_indexes(user_id)
+    # Analyses including the dataset were deleted and those of linked datasets are stale
+    # (new versions); each is recomputed when next requested, not once per purge
+    return True
+
+def schedule_purge(app, dataset_id):
+    """Purge a dataset on the background worker; returns its Future"""
+    return run_in_background(app, purge_dataset, dataset_id, app.config['UPLOAD_FOLDER'])
+
+def resume_purges(app):
+    """Schedule datasets still marked as deleted, e.g. after a restart interrupted their purge"""
+    dataset_ids = db.session.execute(db.select(Dataset.id).where(Dataset.deleted.is_(True))).scalars().all()
+    return [schedule_purge(app, dataset_id) for dataset_id in dataset_ids]
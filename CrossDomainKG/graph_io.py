@@ -0,0 +1,420 @@
+import io
+import json
+import zipfile
+from collections import namedtuple
+from xml.etree.ElementTree import iterparse
+from xml.sax.saxutils import escape
+
+from linking import encode_names, index_entities
+from models import db, Dataset, Entity, Relation, insert_returning_ids
+
+# Rows fetched from the database and written per batch; bounds export memory
+EXPORT_BATCH = 5000
+# Rows inserted per executemany on import
+IMPORT_BATCH = 5000
+
+FORMATS = ('ndjson', 'parquet', 'arrow', 'graphml')
+MIMETYPES = {
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/zip',
+    'arrow': 'application/zip',
+    'graphml': 'application/graphml+xml',
+}
+EXTENSIONS = {'ndjson': 'ndjson', 'parquet': 'parquet.zip', 'arrow': 'arrow.zip', 'graphml': 'graphml'}
+
+NODE_FIELDS = ('id', 'name', 'type', 'confidence', 'dataset_id', 'merged_with')
+EDGE_FIELDS = ('id', 'source', 'target', 'relation_type', 'confidence', 'approved', 'dataset_id')
+
+# ============================================
+# Reading the graph out of the database
+# ============================================
+
+def _batches(statement, fields):
+    """Stream a select as lists of dicts, EXPORT_BATCH rows at a time"""
+    result = db.session.execute(statement.execution_options(yield_per=EXPORT_BATCH))
+    for rows in result.partitions():
+        yield [dict(zip(fields, row)) for row in rows]
+
+def node_batches(dataset_ids):
+    return _batches(
+        db.select(Entity.id, Entity.name, Entity.type, Entity.confidence, Entity.dataset_id, Entity.merged_with)
+        .where(Entity.dataset_id.in_(dataset_ids))
+        .order_by(Entity.id),
+        NODE_FIELDS)
+
+def edge_batches(dataset_ids):
+    """Relations of the datasets whose both ends are exported too"""
+    exported = db.select(Entity.id).where(Entity.dataset_id.in_(dataset_ids))
+    return _batches(
+        db.select(Relation.id, Relation.entity1_id, Relation.entity2_id, Relation.relation_type,
+                  Relation.confidence, Relation.approved, Relation.dataset_id)
+        .where(Relation.dataset_id.in_(dataset_ids),
+               Relation.entity1_id.in_(exported),
+               Relation.entity2_id.in_(exported))
+        .order_by(Relation.id),
+        EDGE_FIELDS)
+
+def dataset_records(datasets):
+    return [{'id': d.id, 'name': d.name, 'domain': d.domain} for d in datasets]
+
+# ============================================
+# Streaming writers: each yields the export as byte chunks
+# ============================================
+
+def export_graph(datasets, fmt):
+    """Byte chunks of the graph of the given datasets in one of FORMATS"""
+    writers = {'ndjson': write_ndjson, 'parquet': write_parquet, 'arrow': write_arrow, 'graphml': write_graphml}
+    if fmt not in writers:
+        raise ValueError(f'Unknown export format {fmt!r}')
+    if fmt in ('parquet', 'arrow'):
+        _arrow_schemas()  # fail before the response starts when pyarrow is missing
+    dataset_ids = [d.id for d in datasets]
+    return writers[fmt](dataset_records(datasets), node_batches(dataset_ids), edge_batches(dataset_ids))
+
+def write_ndjson(datasets, nodes, edges):
+    """One JSON object per line: a header, the datasets, then all nodes, then all edges"""
+    yield (json.dumps({'type': 'header', 'format': 'kg-ndjson', 'version': 1}) + '\n').encode('utf-8')
+    for record in datasets:
+        yield (json.dumps(dict(record, type='dataset')) + '\n').encode('utf-8')
+    for kind, batches in (('node', nodes), ('edge', edges)):
+        for batch in batches:
+            yield ''.join(json.dumps(dict(row, type=kind)) + '\n' for row in batch).encode('utf-8')
+
+GRAPHML_KEYS = (
+    ('node', 'name', 'string'), ('node', 'type', 'string'), ('node', 'confidence', 'double'),
+    ('node', 'dataset_id', 'long'), ('node', 'merged_with', 'long'),
+    ('edge', 'relation_type', 'string'), ('edge', 'confidence', 'double'),
+    ('edge', 'approved', 'boolean'), ('edge', 'dataset_id', 'long'),
+)
+
+def _graphml_data(key, value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        value = 'true' if value else 'false'
+    return f'<data key="{key}">{escape(str(value))}</data>'
+
+def write_graphml(datasets, nodes, edges):
+    """GraphML written element by element; dataset metadata is graph-level JSON data"""
+    header = ['<?xml version="1.0" encoding="UTF-8"?>\n'
+              '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+              '<key id="kg_datasets" for="graph" attr.name="kg_datasets" attr.type="string"/>\n']
+    for scope, name, kind in GRAPHML_KEYS:
+        header.append(f'<key id="{scope[0]}_{name}" for="{scope}" attr.name="{name}" attr.type="{kind}"/>\n')
+    header.append('<graph edgedefault="directed">\n')
+    header.append(f'<data key="kg_datasets">{escape(json.dumps(datasets))}</data>\n')
+    yield ''.join(header).encode('utf-8')
+
+    for batch in nodes:
+        yield ''.join(
+            f'<node id="n{row["id"]}">'
+            + ''.join(_graphml_data(f'n_{name}', row[name]) for _, name, _ in GRAPHML_KEYS[:5])
+            + '</node>\n'
+            for row in batch).encode('utf-8')
+    for batch in edges:
+        yield ''.join(
+            f'<edge id="e{row["id"]}" source="n{row["source"]}" target="n{row["target"]}">'
+            + ''.join(_graphml_data(f'e_{name}', row[name]) for _, name, _ in GRAPHML_KEYS[5:])
+            + '</edge>\n'
+            for row in batch).encode('utf-8')
+    yield b'</graph>\n</graphml>\n'
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only, non-seekable stream whose bytes are drained by the generator after each batch"""
+    def __init__(self):
+        self.buffer = bytearray()
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.buffer += data
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+class _Counting(io.RawIOBase):
+    """Tell()-able wrapper around a zip member, which Arrow writers need for offsets"""
+    def __init__(self, raw):
+        self.raw = raw
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.raw.write(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def close(self):
+        if not self.closed:
+            self.raw.close()
+        super().close()
+
+def _arrow_schemas():
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ValueError('Parquet and Arrow export need pyarrow')
+    node_schema = pa.schema([('id', pa.int64()), ('name', pa.string()), ('type', pa.string()),
+                             ('confidence', pa.float64()), ('dataset_id', pa.int64()), ('merged_with', pa.int64())])
+    edge_schema = pa.schema([('id', pa.int64()), ('source', pa.int64()), ('target', pa.int64()),
+                             ('relation_type', pa.string()), ('confidence', pa.float64()),
+                             ('approved', pa.bool_()), ('dataset_id', pa.int64())])
+    return pa, node_schema, edge_schema
+
+def _write_tables(datasets, nodes, edges, suffix, open_writer):
+    """Zip of datasets.json plus a node and an edge table, one record batch per database batch"""
+    pa, node_schema, edge_schema = _arrow_schemas()
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as archive:
+        archive.writestr('datasets.json', json.dumps(datasets))
+        yield sink.drain()
+        for name, schema, batches in (('nodes', node_schema, nodes), ('edges', edge_schema, edges)):
+            with _Counting(archive.open(f'{name}.{suffix}', 'w', force_zip64=True)) as member:
+                writer = open_writer(member, schema)
+                for batch in batches:
+                    writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=schema))
+                    yield sink.drain()
+                writer.close()
+    yield sink.drain()
+
+def write_parquet(datasets, nodes, edges):
+    import pyarrow.parquet as pq
+    yield from _write_tables(datasets, nodes, edges, 'parquet', lambda f, schema: pq.ParquetWriter(f, schema))
+
+def write_arrow(datasets, nodes, edges):
+    import pyarrow as pa
+    yield from _write_tables(datasets, nodes, edges, 'arrow', lambda f, schema: pa.ipc.new_stream(f, schema))
+
+# ============================================
+# Readers: stream ('dataset' | 'node' | 'edge', record) events of an export file
+# ============================================
+
+def read_ndjson(f):
+    for line in io.TextIOWrapper(f, encoding='utf-8'):
+        if line.strip():
+            record = json.loads(line)
+            kind = record.pop('type', None)
+            if kind in ('dataset', 'node', 'edge'):
+                yield kind, record
+
+def _read_tables(f, read_table_batches):
+    with zipfile.ZipFile(f) as archive:
+        for record in json.loads(archive.read('datasets.json')):
+            yield 'dataset', record
+        for kind, name in (('node', 'nodes'), ('edge', 'edges')):
+            member = next(n for n in archive.namelist() if n.startswith(name + '.'))
+            with archive.open(member) as table:
+                for batch in read_table_batches(table):
+                    for row in batch.to_pylist():
+                        yield kind, row
+
+def read_parquet(f):
+    import pyarrow.parquet as pq
+    yield from _read_tables(f, lambda table: pq.ParquetFile(table).iter_batches(batch_size=IMPORT_BATCH))
+
+def read_arrow(f):
+    import pyarrow as pa
+
+    # IPC stream format: batches are read in order, without seeking in the zip member
+    yield from _read_tables(f, lambda table: pa.ipc.open_stream(pa.PythonFile(table, mode='r')))
+
+def _graphml_value(text, kind):
+    if text is None:
+        return None
+    if kind == 'boolean':
+        return text.strip().lower() == 'true'
+    if kind in ('int', 'long'):
+        return int(text)
+    if kind in ('float', 'double'):
+        return float(text)
+    return text
+
+def read_graphml(f):
+    """Streams our GraphML and plain GraphML from other tools; node ids may be any strings"""
+    keys = {}
+    graph = None
+    for event, element in iterparse(f, events=('start', 'end')):
+        tag = element.tag.rsplit('}', 1)[-1]
+        if event == 'start':
+            if tag == 'graph' and graph is None:
+                graph = element
+            continue
+        if tag == 'key':
+            keys[element.get('id')] = (element.get('attr.name'), element.get('attr.type'))
+        elif tag == 'data' and element.get('key') == 'kg_datasets':
+            for record in json.loads(element.text or '[]'):
+                yield 'dataset', record
+        elif tag in ('node', 'edge'):
+            record = {}
+            for data in element:
+                name, kind = keys.get(data.get('key'), (data.get('key'), 'string'))
+                record[name] = _graphml_value(data.text, kind)
+            if tag == 'node':
+                record['id'] = element.get('id')
+                record.setdefault('name', record['id'])
+                if record.get('merged_with') is not None:
+                    record['merged_with'] = f'n{record["merged_with"]}'  # our exports write node ids as n<id>
+                yield 'node', record
+            else:
+                record['source'] = element.get('source')
+                record['target'] = element.get('target')
+                yield 'edge', record
+            if graph is not None:
+                graph.clear()  # drop parsed elements so memory stays flat
+
+READERS = {'ndjson': read_ndjson, 'parquet': read_parquet, 'arrow': read_arrow, 'graphml': read_graphml}
+
+def detect_format(filename):
+    name = (filename or '').lower()
+    for fmt in ('parquet', 'arrow', 'ndjson', 'graphml'):
+        if f'.{fmt}' in name:
+            return fmt
+    if name.endswith('.jsonl'):
+        return 'ndjson'
+    raise ValueError('Cannot tell the format from the file name; pass format=')
+
+# ============================================
+# Bulk importer
+# ============================================
+
+# Inserted entity as index_entities reads it
+IndexedEntity = namedtuple('IndexedEntity', 'id name')
+
+class GraphImporter:
+    """Insert an exported graph as new datasets of a user, remapping entity ids.
+
+    Nodes and edges are inserted with executemany in IMPORT_BATCH batches;
+    only the old -> new entity id map grows with the graph. Each node batch
+    is indexed for linking as it is inserted (names encoded when an encoder
+    is given), in the same transaction.
+    """
+    def __init__(self, user_id, default_domain='general', name=None, encoder=None):
+        self.user_id = user_id
+        self.default_domain = default_domain
+        self.name = name
+        self.encoder = encoder
+        self.datasets = {}   # exported dataset id -> new Dataset
+        self.entity_ids = {}  # exported entity id -> new entity id
+        self.nodes = []
+        self.edges = []
+        self.skipped_edges = 0
+        self.relation_count = 0
+
+    def _dataset(self, record):
+        dataset = Dataset(name=record.get('name') or self.name or 'Imported graph',
+                          domain=record.get('domain') or self.default_domain,
+                          filename='', user_id=self.user_id, processed=True)
+        db.session.add(dataset)
+        db.session.flush()
+        self.datasets[record.get('id')] = dataset
+        return dataset
+
+    def _dataset_for(self, old_id):
+        dataset = self.datasets.get(old_id)
+        if dataset is None:
+            # Plain GraphML, or an entity of a dataset missing from the header
+            dataset = self.datasets.get(None) or self._dataset({'id': None})
+        return dataset
+
+    def _flush_nodes(self):
+        if not self.nodes:
+            return
+        rows = [{
+            'name': str(node['name'])[:200],
+            'type': str(node.get('type') or 'ENTITY')[:50],
+            'confidence': node.get('confidence') if node.get('confidence') is not None else 1.0,
+            'dataset_id': self._dataset_for(node.get('dataset_id')).id,
+        } for node in self.nodes]
+        new_ids = insert_returning_ids(Entity, rows)
+        for node, new_id in zip(self.nodes, new_ids):
+            self.entity_ids[node['id']] = new_id
+        self.nodes = []
+
+        by_dataset = {}
+        for row, new_id in zip(rows, new_ids):
+            by_dataset.setdefault(row['dataset_id'], []).append(IndexedEntity(new_id, row['name']))
+        datasets = {dataset.id: dataset for dataset in self.datasets.values()}
+        for dataset_id, entities in by_dataset.items():
+            vectors = None
+            if self.encoder is not None:
+                vectors = encode_names([e.name for e in entities], self.encoder)
+            index_entities(datasets[dataset_id], entities, vectors)
+
+    def _flush_edges(self):
+        self._flush_nodes()
+        rows = []
+        for edge in self.edges:
+            source = self.entity_ids.get(edge['source'])
+            target = self.entity_ids.get(edge['target'])
+            if source is None or target is None:
+                self.skipped_edges += 1
+                continue
+            rows.append({
+                'entity1_id': source,
+                'entity2_id': target,
+                'relation_type': str(edge.get('relation_type') or edge.get('label') or 'related_to')[:100],
+                'confidence': edge.get('confidence') if edge.get('confidence') is not None else 1.0,
+                'approved': bool(edge.get('approved')),
+                'dataset_id': self._dataset_for(edge.get('dataset_id')).id,
+            })
+        if rows:
+            db.session.execute(db.insert(Relation), rows)
+            self.relation_count += len(rows)
+        self.edges = []
+
+    def _remap_merges(self, merges):
+        rows = [{'entity_id': self.entity_ids[old], 'merged': self.entity_ids[target]}
+                for old, target in merges if old in self.entity_ids and target in self.entity_ids]
+        entities = Entity.__table__
+        statement = (db.update(entities)
+                     .where(entities.c.id == db.bindparam('entity_id'))
+                     .values(merged_with=db.bindparam('merged')))
+        for start in range(0, len(rows), IMPORT_BATCH):
+            db.session.execute(statement, rows[start:start + IMPORT_BATCH])
+
+    def run(self, events):
+        """Import the events of a reader and commit; returns the new datasets"""
+        merges = []
+        for kind, record in events:
+            if kind == 'dataset':
+                self._dataset(record)
+            elif kind == 'node':
+                if record.get('merged_with') is not None:
+                    merges.append((record['id'], record['merged_with']))
+                self.nodes.append(record)
+                if len(self.nodes) >= IMPORT_BATCH:
+                    self._flush_nodes()
+            elif kind == 'edge':
+                self.edges.append(record)
+                if len(self.edges) >= IMPORT_BATCH:
+                    self._flush_edges()
+        self._flush_edges()
+        self._remap_merges(merges)
+        db.session.commit()
+        return list(self.datasets.values())
+
+def import_graph(f, fmt, user_id, default_domain='general', name=None, encoder=None):
+    """Import an export file (binary file object) for a user; returns (importer, new datasets)"""
+    if fmt not in READERS:
+        raise ValueError(f'Unknown import format {fmt!r}')
+    importer = GraphImporter(user_id, default_domain, name, encoder)
+    try:
+        datasets = importer.run(READERS[fmt](f))
+    except Exception:
+        db.session.rollback()
+        raise
+    return importer, datasets
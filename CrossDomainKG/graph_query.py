@@ -0,0 +1,139 @@
+import threading
+
+import networkx as nx
+
+from models import db, Dataset, Entity, Relation
+from nlp.graph_builder import GraphIndex, CONFIDENCE_BUCKETS
+
+def _split(value):
+    return [part.strip() for part in (value or '').split(',') if part.strip()]
+
+def parse_facets(args):
+    """Facet filters from request args; raises ValueError on malformed values.
+
+    types, relation_types, domains, dataset_ids and confidence (bucket names) take
+    comma-separated lists; approved takes true/false; min_confidence a number.
+    """
+    facets = {
+        'types': _split(args.get('types')),
+        'relation_types': _split(args.get('relation_types')),
+        'domains': _split(args.get('domains')),
+        'confidence': _split(args.get('confidence')),
+        'dataset_ids': [int(i) for i in _split(args.get('dataset_ids'))],
+        'approved': None,
+        'min_confidence': None,
+    }
+    unknown = set(facets['confidence']) - {name for name, _ in CONFIDENCE_BUCKETS}
+    if unknown:
+        raise ValueError(f'Unknown confidence bucket(s): {", ".join(sorted(unknown))}')
+    if args.get('approved'):
+        value = args['approved'].lower()
+        if value not in ('true', 'false', '1', '0'):
+            raise ValueError('approved must be true or false')
+        facets['approved'] = value in ('true', '1')
+    if args.get('min_confidence'):
+        facets['min_confidence'] = float(args['min_confidence'])
+    return facets
+
+def accessible_dataset_ids(user, facets):
+    """Ids of the user's datasets (any dataset for admins) matching the dataset and domain facets"""
+    query = db.select(Dataset.id).where(Dataset.deleted.is_(False))
+    if not user.is_admin or not facets['dataset_ids']:
+        query = query.where(Dataset.user_id == user.id)
+    if facets['domains']:
+        query = query.where(Dataset.domain.in_(facets['domains']))
+    if facets['dataset_ids']:
+        query = query.where(Dataset.id.in_(facets['dataset_ids']))
+    return db.session.execute(query.order_by(Dataset.id)).scalars().all()
+
+# Dataset ids -> (versions, GraphIndex) of recently filtered graphs, oldest first
+MAX_CACHED_GRAPHS = 16
+_graph_indexes = {}
+_lock = threading.Lock()
+
+def _versions(dataset_ids):
+    return tuple(db.session.execute(
+        db.select(Dataset.id, Dataset.version).where(Dataset.id.in_(dataset_ids)).order_by(Dataset.id)
+    ).tuples())
+
+def get_graph_index(dataset_ids):
+    """Cached GraphIndex over the datasets' entities and relations, rebuilt when a dataset's version changed.
+
+    The graph is a multigraph keyed by relation id, so parallel relations are filtered
+    and returned one by one; relations with an end outside the datasets are left out.
+    """
+    key = tuple(sorted(dataset_ids))
+    versions = _versions(key)
+    with _lock:
+        cached = _graph_indexes.get(key)
+        if cached is not None and cached[0] == versions:
+            return cached[1]
+
+    graph = nx.MultiGraph()
+    for id, name, type, confidence, dataset_id in db.session.execute(
+            db.select(Entity.id, Entity.name, Entity.type, Entity.confidence, Entity.dataset_id)
+            .where(Entity.dataset_id.in_(key))):
+        graph.add_node(id, label=name, type=type, confidence=confidence, dataset_id=dataset_id)
+    for id, source, target, label, confidence, approved in db.session.execute(
+            db.select(Relation.id, Relation.entity1_id, Relation.entity2_id, Relation.relation_type,
+                      Relation.confidence, Relation.approved)
+            .where(Relation.dataset_id.in_(key))):
+        if source in graph and target in graph:
+            graph.add_edge(source, target, key=id, source=source, target=target,
+                           label=label, confidence=confidence, approved=approved)
+    index = GraphIndex(graph)
+
+    with _lock:
+        _graph_indexes.pop(key, None)
+        _graph_indexes[key] = (versions, index)
+        while len(_graph_indexes) > MAX_CACHED_GRAPHS:
+            del _graph_indexes[next(iter(_graph_indexes))]
+    return index
+
+def filter_graph(dataset_ids, facets):
+    """Nodes and edges of the datasets matching all facets.
+
+    Node and edge facets are intersections of the GraphIndex posting sets; the
+    subgraph view keeps only edges whose ends are both selected, so both ends are shown.
+    """
+    if not dataset_ids:
+        return [], []
+
+    index = get_graph_index(dataset_ids)
+    view = index.filter(
+        node_filters={'type': facets['types'] or None},
+        edge_filters={'label': facets['relation_types'] or None, 'approved': facets['approved'],
+                      'bucket': facets['confidence'] or None})
+    nodes = [
+        {'id': id, 'label': data['label'], 'type': data['type'], 'confidence': data['confidence'],
+         'dataset_id': data['dataset_id']}
+        for id, data in view.nodes(data=True)
+    ]
+    min_confidence = facets['min_confidence']
+    edges = [
+        {'id': id, 'from': data['source'], 'to': data['target'], 'label': data['label'],
+         'confidence': data['confidence'], 'approved': data['approved']}
+        for _, _, id, data in view.edges(keys=True, data=True)
+        if min_confidence is None or (data['confidence'] is not None and data['confidence'] >= min_confidence)
+    ]
+    return nodes, edges
+
+def facet_counts(dataset_ids):
+    """Value counts of every facet over the datasets, answered from the facet indexes"""
+    if not dataset_ids:
+        return {'types': {}, 'relation_types': {}, 'approved': {}, 'confidence': {}}
+
+    def grouped(column, model):
+        return dict(db.session.execute(
+            db.select(column, db.func.count()).where(model.dataset_id.in_(dataset_ids)).group_by(column)
+        ).all())
+
+    # Same buckets as GraphIndex, which counts a relation without a confidence as certain
+    confidence = db.func.coalesce(Relation.confidence, 1.0)
+    bucket = db.case(*[(confidence >= low, name) for name, low in CONFIDENCE_BUCKETS], else_='low')
+    return {
+        'types': grouped(Entity.type, Entity),
+        'relation_types': grouped(Relation.relation_type, Relation),
+        'approved': {str(bool(k)).lower(): v for k, v in grouped(Relation.approved, Relation).items()},
+        'confidence': grouped(bucket, Relation),
+    }
@@ -0,0 +1,125 @@
+import gzip
+import hashlib
+import json
+from datetime import timezone
+
+from flask import Response, request
+
+from models import db, Dataset
+
+try:
+    import orjson
+except ImportError:  # standard library encoder is used instead
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # responses are always JSON
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+MSGPACK_MIMETYPE = 'application/x-msgpack'
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/x-ndjson', MSGPACK_MIMETYPE, 'text/html',
+                          'text/css', 'text/javascript', 'application/javascript', 'image/svg+xml')
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # well below the maximum (11): dynamic responses are compressed per request
+
+def dumps(payload):
+    """JSON bytes of a payload, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, separators=(',', ':'), default=str).encode('utf-8')
+
+def wants_msgpack():
+    """MessagePack was asked for (Accept header or ?format=msgpack) and can be produced"""
+    if msgpack is None:
+        return False
+    if request.args.get('format') == 'msgpack':
+        return True
+    return request.accept_mimetypes.best_match(['application/json', MSGPACK_MIMETYPE]) == MSGPACK_MIMETYPE
+
+def serialize(payload, status=200):
+    """Response with the payload as JSON, or MessagePack when negotiated"""
+    if wants_msgpack():
+        response = Response(msgpack.packb(payload, use_bin_type=True), status=status, mimetype=MSGPACK_MIMETYPE)
+    else:
+        response = Response(dumps(payload), status=status, mimetype='application/json')
+    response.vary.add('Accept')
+    return response
+
+def dataset_validators(dataset_ids, tag=''):
+    """(weak ETag, Last-Modified) of a response built from the datasets at their current versions"""
+    rows = db.session.execute(
+        db.select(Dataset.id, Dataset.version, db.func.coalesce(Dataset.updated_at, Dataset.uploaded_at))
+        .where(Dataset.id.in_(list(dataset_ids))).order_by(Dataset.id)
+    ).all()
+    fmt = MSGPACK_MIMETYPE if wants_msgpack() else 'application/json'
+    key = f'{tag}|{fmt}|' + ','.join(f'{id}:{version or 1}' for id, version, _ in rows)
+    etag = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    modified = [changed for _, _, changed in rows if changed is not None]
+    last_modified = max(modified).replace(tzinfo=timezone.utc, microsecond=0) if modified else None
+    return etag, last_modified
+
+def _not_modified(etag, last_modified):
+    # If-None-Match wins over If-Modified-Since when both are sent
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified:
+        return last_modified <= request.if_modified_since
+    return False
+
+def conditional_response(dataset_ids, build, tag=''):
+    """Serve build() for the datasets, or 304 Not Modified when the client's copy is still current.
+
+    The validators come from one indexed query on the datasets; build only
+    runs when the client has no current copy.
+    """
+    etag, last_modified = dataset_validators(dataset_ids, tag)
+    if _not_modified(etag, last_modified):
+        response = Response(status=304)
+        response.vary.add('Accept')
+    else:
+        response = serialize(build())
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified
+    # Per-user data: browsers may keep it but must revalidate before reuse
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+def _encoding():
+    if brotli is not None and request.accept_encodings['br']:
+        return 'br'
+    if request.accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+def compress(response):
+    """Brotli or gzip encode a buffered, compressible response the client accepts"""
+    if (response.direct_passthrough or response.is_streamed or response.status_code < 200
+            or response.status_code in (204, 304) or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = _encoding()
+    if encoding is None or (response.content_length or 0) < MIN_COMPRESS_BYTES:
+        return response
+
+    body = response.get_data()
+    if encoding == 'br':
+        body = brotli.compress(body, quality=BROTLI_QUALITY)
+    else:
+        body = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+def init_app(app):
+    """Compress every eligible response"""
+    app.after_request(compress)
@@ -0,0 +1,354 @@
+import csv
+import hashlib
+from datetime import datetime
+from functools import partial
+
+from linking import remove_from_index, copy_index
+from metrics import timed
+from models import db, Dataset, DatasetChunk, Entity, Relation, ExtractionCache, chunk_entities, bump_dataset_versions, \
+    insert_returning_ids
+from nlp.csv_schema import infer_csv_schema, relation_type_for
+from nlp.preprocessing import preprocess_text
+from nlp.relation_extraction import doc_relations, relation_triples_many
+
+# Number of chunks handed to spaCy in one nlp.pipe() call
+PIPE_BATCH_SIZE = 256
+# Number of CSV rows mapped and flushed together on the structured path
+CSV_BATCH_ROWS = 1000
+# Bump whenever the same file would extract differently (NER handling, relation rules, CSV mapping);
+# cached extraction results of older versions are then no longer reused
+PIPELINE_VERSION = 2
+
+def iter_csv_rows(filepath):
+    """Stream (row text, row fields) for every non-empty CSV row after the header"""
+    with open(filepath, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        next(reader, None)  # header
+        for row in reader:
+            text = ', '.join(field.strip() for field in row if field.strip())
+            if text:
+                yield text, row
+
+def iter_chunks(filepath):
+    """Yield the chunks of a dataset file: one per CSV row, one per text paragraph"""
+    if filepath.lower().endswith('.csv'):
+        for text, _ in iter_csv_rows(filepath):
+            yield text
+        return
+
+    with open(filepath, 'r', encoding='utf-8') as f:
+        paragraph = []
+        for line in f:
+            if line.strip():
+                paragraph.append(line.strip())
+            elif paragraph:
+                yield ' '.join(paragraph)
+                paragraph = []
+        if paragraph:
+            yield ' '.join(paragraph)
+
+def hash_chunk(text):
+    """Content hash used to recognise unchanged chunks between uploads"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def ingest_file(dataset, filepath, nlp_model):
+    """Incrementally (re)process a dataset file.
+
+    Only chunks whose content hash is not yet stored for the dataset are
+    processed; chunks that disappeared from the file are retracted together
+    with the entities and relations they produced. CSV files with typed
+    columns are mapped to entities directly, everything else goes through
+    NLP. Returns the new entities.
+    """
+    existing = {c.content_hash: c for c in DatasetChunk.query.filter_by(dataset_id=dataset.id)}
+    version = pipeline_version(nlp_model, dataset.domain)
+    if not existing:
+        # Datasets processed before chunk tracking have no provenance to diff against
+        clear_dataset_graph(dataset.id)
+        
+        # Content already extracted by this pipeline for another dataset is copied, not re-parsed
+        cached = cached_extraction(dataset, version)
+        if cached is not None:
+            with timed('clone'):
+                new_entities = clone_extraction(cached.dataset_id, dataset.id)
+            remember_extraction(dataset, version)
+            return new_entities
+
+    entity_lookup = {(e.name, e.type): e for e in Entity.query.filter_by(dataset_id=dataset.id)}
+    new_entities = []
+
+    schema = infer_csv_schema(filepath) if filepath.lower().endswith('.csv') else None
+    if schema and schema['entities']:
+        # Row hashes are tagged so switching between paths re-processes the rows
+        chunks = (('row:' + text, row) for text, row in iter_csv_rows(filepath))
+        extract = partial(_extract_rows, dataset.id, schema=schema,
+                          entity_lookup=entity_lookup, new_entities=new_entities)
+        batch_size = CSV_BATCH_ROWS
+    else:
+        chunks = ((text, text) for text in iter_chunks(filepath))
+        extract = partial(_extract_chunks, dataset.id, nlp_model=nlp_model, entity_lookup=entity_lookup,
+                          new_entities=new_entities, domain=dataset.domain)
+        batch_size = PIPE_BATCH_SIZE
+
+    seen = set()
+    pending = []
+
+    for position, (key, payload) in enumerate(chunks):
+        content_hash = hash_chunk(key)
+        if content_hash in seen:
+            continue
+        seen.add(content_hash)
+
+        chunk = existing.get(content_hash)
+        if chunk:
+            chunk.position = position
+            continue
+
+        chunk = DatasetChunk(dataset_id=dataset.id, position=position, content_hash=content_hash)
+        db.session.add(chunk)
+        pending.append((chunk, payload))
+        if len(pending) >= batch_size:
+            extract(pending)
+            pending = []
+
+    if pending:
+        extract(pending)
+
+    removed = [c.id for h, c in existing.items() if h not in seen]
+    retract_chunks(removed)
+    remember_extraction(dataset, version)
+
+    return new_entities
+
+def _extract_chunks(dataset_id, pending, nlp_model, entity_lookup, new_entities, domain=None):
+    """Run NER and relation extraction over a batch of new chunks"""
+    db.session.flush()
+    with timed('parse'):
+        docs = list(nlp_model.pipe(preprocess_text(text) for _, text in pending))
+    triples = relation_triples_many(docs, domain)
+
+    for (chunk, _), doc, doc_triples in zip(pending, docs, triples):
+        chunk_entities_found = []
+        for ent in doc.ents:
+            key = (ent.text, ent.label_)
+            entity = entity_lookup.get(key)
+            if entity is None:
+                entity = Entity(
+                    name=ent.text,
+                    type=ent.label_,
+                    dataset_id=dataset_id,
+                    confidence=0.95
+                )
+                db.session.add(entity)
+                entity_lookup[key] = entity
+                new_entities.append(entity)
+            if entity not in chunk_entities_found:
+                chunk_entities_found.append(entity)
+
+        chunk.entities.extend(chunk_entities_found)
+        db.session.flush()
+
+        for found in doc_relations(doc, chunk_entities_found, domain, doc_triples):
+            db.session.add(Relation(
+                entity1_id=found['entity1'].id,
+                entity2_id=found['entity2'].id,
+                relation_type=found['type'],
+                confidence=found['confidence'],
+                dataset_id=dataset_id,
+                chunk_id=chunk.id,
+                approved=False
+            ))
+
+def _extract_rows(dataset_id, pending, schema, entity_lookup, new_entities):
+    """Map typed columns of new CSV rows straight to entities and subject relations"""
+    db.session.flush()
+    header, columns, subject = schema['header'], schema['entities'], schema['subject']
+
+    row_entities = []
+    for chunk, row in pending:
+        found = {}
+        for index, entity_type in columns.items():
+            value = row[index].strip() if index < len(row) else ''
+            if not value:
+                continue
+
+            key = (value, entity_type)
+            entity = entity_lookup.get(key)
+            if entity is None:
+                entity = Entity(
+                    name=value,
+                    type=entity_type,
+                    dataset_id=dataset_id,
+                    confidence=1.0
+                )
+                db.session.add(entity)
+                entity_lookup[key] = entity
+                new_entities.append(entity)
+            found[index] = entity
+
+        chunk.entities.extend(dict.fromkeys(found.values()))
+        row_entities.append((chunk, found))
+
+    db.session.flush()
+
+    # Values sharing a row are related through the row's subject column
+    for chunk, found in row_entities:
+        subject_entity = found.get(subject)
+        if subject_entity is None:
+            continue
+        for index, entity in found.items():
+            if entity is subject_entity:
+                continue
+            db.session.add(Relation(
+                entity1_id=subject_entity.id,
+                entity2_id=entity.id,
+                relation_type=relation_type_for(header[index]),
+                confidence=1.0,
+                dataset_id=dataset_id,
+                chunk_id=chunk.id,
+                approved=False
+            ))
+
+def retract_chunks(chunk_ids):
+    """Delete chunks plus the relations they produced and entities only they mentioned"""
+    if not chunk_ids:
+        return
+
+    # Entities that lose a provenance link; deleted below if no other chunk mentions them
+    touched = db.select(chunk_entities.c.entity_id).where(chunk_entities.c.chunk_id.in_(chunk_ids))
+    touched_ids = [row[0] for row in db.session.execute(touched)]
+
+    # Datasets owning a deleted relation change with it (cross-domain links included)
+    affected = set(db.session.execute(
+        db.select(Relation.dataset_id).distinct().where(Relation.chunk_id.in_(chunk_ids))).scalars())
+    Relation.query.filter(Relation.chunk_id.in_(chunk_ids)).delete(synchronize_session=False)
+    db.session.execute(chunk_entities.delete().where(chunk_entities.c.chunk_id.in_(chunk_ids)))
+    DatasetChunk.query.filter(DatasetChunk.id.in_(chunk_ids)).delete(synchronize_session=False)
+
+    still_linked = db.select(chunk_entities.c.entity_id).where(chunk_entities.c.entity_id.in_(touched_ids))
+    orphan_ids = set(touched_ids) - {row[0] for row in db.session.execute(still_linked)}
+    if orphan_ids:
+        orphan_relations = Relation.entity1_id.in_(orphan_ids) | Relation.entity2_id.in_(orphan_ids)
+        affected.update(db.session.execute(
+            db.select(Relation.dataset_id).distinct().where(orphan_relations)).scalars())
+        Relation.query.filter(orphan_relations).delete(synchronize_session=False)
+        Entity.query.filter(Entity.id.in_(orphan_ids)).delete(synchronize_session=False)
+        remove_from_index(orphan_ids)
+
+    bump_dataset_versions(affected)
+    db.session.expire_all()
+
+def clear_dataset_graph(dataset_id):
+    """Remove every entity and relation extracted for a dataset"""
+    entity_ids = db.select(Entity.id).where(Entity.dataset_id == dataset_id)
+    remove_from_index(row[0] for row in db.session.execute(entity_ids))
+    relations = (Relation.dataset_id == dataset_id) | \
+        Relation.entity1_id.in_(entity_ids) | Relation.entity2_id.in_(entity_ids)
+    bump_dataset_versions(db.session.execute(db.select(Relation.dataset_id).distinct().where(relations)).scalars())
+    Relation.query.filter(relations).delete(synchronize_session=False)
+    Entity.query.filter_by(dataset_id=dataset_id).delete(synchronize_session=False)
+    db.session.expire_all()
+
+def pipeline_version(nlp_model, domain):
+    """Everything besides the file content that decides what ingest_file extracts"""
+    meta = getattr(nlp_model, 'meta', None) or {}
+    model = f"{meta.get('lang', '')}_{meta.get('name', '')}-{meta.get('version', '')}"
+    pipes = ','.join(getattr(nlp_model, 'pipe_names', []))
+    return f'{PIPELINE_VERSION}:{model}:{pipes}:{domain}'
+
+def cached_extraction(dataset, version):
+    """Another dataset holding extraction results for the same content and pipeline version"""
+    if not dataset.content_hash:
+        return None
+    return ExtractionCache.query.join(ExtractionCache.dataset).filter(
+        ExtractionCache.content_hash == dataset.content_hash,
+        ExtractionCache.pipeline_version == version,
+        ExtractionCache.dataset_id != dataset.id,
+        Dataset.deleted.is_(False)
+    ).order_by(ExtractionCache.id).first()
+
+def remember_extraction(dataset, version):
+    """Record that the dataset now holds the extraction results of its content"""
+    # Entries of content the dataset held before a re-upload are stale
+    ExtractionCache.query.filter(
+        ExtractionCache.dataset_id == dataset.id,
+        (ExtractionCache.content_hash != dataset.content_hash) | (ExtractionCache.pipeline_version != version)
+    ).delete(synchronize_session=False)
+    if not dataset.content_hash:
+        return
+    entry = ExtractionCache.query.filter_by(
+        content_hash=dataset.content_hash, pipeline_version=version, dataset_id=dataset.id).first()
+    if entry is None:
+        entry = ExtractionCache(content_hash=dataset.content_hash, pipeline_version=version, dataset_id=dataset.id)
+        db.session.add(entry)
+    db.session.flush()
+    entry.entity_count = db.session.execute(
+        db.select(db.func.count(Entity.id)).where(Entity.dataset_id == dataset.id)).scalar()
+    entry.relation_count = db.session.execute(
+        db.select(db.func.count(Relation.id)).where(Relation.dataset_id == dataset.id, Relation.chunk_id.isnot(None))
+    ).scalar()
+
+def clone_extraction(source_id, dataset_id):
+    """Copy the chunks, entities and chunk relations of source_id into an empty dataset.
+
+    Rows are copied with bulk inserts that return the new ids (insert_returning_ids)
+    to map old ids to new ones; cross-domain and linked relations (no chunk) are
+    not part of the extraction and are recreated by linking. The term and embedding index rows
+    of the entities are copied too. Returns the new entities.
+    """
+    now = datetime.utcnow()
+    chunks = db.session.execute(
+        db.select(DatasetChunk.id, DatasetChunk.position, DatasetChunk.content_hash)
+        .where(DatasetChunk.dataset_id == source_id).order_by(DatasetChunk.id)
+    ).all()
+    entities = db.session.execute(
+        db.select(Entity.id, Entity.name, Entity.type, Entity.confidence)
+        .where(Entity.dataset_id == source_id).order_by(Entity.id)
+    ).all()
+    if not chunks:
+        return []
+
+    new_chunk_ids = insert_returning_ids(DatasetChunk, [
+        {'dataset_id': dataset_id, 'position': position, 'content_hash': content_hash, 'created_at': now}
+        for _, position, content_hash in chunks
+    ])
+    chunk_map = dict(zip((row.id for row in chunks), new_chunk_ids))
+
+    entity_map = {}
+    if entities:
+        new_entity_ids = insert_returning_ids(Entity, [
+            {'name': name, 'type': type, 'dataset_id': dataset_id, 'confidence': confidence, 'created_at': now}
+            for _, name, type, confidence in entities
+        ])
+        entity_map = dict(zip((row.id for row in entities), new_entity_ids))
+        # The copies are indexed like their originals, so linking does not encode them again
+        dataset = db.session.get(Dataset, dataset_id)
+        copy_index(entity_map, dataset.user_id, dataset.domain)
+
+    links = db.session.execute(
+        db.select(chunk_entities.c.chunk_id, chunk_entities.c.entity_id)
+        .join(DatasetChunk, DatasetChunk.id == chunk_entities.c.chunk_id)
+        .where(DatasetChunk.dataset_id == source_id)
+    ).all()
+    link_rows = [{'chunk_id': chunk_map[chunk_id], 'entity_id': entity_map[entity_id]}
+                 for chunk_id, entity_id in links if entity_id in entity_map]
+    if link_rows:
+        db.session.execute(chunk_entities.insert(), link_rows)
+
+    relations = db.session.execute(
+        db.select(Relation.entity1_id, Relation.entity2_id, Relation.relation_type,
+                  Relation.confidence, Relation.chunk_id)
+        .where(Relation.dataset_id == source_id, Relation.chunk_id.isnot(None))
+    ).all()
+    relation_rows = [
+        {'entity1_id': entity_map[entity1_id], 'entity2_id': entity_map[entity2_id],
+         'relation_type': relation_type, 'confidence': confidence, 'dataset_id': dataset_id,
+         'chunk_id': chunk_map[chunk_id], 'approved': False, 'created_at': now}
+        for entity1_id, entity2_id, relation_type, confidence, chunk_id in relations
+        if entity1_id in entity_map and entity2_id in entity_map and chunk_id in chunk_map
+    ]
+    if relation_rows:
+        db.session.execute(db.insert(Relation), relation_rows)
+
+    db.session.expire_all()
+    return Entity.query.filter_by(dataset_id=dataset_id).order_by(Entity.id).all()
@@ -0,0 +1,314 @@
+import re
+
+import numpy as np
+
+from metrics import timed
+from models import db, Dataset, Entity, Relation, EntityIndexTerm, EntityEmbedding
+from nlp.cross_domain import check_entity_similarity, cross_domain_relation_type
+from nlp.embedding_similarity import blocked_top_k, normalize_rows
+
+# Words shorter than this carry no linking signal
+MIN_TERM_LENGTH = 3
+# Index hits taken per term, so hub words like "hospital" cannot explode the candidate set
+MAX_TERM_CANDIDATES = 200
+# Nearest neighbours taken per new entity from the embedding index
+EMBEDDING_TOP_K = 10
+EMBEDDING_MIN_SCORE = 0.6
+# SQLite limits the number of bound parameters per statement
+IN_CLAUSE_BATCH = 500
+# Terms looked up per UNION ALL statement (SQLite allows at most 500 compound terms)
+TERM_QUERY_BATCH = 100
+
+def index_terms(name):
+    """Normalised words of an entity name used as index keys"""
+    return {
+        word for word in re.findall(r'\w+', name.lower())
+        if len(word) >= MIN_TERM_LENGTH and not word.isdigit()
+    }
+
+def encode_names(names, encoder):
+    """Encode entity names into L2-normalised float32 vectors"""
+    with timed('encode'):
+        return normalize_rows(encoder.encode(names, batch_size=64, show_progress_bar=False))
+
+def stored_vectors(entity_ids):
+    """Stored name embeddings of the entities that have one: entity id -> vector"""
+    entity_ids = list(entity_ids)
+    vectors = {}
+    for start in range(0, len(entity_ids), IN_CLAUSE_BATCH):
+        rows = db.session.execute(
+            db.select(EntityEmbedding.entity_id, EntityEmbedding.vector)
+            .where(EntityEmbedding.entity_id.in_(entity_ids[start:start + IN_CLAUSE_BATCH]))
+        )
+        for entity_id, vector in rows:
+            vectors[entity_id] = np.frombuffer(vector, dtype=np.float32)
+    return vectors
+
+def load_entity_vectors(entities, encoder):
+    """Name vectors for entities: stored embeddings where present, each missing name encoded once"""
+    vectors = stored_vectors(e.id for e in entities)
+    missing_names = sorted({e.name for e in entities if e.id not in vectors})
+    if missing_names:
+        encoded = dict(zip(missing_names, encode_names(missing_names, encoder)))
+        for entity in entities:
+            if entity.id not in vectors:
+                vectors[entity.id] = encoded[entity.name]
+    return vectors
+
+class EmbeddingIndex:
+    """In-process copy of one user's stored entity embeddings, one matrix per domain"""
+
+    def __init__(self):
+        self.blocks = {}  # domain -> (entity ids, normalised vectors)
+        self.signature = None  # (row count, entity id sum) of the stored rows at the last refresh
+
+    def add(self, entity_ids, domains, vectors):
+        if not len(entity_ids):
+            return
+        entity_ids = np.asarray(entity_ids, dtype=np.int64)
+        domains = np.asarray(domains, dtype=object)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        for domain in set(domains.tolist()):
+            rows = domains == domain
+            ids, matrix = self.blocks.get(domain, (np.empty(0, dtype=np.int64), None))
+            self.blocks[domain] = (
+                np.concatenate([ids, entity_ids[rows]]),
+                vectors[rows] if matrix is None else np.vstack([matrix, vectors[rows]])
+            )
+
+    def remove(self, entity_ids):
+        """Drop rows of deleted entities so they are no longer proposed"""
+        entity_ids = np.asarray(list(entity_ids), dtype=np.int64)
+        for domain, (ids, matrix) in list(self.blocks.items()):
+            keep = ~np.isin(ids, entity_ids)
+            if not keep.all():
+                self.blocks[domain] = (ids[keep], matrix[keep])
+
+    def refresh(self, user_id):
+        """Sync with the user's stored embeddings (e.g. written by another worker).
+
+        The row count and entity id sum tell whether anything changed since the
+        last refresh, whatever order the rows were committed in; then only the
+        rows missing here are loaded and those deleted since are dropped.
+        """
+        user_rows = EntityEmbedding.user_id == user_id
+        signature = tuple(db.session.execute(
+            db.select(db.func.count(EntityEmbedding.entity_id), db.func.sum(EntityEmbedding.entity_id))
+            .where(user_rows)
+        ).one())
+        if signature == self.signature:
+            return
+
+        stored = set(db.session.execute(db.select(EntityEmbedding.entity_id).where(user_rows)).scalars())
+        held = set()
+        for ids, _ in self.blocks.values():
+            held.update(ids.tolist())
+        if held - stored:
+            self.remove(held - stored)
+        missing = sorted(stored - held)
+        for start in range(0, len(missing), IN_CLAUSE_BATCH):
+            rows = db.session.execute(
+                db.select(EntityEmbedding.entity_id, EntityEmbedding.domain, EntityEmbedding.vector)
+                .where(EntityEmbedding.entity_id.in_(missing[start:start + IN_CLAUSE_BATCH]))
+            ).all()
+            if rows:
+                self.add(
+                    [r.entity_id for r in rows],
+                    [r.domain for r in rows],
+                    np.vstack([np.frombuffer(r.vector, dtype=np.float32) for r in rows])
+                )
+        self.signature = signature
+
+    def nearest(self, vectors, exclude_domain, top_k=EMBEDDING_TOP_K, min_score=EMBEDDING_MIN_SCORE):
+        """Top-k index entity ids per query vector, restricted to other domains.
+
+        All query vectors are scored together, one blocked matrix product per
+        other domain, and the per-domain top-k lists are merged.
+        """
+        results = [[] for _ in range(len(vectors))]
+        blocks = [(ids, matrix) for domain, (ids, matrix) in self.blocks.items()
+                  if domain != exclude_domain and len(ids)]
+        if not blocks or not len(vectors):
+            return results
+
+        found_ids, found_scores = [], []
+        for ids, matrix in blocks:
+            indices, scores = blocked_top_k(vectors, matrix, top_k)
+            found_ids.append(ids[indices])
+            found_scores.append(scores)
+        found_ids, found_scores = np.hstack(found_ids), np.hstack(found_scores)
+        order = np.argsort(-found_scores, axis=1, kind='stable')[:, :top_k]
+        found_ids = np.take_along_axis(found_ids, order, axis=1)
+        found_scores = np.take_along_axis(found_scores, order, axis=1)
+        for row in range(len(vectors)):
+            results[row] = [
+                int(entity_id) for entity_id, score in zip(found_ids[row], found_scores[row]) if score >= min_score
+            ]
+        return results
+
+# user_id -> EmbeddingIndex
+_embedding_indexes = {}
+
+def clear_embedding_cache(user_id=None):
+    """Forget the in-process embedding copies of one user (e.g. after entities were purged), or of all"""
+    if user_id is None:
+        _embedding_indexes.clear()
+    else:
+        _embedding_indexes.pop(user_id, None)
+
+def get_embedding_index(user_id):
+    index = _embedding_indexes.setdefault(user_id, EmbeddingIndex())
+    index.refresh(user_id)
+    return index
+
+def index_entities(dataset, entities, vectors=None):
+    """Add entities to the persistent term and embedding indexes"""
+    term_rows = [
+        {'term': term, 'entity_id': entity.id, 'user_id': dataset.user_id, 'domain': dataset.domain}
+        for entity in entities
+        for term in index_terms(entity.name)
+    ]
+    if term_rows:
+        db.session.execute(db.insert(EntityIndexTerm), term_rows)
+
+    if vectors is not None and len(entities):
+        db.session.execute(db.insert(EntityEmbedding), [
+            {'entity_id': entity.id, 'user_id': dataset.user_id,
+             'domain': dataset.domain, 'vector': vector.tobytes()}
+            for entity, vector in zip(entities, vectors)
+        ])
+
+def copy_index(entity_map, user_id, domain):
+    """Index copies of entities (old id -> new id) with the stored rows of the originals.
+
+    Only entities whose embedding is stored are copied, with their terms, so
+    linking can tell indexed entities by their embedding and index the rest itself.
+    """
+    old_ids = list(entity_map)
+    for start in range(0, len(old_ids), IN_CLAUSE_BATCH):
+        embeddings = db.session.execute(
+            db.select(EntityEmbedding.entity_id, EntityEmbedding.vector)
+            .where(EntityEmbedding.entity_id.in_(old_ids[start:start + IN_CLAUSE_BATCH]))
+        ).all()
+        if not embeddings:
+            continue
+        db.session.execute(db.insert(EntityEmbedding), [
+            {'entity_id': entity_map[entity_id], 'user_id': user_id, 'domain': domain, 'vector': vector}
+            for entity_id, vector in embeddings
+        ])
+        term_rows = [
+            {'term': term, 'entity_id': entity_map[entity_id], 'user_id': user_id, 'domain': domain}
+            for term, entity_id in db.session.execute(
+                db.select(EntityIndexTerm.term, EntityIndexTerm.entity_id)
+                .where(EntityIndexTerm.entity_id.in_([entity_id for entity_id, _ in embeddings])))
+        ]
+        if term_rows:
+            db.session.execute(db.insert(EntityIndexTerm), term_rows)
+
+def remove_from_index(entity_ids):
+    """Drop index rows of deleted entities, stored and in-process"""
+    entity_ids = list(entity_ids)
+    if not entity_ids:
+        return
+    for index in list(_embedding_indexes.values()):
+        index.remove(entity_ids)
+    for start in range(0, len(entity_ids), IN_CLAUSE_BATCH):
+        batch = entity_ids[start:start + IN_CLAUSE_BATCH]
+        EntityIndexTerm.query.filter(EntityIndexTerm.entity_id.in_(batch)).delete(synchronize_session=False)
+        EntityEmbedding.query.filter(EntityEmbedding.entity_id.in_(batch)).delete(synchronize_session=False)
+
+def _term_candidates(dataset, terms_by_entity):
+    """Index entity ids sharing a name term with each new entity"""
+    all_terms = sorted(set().union(*terms_by_entity.values()))
+    hits = {}
+    for start in range(0, len(all_terms), TERM_QUERY_BATCH):
+        # One LIMITed lookup per term: a hub term stops after MAX_TERM_CANDIDATES index hits
+        per_term = [
+            db.select(EntityIndexTerm.term, EntityIndexTerm.entity_id).where(
+                EntityIndexTerm.user_id == dataset.user_id,
+                EntityIndexTerm.term == term,
+                EntityIndexTerm.domain != dataset.domain
+            ).limit(MAX_TERM_CANDIDATES).subquery().select()
+            for term in all_terms[start:start + TERM_QUERY_BATCH]
+        ]
+        for term, entity_id in db.session.execute(db.union_all(*per_term)):
+            hits.setdefault(term, []).append(entity_id)
+
+    return {
+        entity_id: {candidate for term in terms for candidate in hits.get(term, ())}
+        for entity_id, terms in terms_by_entity.items()
+    }
+
+def link_new_entities(dataset, new_entities, encoder=None, exclude_dataset_ids=()):
+    """Link a dataset's new entities to other-domain entities already indexed.
+
+    Candidates come from the term index and, when an encoder is given, from
+    the embedding index, so the work done grows with the new entities rather
+    than with the number of stored datasets. The new entities are indexed
+    afterwards, except those already indexed (stored embedding, e.g. copied
+    with a cloned extraction), whose stored vectors are reused instead of
+    encoding their names again. Returns the number of relations created.
+    """
+    if not new_entities:
+        return 0
+    db.session.flush()
+
+    candidates = _term_candidates(dataset, {e.id: index_terms(e.name) for e in new_entities})
+
+    stored = stored_vectors(e.id for e in new_entities)
+    unindexed = [e for e in new_entities if e.id not in stored]
+    vectors = encoded = None
+    if encoder is not None:
+        encoded = encode_names([e.name for e in unindexed], encoder) if unindexed else []
+        by_id = dict(stored)
+        by_id.update(zip((e.id for e in unindexed), encoded))
+        vectors = np.vstack([by_id[e.id] for e in new_entities])
+        neighbours = get_embedding_index(dataset.user_id).nearest(vectors, dataset.domain)
+        for entity, entity_ids in zip(new_entities, neighbours):
+            candidates[entity.id].update(entity_ids)
+
+    candidate_ids = sorted(set().union(*candidates.values()))
+    excluded = set(exclude_dataset_ids) | {dataset.id}
+    known = {}
+    for start in range(0, len(candidate_ids), IN_CLAUSE_BATCH):
+        batch = candidate_ids[start:start + IN_CLAUSE_BATCH]
+        # Entities of datasets waiting for background deletion are not linked to
+        for entity in Entity.query.join(Entity.dataset).filter(Entity.id.in_(batch), Dataset.deleted.is_(False)):
+            if entity.dataset_id not in excluded:
+                known[entity.id] = entity
+
+    new_ids = [e.id for e in new_entities]
+    existing_pairs = set()
+    for start in range(0, len(new_ids), IN_CLAUSE_BATCH):
+        batch = new_ids[start:start + IN_CLAUSE_BATCH]
+        rows = db.session.execute(
+            db.select(Relation.entity1_id, Relation.entity2_id).where(
+                Relation.entity1_id.in_(batch) | Relation.entity2_id.in_(batch)
+            )
+        )
+        for entity1_id, entity2_id in rows:
+            existing_pairs.add(frozenset((entity1_id, entity2_id)))
+
+    relation_count = 0
+    for entity1 in new_entities:
+        for candidate_id in sorted(candidates[entity1.id]):
+            entity2 = known.get(candidate_id)
+            if entity2 is None or frozenset((entity1.id, entity2.id)) in existing_pairs:
+                continue
+
+            similarity = check_entity_similarity(entity1.name, entity2.name)
+            relation_type = cross_domain_relation_type(entity1, entity2, similarity)
+            if relation_type:
+                db.session.add(Relation(
+                    entity1_id=entity1.id,
+                    entity2_id=entity2.id,
+                    relation_type=relation_type,
+                    confidence=similarity,
+                    dataset_id=dataset.id,
+                    approved=False
+                ))
+                existing_pairs.add(frozenset((entity1.id, entity2.id)))
+                relation_count += 1
+
+    index_entities(dataset, unindexed, encoded)
+    return relation_count
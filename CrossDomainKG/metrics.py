@@ -0,0 +1,111 @@
+import contextvars
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from flask import Response, g, request
+from prometheus_client import CollectorRegistry, Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from sqlalchemy import event
+
+REGISTRY = CollectorRegistry()
+
+FAST_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SLOW_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+PAIR_BUCKETS = (10, 100, 1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+
+REQUEST_LATENCY = Histogram(
+    'kg_request_duration_seconds', 'Flask request latency by route',
+    ['method', 'endpoint', 'status'], buckets=FAST_BUCKETS, registry=REGISTRY)
+PARSE_SECONDS = Histogram(
+    'kg_spacy_parse_seconds', 'spaCy parse time per nlp.pipe() batch',
+    buckets=SLOW_BUCKETS, registry=REGISTRY)
+ENCODE_SECONDS = Histogram(
+    'kg_encode_seconds', 'Sentence encoder time per encode call',
+    buckets=SLOW_BUCKETS, registry=REGISTRY)
+DB_WRITE_SECONDS = Histogram(
+    'kg_db_write_seconds', 'Time spent in INSERT, UPDATE and DELETE statements',
+    buckets=FAST_BUCKETS, registry=REGISTRY)
+STAGE_SECONDS = Histogram(
+    'kg_stage_duration_seconds', 'Processing stage duration',
+    ['stage'], buckets=SLOW_BUCKETS, registry=REGISTRY)
+CROSS_DOMAIN_PAIRS = Histogram(
+    'kg_cross_domain_pairs', 'Entity pairs compared per dataset pair',
+    ['mode'], buckets=PAIR_BUCKETS, registry=REGISTRY)
+JOBS = Counter(
+    'kg_processing_jobs', 'Finished processing jobs by status',
+    ['status'], registry=REGISTRY)
+
+# Dedicated histograms; any other stage name goes to STAGE_SECONDS
+_STAGE_HISTOGRAMS = {
+    'parse': PARSE_SECONDS,
+    'encode': ENCODE_SECONDS,
+    'db_write': DB_WRITE_SECONDS,
+}
+
+# Per-stage totals of the processing job running in the current context, if any
+_job_stages = contextvars.ContextVar('kg_job_stages', default=None)
+
+def observe(stage, seconds):
+    """Record a stage duration in its histogram and in the current job's totals"""
+    histogram = _STAGE_HISTOGRAMS.get(stage)
+    if histogram is None:
+        histogram = STAGE_SECONDS.labels(stage)
+    histogram.observe(seconds)
+
+    stages = _job_stages.get()
+    if stages is not None:
+        stages[stage] += seconds
+
+@contextmanager
+def timed(stage):
+    """Time the enclosed block as one observation of a stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+@contextmanager
+def record_stages():
+    """Collect {stage: total seconds} for everything timed inside the block"""
+    stages = defaultdict(float)
+    token = _job_stages.set(stages)
+    try:
+        yield stages
+    finally:
+        _job_stages.reset(token)
+
+def instrument_engine(engine):
+    """Time every write statement executed on an engine"""
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info['kg_query_start'] = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _stop(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info.pop('kg_query_start', None)
+        if start is not None and statement.lstrip()[:6].upper() in ('INSERT', 'UPDATE', 'DELETE'):
+            observe('db_write', time.perf_counter() - start)
+
+def init_app(app, db):
+    """Time every request and serve the registry at /metrics"""
+    @app.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _observe_request(response):
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            # The route pattern keeps label cardinality bounded
+            endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+            REQUEST_LATENCY.labels(request.method, endpoint, response.status_code).observe(
+                time.perf_counter() - start)
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(generate_latest(REGISTRY), content_type=CONTENT_TYPE_LATEST)
+
+    with app.app_context():
+        instrument_engine(db.engine)
@@ -1,5 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy import event
+import json
 from datetime import datetime
 
 db = SQLAlchemy()
@@ -12,6 +14,7 @@ class User(UserMixin, db.Model):
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(200), nullable=False)
     is_admin = db.Column(db.Boolean, default=False)
+    profiling_enabled = db.Column(db.Boolean, default=False, server_default='0')  # set by admins
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
@@ -30,10 +33,23 @@ class Dataset(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
     processed = db.Column(db.Boolean, default=False)
+    version = db.Column(db.Integer, default=1, server_default='1')  # bumped whenever its graph changes
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    content_hash = db.Column(db.String(64), nullable=True, index=True)  # sha256 of the uploaded file
+    deleted = db.Column(db.Boolean, default=False, server_default='0', index=True)  # hidden, rows purged in the background
     
-    # Relationships
-    entities = db.relationship('Entity', backref='dataset', lazy=True, cascade='all, delete-orphan')
-    relations = db.relationship('Relation', backref='dataset', lazy=True, cascade='all, delete-orphan')
+    # Relationships (rows are removed by ON DELETE CASCADE, not loaded and deleted one by one)
+    entities = db.relationship('Entity', backref='dataset', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+    relations = db.relationship('Relation', backref='dataset', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+    chunks = db.relationship('DatasetChunk', backref='dataset', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+    processing_jobs = db.relationship('ProcessingJob', backref='dataset', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+    profile_reports = db.relationship('ProfileReport', backref='dataset', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+    graph_analyses = db.relationship('GraphAnalysis', backref='dataset', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+    extraction_caches = db.relationship('ExtractionCache', backref='dataset', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+    
+    __table_args__ = (
+        db.Index('ix_datasets_user_domain', 'user_id', 'domain'),
+    )
     
     def __repr__(self):
         return f'<Dataset {self.name}>'
@@ -51,13 +67,39 @@ class Dataset(db.Model):
             types[entity.type] = types.get(entity.type, 0) + 1
         return types
 
+# Provenance: which chunks of a dataset file mention an entity
+chunk_entities = db.Table(
+    'chunk_entities',
+    db.Column('chunk_id', db.Integer, db.ForeignKey('dataset_chunks.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('entity_id', db.Integer, db.ForeignKey('entities.id', ondelete='CASCADE'), primary_key=True, index=True)
+)
+
+class DatasetChunk(db.Model):
+    __tablename__ = 'dataset_chunks'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    dataset_id = db.Column(db.Integer, db.ForeignKey('datasets.id', ondelete='CASCADE'), nullable=False)
+    position = db.Column(db.Integer, nullable=False)
+    content_hash = db.Column(db.String(64), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    entities = db.relationship('Entity', secondary=chunk_entities, lazy=True, backref='chunks')
+    
+    __table_args__ = (
+        db.Index('ix_dataset_chunks_dataset_hash', 'dataset_id', 'content_hash'),
+    )
+    
+    def __repr__(self):
+        return f'<DatasetChunk {self.dataset_id}:{self.position}>'
+
 class Entity(db.Model):
     __tablename__ = 'entities'
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
     type = db.Column(db.String(50), nullable=False)
-    dataset_id = db.Column(db.Integer, db.ForeignKey('datasets.id'), nullable=False)
+    dataset_id = db.Column(db.Integer, db.ForeignKey('datasets.id', ondelete='CASCADE'), nullable=False)
     confidence = db.Column(db.Float, default=1.0)
     merged_with = db.Column(db.Integer, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -67,12 +109,19 @@ class Entity(db.Model):
                                     foreign_keys='Relation.entity1_id',
                                     backref='entity1_ref',
                                     lazy=True,
-                                    cascade='all, delete-orphan')
+                                    cascade='all, delete-orphan',
+                                    passive_deletes=True)
     relations_to = db.relationship('Relation',
                                   foreign_keys='Relation.entity2_id',
                                   backref='entity2_ref',
                                   lazy=True,
-                                  cascade='all, delete-orphan')
+                                  cascade='all, delete-orphan',
+                                  passive_deletes=True)
+    
+    # Facet filters of the graph API
+    __table_args__ = (
+        db.Index('ix_entities_dataset_type', 'dataset_id', 'type'),
+    )
     
     def __repr__(self):
         return f'<Entity {self.name} ({self.type})>'
@@ -90,11 +139,12 @@ class Relation(db.Model):
     __tablename__ = 'relations'
     
     id = db.Column(db.Integer, primary_key=True)
-    entity1_id = db.Column(db.Integer, db.ForeignKey('entities.id'), nullable=False)
-    entity2_id = db.Column(db.Integer, db.ForeignKey('entities.id'), nullable=False)
+    entity1_id = db.Column(db.Integer, db.ForeignKey('entities.id', ondelete='CASCADE'), nullable=False)
+    entity2_id = db.Column(db.Integer, db.ForeignKey('entities.id', ondelete='CASCADE'), nullable=False)
     relation_type = db.Column(db.String(100), nullable=False)
     confidence = db.Column(db.Float, default=1.0)
-    dataset_id = db.Column(db.Integer, db.ForeignKey('datasets.id'), nullable=False)
+    dataset_id = db.Column(db.Integer, db.ForeignKey('datasets.id', ondelete='CASCADE'), nullable=False)
+    chunk_id = db.Column(db.Integer, db.ForeignKey('dataset_chunks.id', ondelete='CASCADE'), nullable=True, index=True)
     approved = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -102,6 +152,12 @@ class Relation(db.Model):
     entity1 = db.relationship('Entity', foreign_keys=[entity1_id], overlaps="relations_from,entity1_ref")
     entity2 = db.relationship('Entity', foreign_keys=[entity2_id], overlaps="relations_to,entity2_ref")
     
+    # Facet filters of the graph API
+    __table_args__ = (
+        db.Index('ix_relations_dataset_type', 'dataset_id', 'relation_type'),
+        db.Index('ix_relations_dataset_approved_confidence', 'dataset_id', 'approved', 'confidence'),
+    )
+    
     def __repr__(self):
         return f'<Relation {self.entity1.name} - {self.relation_type} - {self.entity2.name}>'
     
@@ -118,11 +174,34 @@ class Relation(db.Model):
             'dataset_id': self.dataset_id
         }
 
+# Name index used to find cross-domain link candidates without scanning
+class EntityIndexTerm(db.Model):
+    __tablename__ = 'entity_index_terms'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    term = db.Column(db.String(100), nullable=False)
+    entity_id = db.Column(db.Integer, db.ForeignKey('entities.id', ondelete='CASCADE'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    domain = db.Column(db.String(50), nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_entity_index_terms_user_term', 'user_id', 'term'),
+    )
+
+# Normalised float32 name embedding of an entity
+class EntityEmbedding(db.Model):
+    __tablename__ = 'entity_embeddings'
+    
+    entity_id = db.Column(db.Integer, db.ForeignKey('entities.id', ondelete='CASCADE'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    domain = db.Column(db.String(50), nullable=False)
+    vector = db.Column(db.LargeBinary, nullable=False)
+
 class ProcessingJob(db.Model):
     __tablename__ = 'processing_jobs'
     
     id = db.Column(db.Integer, primary_key=True)
-    dataset_id = db.Column(db.Integer, db.ForeignKey('datasets.id'), nullable=False)
+    dataset_id = db.Column(db.Integer, db.ForeignKey('datasets.id', ondelete='CASCADE'), nullable=False)
     status = db.Column(db.String(20), default='pending')  # pending, processing, completed, failed
     progress = db.Column(db.Integer, default=0)
     error_message = db.Column(db.Text, nullable=True)
@@ -130,18 +209,146 @@ class ProcessingJob(db.Model):
     completed_at = db.Column(db.DateTime, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    # Relationship
-    dataset = db.relationship('Dataset', backref='processing_jobs')
+    # What the run produced and where its time went
+    entity_count = db.Column(db.Integer, default=0)
+    relation_count = db.Column(db.Integer, default=0)
+    stage_timings = db.Column(db.Text, nullable=True)  # JSON {stage: seconds}
     
     def __repr__(self):
         return f'<ProcessingJob {self.dataset_id} - {self.status}>'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'dataset_id': self.dataset_id,
+            'status': self.status,
+            'error_message': self.error_message,
+            'entity_count': self.entity_count,
+            'relation_count': self.relation_count,
+            'stage_timings': json.loads(self.stage_timings) if self.stage_timings else {},
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+        }
+
+# cProfile and tracemalloc report of one profiled run
+class ProfileReport(db.Model):
+    __tablename__ = 'profile_reports'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    target = db.Column(db.String(50), nullable=False)  # process_dataset, find_cross_domain_relations, semantic_search
+    dataset_id = db.Column(db.Integer, db.ForeignKey('datasets.id', ondelete='CASCADE'), nullable=True, index=True)
+    job_id = db.Column(db.Integer, db.ForeignKey('processing_jobs.id', ondelete='CASCADE'), nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    context = db.Column(db.String(200), nullable=True)
+    wall_seconds = db.Column(db.Float, nullable=True)
+    peak_memory_bytes = db.Column(db.Integer, nullable=True)
+    error_message = db.Column(db.Text, nullable=True)
+    stats_text = db.Column(db.Text, nullable=True)
+    memory_text = db.Column(db.Text, nullable=True)
+    profile_data = db.Column(db.LargeBinary, nullable=True)  # marshalled pstats
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ProfileReport {self.target} {self.id}>'
+    
+    def to_dict(self, full=False):
+        data = {
+            'id': self.id,
+            'target': self.target,
+            'dataset_id': self.dataset_id,
+            'job_id': self.job_id,
+            'user_id': self.user_id,
+            'context': self.context,
+            'wall_seconds': self.wall_seconds,
+            'peak_memory_bytes': self.peak_memory_bytes,
+            'error_message': self.error_message,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+        if full:
+            data['stats'] = self.stats_text
+            data['memory'] = self.memory_text
+        return data
+
+# One run of graph analytics over a set of datasets (a single dataset or a user's whole graph)
+class GraphAnalysis(db.Model):
+    __tablename__ = 'graph_analyses'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    dataset_id = db.Column(db.Integer, db.ForeignKey('datasets.id', ondelete='CASCADE'), nullable=True)  # set for single-dataset runs
+    scope = db.Column(db.String(500), nullable=False)  # comma-separated dataset ids
+    signature = db.Column(db.String(500), nullable=False)  # dataset versions and graph sizes it was computed on
+    node_count = db.Column(db.Integer, default=0)
+    edge_count = db.Column(db.Integer, default=0)
+    component_count = db.Column(db.Integer, default=0)
+    betweenness_samples = db.Column(db.Integer, default=0)
+    seconds = db.Column(db.Float, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    metrics = db.relationship('EntityMetric', backref='analysis', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+    
+    __table_args__ = (
+        db.Index('ix_graph_analyses_user_scope', 'user_id', 'scope'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'dataset_ids': [int(i) for i in self.scope.split(',') if i],
+            'node_count': self.node_count,
+            'edge_count': self.edge_count,
+            'component_count': self.component_count,
+            'betweenness_samples': self.betweenness_samples,
+            'seconds': self.seconds,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+# Centrality of one entity in one analysis run
+class EntityMetric(db.Model):
+    __tablename__ = 'entity_metrics'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    analysis_id = db.Column(db.Integer, db.ForeignKey('graph_analyses.id', ondelete='CASCADE'), nullable=False)
+    entity_id = db.Column(db.Integer, db.ForeignKey('entities.id', ondelete='CASCADE'), nullable=False)
+    pagerank = db.Column(db.Float, nullable=False)
+    degree = db.Column(db.Integer, nullable=False)
+    cross_domain_degree = db.Column(db.Integer, nullable=False)  # neighbours in other domains
+    betweenness = db.Column(db.Float, nullable=False)
+    component = db.Column(db.Integer, nullable=False)
+    component_size = db.Column(db.Integer, nullable=False)
+    
+    # Sorted, paginated reads per metric
+    __table_args__ = (
+        db.Index('ix_entity_metrics_analysis_pagerank', 'analysis_id', 'pagerank'),
+        db.Index('ix_entity_metrics_analysis_degree', 'analysis_id', 'degree'),
+        db.Index('ix_entity_metrics_analysis_cross_domain', 'analysis_id', 'cross_domain_degree'),
+        db.Index('ix_entity_metrics_analysis_betweenness', 'analysis_id', 'betweenness'),
+    )
+
+# A dataset whose extracted chunks, entities and relations can be cloned for another
+# upload of the same file content processed by the same pipeline version
+class ExtractionCache(db.Model):
+    __tablename__ = 'extraction_cache'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    content_hash = db.Column(db.String(64), nullable=False)
+    pipeline_version = db.Column(db.String(200), nullable=False)
+    dataset_id = db.Column(db.Integer, db.ForeignKey('datasets.id', ondelete='CASCADE'), nullable=False)
+    entity_count = db.Column(db.Integer, default=0)
+    relation_count = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_extraction_cache_key', 'content_hash', 'pipeline_version', 'dataset_id', unique=True),
+    )
 
 class Feedback(db.Model):
     __tablename__ = 'feedback'
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    relation_id = db.Column(db.Integer, db.ForeignKey('relations.id'), nullable=True)
+    relation_id = db.Column(db.Integer, db.ForeignKey('relations.id', ondelete='SET NULL'), nullable=True)
     feedback_type = db.Column(db.String(20), nullable=False)  # correct, incorrect, suggestion
     comment = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -151,4 +358,67 @@ class Feedback(db.Model):
     relation = db.relationship('Relation', backref='feedback')
     
     def __repr__(self):
-        return f'<Feedback {self.feedback_type} by {self.user.username}>'
\ No newline at end of file
+        return f'<Feedback {self.feedback_type} by {self.user.username}>'
+
+def bump_dataset_versions(dataset_ids):
+    """Mark datasets as changed: new version and modification time, used as HTTP cache validators"""
+    dataset_ids = {i for i in dataset_ids if i is not None}
+    if dataset_ids:
+        db.session.execute(
+            db.update(Dataset).where(Dataset.id.in_(dataset_ids))
+            .values(version=db.func.coalesce(Dataset.version, 1) + 1, updated_at=datetime.utcnow())
+            .execution_options(synchronize_session='fetch')
+        )
+
+def insert_returning_ids(model, rows):
+    """Insert rows and return their new primary keys in the order of rows.
+
+    One INSERT ... RETURNING where the database supports it (SQLite 3.35 and
+    later); older SQLite libraries get one INSERT per row.
+    """
+    if not rows:
+        return []
+    if db.session.get_bind().dialect.insert_returning:
+        return db.session.execute(
+            db.insert(model).returning(model.id, sort_by_parameter_order=True), rows).scalars().all()
+    return [db.session.execute(model.__table__.insert(), row).inserted_primary_key[0] for row in rows]
+
+def upgrade_schema():
+    """Add columns and indexes introduced after a table was first created"""
+    inspector = db.inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            
+            existing_columns = {c['name'] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                ddl = f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=conn.dialect)}'
+                if column.server_default is not None:
+                    ddl += f" DEFAULT {column.server_default.arg}"
+                conn.execute(db.text(ddl))
+            
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+def enable_sqlite_foreign_keys(engine):
+    """Enforce foreign keys, and so ON DELETE CASCADE, on SQLite connections.
+
+    Skipped for database files whose tables were created before the cascades
+    were declared: SQLite cannot add them to existing tables, and enforcing
+    the plain keys there would reject deletes the application relies on.
+    """
+    if engine.dialect.name != 'sqlite':
+        return
+    
+    @event.listens_for(engine, 'connect')
+    def _foreign_keys(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        actions = {row[6] for row in cursor.execute('PRAGMA foreign_key_list(relations)')}
+        if actions <= {'CASCADE'}:  # new database, or created with the cascades
+            cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
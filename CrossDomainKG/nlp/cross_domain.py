@@ -0,0 +1,87 @@
+from difflib import SequenceMatcher
+
+# Similarity cut-offs used by every cross-domain linking path
+SAME_AS_THRESHOLD = 0.7
+RELATED_THRESHOLD = 0.4
+
+def check_entity_similarity(name1, name2):
+    """Check if two entity names are similar"""
+    if not name1 or not name2:
+        return 0.0
+    
+    name1 = name1.lower().strip()
+    name2 = name2.lower().strip()
+    
+    # Exact match
+    if name1 == name2:
+        return 1.0
+    
+    # Direct string similarity
+    direct_similarity = SequenceMatcher(None, name1, name2).ratio()
+    
+    # Check if one is substring of another
+    if name1 in name2 or name2 in name1:
+        substring_boost = 0.2
+    else:
+        substring_boost = 0
+    
+    # Check for word overlap
+    words1 = set(name1.split())
+    words2 = set(name2.split())
+    if words1 and words2:
+        word_overlap = len(words1.intersection(words2)) / max(len(words1), len(words2))
+        word_boost = word_overlap * 0.1
+    else:
+        word_boost = 0
+    
+    final_score = min(direct_similarity + substring_boost + word_boost, 1.0)
+    return final_score
+
+def infer_cross_domain_relation(entity1, entity2):
+    """Infer possible relation between entities from different domains"""
+    
+    # Common cross-domain relation patterns
+    relation_patterns = [
+        ('PERSON', 'ORG', 'works_for'),
+        ('PERSON', 'GPE', 'lives_in'),
+        ('ORG', 'GPE', 'located_in'),
+        ('PRODUCT', 'ORG', 'produced_by'),
+        ('TECHNOLOGY', 'SCIENCE', 'based_on'),
+        ('DISEASE', 'MEDICINE', 'treated_by'),
+        ('LAW', 'COUNTRY', 'applicable_in'),
+        ('PERSON', 'PRODUCT', 'invented'),
+        ('ORG', 'PRODUCT', 'develops'),
+        ('SCIENCE', 'TECHNOLOGY', 'enables')
+    ]
+    
+    for type1, type2, relation in relation_patterns:
+        if (entity1.type == type1 and entity2.type == type2):
+            return relation
+        elif (entity1.type == type2 and entity2.type == type1):
+            return reverse_relation(relation)
+    
+    return None
+
+def reverse_relation(relation):
+    """Get reverse of a relation"""
+    reversals = {
+        'works_for': 'employs',
+        'lives_in': 'has_resident',
+        'located_in': 'contains',
+        'produced_by': 'produces',
+        'based_on': 'used_in',
+        'treated_by': 'treats',
+        'applicable_in': 'has_law',
+        'invented': 'was_invented_by',
+        'develops': 'developed_by',
+        'enables': 'enabled_by'
+    }
+    return reversals.get(relation, 'related_to')
+
+def cross_domain_relation_type(entity1, entity2, similarity):
+    """Relation type to create for a scored cross-domain pair, or None"""
+    if similarity > SAME_AS_THRESHOLD:  # High similarity - likely same concept
+        return 'same_as'
+    if similarity > RELATED_THRESHOLD:  # Medium similarity - possible relation
+        return infer_cross_domain_relation(entity1, entity2)
+    return None
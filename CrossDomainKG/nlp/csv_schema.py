@@ -0,0 +1,106 @@
+import csv
+import re
+from itertools import islice
+
+# Rows read to infer the schema of a file
+SAMPLE_ROWS = 200
+
+# Column-name keywords mapped to entity types, checked in order
+COLUMN_TYPES = [
+    (('project', 'product', 'tool', 'device'), 'PRODUCT'),
+    (('doctor', 'physician', 'researcher', 'author', 'patient', 'person', 'employee'), 'PERSON'),
+    (('hospital', 'clinic', 'institution', 'organization', 'organisation', 'company', 'university'), 'ORG'),
+    (('diagnosis', 'disease', 'condition', 'symptom', 'illness'), 'DISEASE'),
+    (('medication', 'medicine', 'drug', 'treatment', 'prescription'), 'MEDICINE'),
+    (('algorithm', 'technology', 'technique', 'model', 'method'), 'TECHNOLOGY'),
+    (('domain', 'field', 'discipline', 'science'), 'SCIENCE'),
+    (('city', 'country', 'state', 'location', 'region'), 'GPE'),
+]
+
+# Types preferred as the subject each row's relations hang off
+SUBJECT_TYPES = ('PERSON', 'PRODUCT')
+
+NUMBER_RE = re.compile(r'^-?[\d,]*\.?\d+$')
+DATE_RE = re.compile(r'^(\d{4}-\d{1,2}-\d{1,2}|\d{1,2}[/-]\d{1,2}[/-]\d{2,4})([ T].*)?$')
+
+def snake_case(name):
+    """PatientID -> patient_id, Lead Researcher -> lead_researcher"""
+    name = re.sub(r'([a-z0-9])([A-Z])', r'\1_\2', name.strip())
+    return re.sub(r'\W+', '_', name).strip('_').lower()
+
+def _name_tokens(key):
+    """Words of a snake_case column name, plural words also in their singular form"""
+    tokens = set(key.split('_'))
+    for token in list(tokens):
+        if token.endswith('ies'):
+            tokens.add(token[:-3] + 'y')
+        elif token.endswith('s') and not token.endswith('ss'):
+            tokens.add(token[:-1])
+    return tokens
+
+def column_entity_type(column):
+    """Entity type for a column from its name; keywords match whole words, so Capacity is not a city"""
+    key = snake_case(column)
+    tokens = _name_tokens(key)
+    for keywords, entity_type in COLUMN_TYPES:
+        if tokens.intersection(keywords):
+            return entity_type
+    if key in ('name', 'full_name', 'fullname'):
+        return 'PERSON'
+    return key.upper()
+
+def _classify(column, values):
+    """Return 'id', 'skip' or 'entity' for a column given sampled values"""
+    if not values:
+        return 'skip'
+    if snake_case(column) == 'id' or snake_case(column).endswith('_id'):
+        return 'id'
+
+    ratio = lambda pattern: sum(1 for v in values if pattern.match(v)) / len(values)
+    if ratio(NUMBER_RE) >= 0.9 or ratio(DATE_RE) >= 0.9:
+        return 'skip'
+    # Short codes such as M/F flags
+    if all(len(v) <= 2 for v in values):
+        return 'skip'
+    # Free text is left to the NLP pipeline
+    if sum(len(v) for v in values) / len(values) > 80:
+        return 'skip'
+    return 'entity'
+
+def infer_csv_schema(filepath, sample_rows=SAMPLE_ROWS):
+    """Infer which columns hold entities and which column is the row subject.
+
+    Returns a dict with the header, {column index: entity type} for entity
+    columns, and the subject column index (or None). An id column becomes a
+    RECORD subject when no entity column is unique enough.
+    """
+    with open(filepath, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        sample = list(islice(reader, sample_rows))
+
+    entities = {}
+    id_column = None
+    unique_ratio = {}
+    for index, column in enumerate(header):
+        values = [row[index].strip() for row in sample if index < len(row) and row[index].strip()]
+        kind = _classify(column, values)
+        if kind == 'id' and id_column is None:
+            id_column = index
+        elif kind == 'entity':
+            entities[index] = column_entity_type(column)
+            unique_ratio[index] = len(set(values)) / len(values)
+
+    unique = [i for i in entities if unique_ratio[i] >= 0.9]
+    subject = next((i for i in unique if entities[i] in SUBJECT_TYPES), None)
+    if subject is None and unique:
+        subject = unique[0]
+    if subject is None and id_column is not None and entities:
+        entities[id_column] = 'RECORD'
+        subject = id_column
+
+    return {'header': header, 'entities': entities, 'subject': subject}
+
+def relation_type_for(column):
+    """Relation from a row subject to the value of another column"""
+    return f'has_{snake_case(column)}'
@@ -0,0 +1,76 @@
+import numpy as np
+
+from nlp.cross_domain import check_entity_similarity
+
+# Tile sizes bound the score matrix held in memory to ROW_BLOCK x (COL_BLOCK + k) floats
+ROW_BLOCK = 1024
+COL_BLOCK = 8192
+
+# Weight of the embedding cosine in the combined score; the rest is the string score
+EMBEDDING_WEIGHT = 0.6
+
+def normalize_rows(vectors):
+    """L2-normalise rows so dot products are cosine similarities"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def blocked_top_k(queries, keys, k, row_block=ROW_BLOCK, col_block=COL_BLOCK):
+    """Top-k most similar keys for every query row.
+
+    Scores are computed tile by tile and merged into a running top-k per row,
+    so memory stays bounded however many keys there are. Returns (indices,
+    scores) arrays of shape (len(queries), k), each row sorted best first.
+    """
+    n, m = len(queries), len(keys)
+    k = min(k, m)
+    indices = np.zeros((n, k), dtype=np.int64)
+    scores = np.full((n, k), -np.inf, dtype=np.float32)
+    if n == 0 or k == 0:
+        return indices, scores
+
+    for r0 in range(0, n, row_block):
+        q = queries[r0:r0 + row_block]
+        best_idx = np.zeros((len(q), 0), dtype=np.int64)
+        best_score = np.zeros((len(q), 0), dtype=np.float32)
+
+        for c0 in range(0, m, col_block):
+            tile = q @ keys[c0:c0 + col_block].T
+            tile_idx = np.broadcast_to(np.arange(c0, c0 + tile.shape[1]), tile.shape)
+
+            merged_score = np.hstack([best_score, tile])
+            merged_idx = np.hstack([best_idx, tile_idx])
+            if merged_score.shape[1] > k:
+                part = np.argpartition(-merged_score, k - 1, axis=1)[:, :k]
+                merged_score = np.take_along_axis(merged_score, part, axis=1)
+                merged_idx = np.take_along_axis(merged_idx, part, axis=1)
+            best_score, best_idx = merged_score, merged_idx
+
+        order = np.argsort(-best_score, axis=1, kind='stable')
+        scores[r0:r0 + len(q)] = np.take_along_axis(best_score, order, axis=1)
+        indices[r0:r0 + len(q)] = np.take_along_axis(best_idx, order, axis=1)
+
+    return indices, scores
+
+def embedding_similarity_pairs(names1, vectors1, names2, vectors2, top_k=10, min_cosine=0.5):
+    """Candidate pairs between two name lists, ranked by embeddings and re-ranked by string score.
+
+    Returns (i, j, combined_score) tuples for every pair that survives the
+    cosine cut-off, ordered by i then j.
+    """
+    if not len(names1) or not len(names2):
+        return []
+
+    indices, cosines = blocked_top_k(normalize_rows(vectors1), normalize_rows(vectors2), top_k)
+    pairs = []
+    for i in range(len(names1)):
+        for j, cosine in zip(indices[i], cosines[i]):
+            if cosine < min_cosine:
+                continue
+            string_score = check_entity_similarity(names1[i], names2[j])
+            combined = EMBEDDING_WEIGHT * float(cosine) + (1 - EMBEDDING_WEIGHT) * string_score
+            pairs.append((i, int(j), min(combined, 1.0)))
+
+    pairs.sort(key=lambda p: (p[0], p[1]))
+    return pairs
@@ -1,22 +1,98 @@
 import networkx as nx
 from pyvis.network import Network
 
-def build_knowledge_graph(entities, relations):
-    """Build NetworkX graph from entities and relations"""
+# Edge confidence buckets of GraphIndex: name -> lower bound, highest first
+CONFIDENCE_BUCKETS = (('high', 0.8), ('medium', 0.5), ('low', 0.0))
+
+def build_knowledge_graph(entities, relations, domains=None):
+    """Build NetworkX graph from entities and relations; domains maps dataset id -> domain"""
     G = nx.Graph()
+    domains = domains or {}
     
     # Add nodes
     for entity in entities:
-        G.add_node(entity.id, label=entity.name, type=entity.type)
+        G.add_node(entity.id, label=entity.name, type=entity.type,
+                   dataset_id=entity.dataset_id, domain=domains.get(entity.dataset_id))
     
     # Add edges
     for relation in relations:
         G.add_edge(relation.entity1_id, relation.entity2_id, 
                   label=relation.relation_type, 
-                  confidence=relation.confidence)
+                  confidence=relation.confidence,
+                  approved=relation.approved)
     
     return G
 
+def confidence_bucket(confidence):
+    for name, low in CONFIDENCE_BUCKETS:
+        if (confidence if confidence is not None else 1.0) >= low:
+            return name
+    return 'low'
+
+class GraphIndex:
+    """Secondary indexes over node and edge attributes of a graph.
+    
+    Each facet maps a value to the set of nodes or edges that have it, so a
+    combined filter is the intersection of a few sets instead of a scan.
+    Node facets: type, domain, dataset_id. Edge facets: label, approved, bucket.
+    Edges of a multigraph are told apart by their key, so parallel relations stay separate.
+    """
+    NODE_FACETS = ('type', 'domain', 'dataset_id')
+    EDGE_FACETS = ('label', 'approved', 'bucket')
+    
+    def __init__(self, graph):
+        self.graph = graph
+        self.nodes = {facet: {} for facet in self.NODE_FACETS}
+        self.edges = {facet: {} for facet in self.EDGE_FACETS}
+        for node, data in graph.nodes(data=True):
+            for facet in self.NODE_FACETS:
+                self.nodes[facet].setdefault(_key(data.get(facet)), set()).add(node)
+        edges = graph.edges(keys=True, data=True) if graph.is_multigraph() else graph.edges(data=True)
+        for *edge, data in edges:
+            values = {'label': data.get('label'), 'approved': bool(data.get('approved')),
+                      'bucket': confidence_bucket(data.get('confidence'))}
+            for facet in self.EDGE_FACETS:
+                self.edges[facet].setdefault(_key(values[facet]), set()).add(tuple(edge))
+    
+    @staticmethod
+    def _match(index, filters):
+        """Intersection over facets of the union over each facet's accepted values; None if unfiltered"""
+        selected = []
+        for facet, values in filters.items():
+            if values is None:
+                continue
+            if not isinstance(values, (list, tuple, set, frozenset)):
+                values = [values]
+            postings = index[facet]
+            selected.append(set().union(*(postings.get(_key(v), ()) for v in values)))
+        if not selected:
+            return None
+        selected.sort(key=len)
+        return selected[0].intersection(*selected[1:])
+    
+    def filter(self, node_filters=None, edge_filters=None):
+        """Subgraph view of the nodes and edges matching every given facet"""
+        nodes = self._match(self.nodes, node_filters or {})
+        edges = self._match(self.edges, edge_filters or {})
+        if nodes is None and edges is None:
+            return self.graph
+        view = self.graph
+        if nodes is not None:
+            view = nx.subgraph_view(view, filter_node=nodes.__contains__)
+        if edges is not None:
+            if view.is_multigraph():
+                def keep(u, v, key):
+                    return (u, v, key) in edges or (v, u, key) in edges
+            else:
+                def keep(u, v):
+                    return (u, v) in edges or (v, u) in edges
+            view = nx.subgraph_view(view, filter_edge=keep)
+        return view
+
+def _key(value):
+    """Facet values compare case-insensitively"""
+    return value.lower() if isinstance(value, str) else value
+
 def get_subgraph(graph, center_entity, depth=2):
     """Get subgraph centered around an entity"""
     if center_entity not in graph:
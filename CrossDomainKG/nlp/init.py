@@ -1,5 +1,5 @@
 from .preprocessing import preprocess_text
 from .ner import extract_entities
-from .relation_extraction import extract_relations
-from .graph_builder import build_knowledge_graph, get_subgraph
+from .relation_extraction import extract_relations, doc_relations, relation_triples, relation_triples_many, register_relation_patterns
+from .graph_builder import build_knowledge_graph, get_subgraph, GraphIndex
 from .semantic_search import semantic_search, initialize_encoder
\ No newline at end of file
@@ -0,0 +1,77 @@
+import gc
+import os
+import threading
+import time
+
+import spacy
+
+DEFAULT_MODEL = "en_core_web_sm"
+
+# (model name, disabled components) -> loaded model
+_models = {}
+_stats = {}
+_lock = threading.Lock()
+
+def _rss_bytes():
+    """Resident memory of this process in bytes"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        try:
+            import resource
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        except ImportError:
+            return 0
+
+def _load_once(key, loader):
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _lock:
+        if key in _models:
+            return _models[key]
+
+        rss_before = _rss_bytes()
+        start = time.perf_counter()
+        model = loader()
+        _stats[key] = {
+            "name": key[0],
+            "disable": list(key[1]),
+            "load_seconds": round(time.perf_counter() - start, 3),
+            "memory_bytes": max(_rss_bytes() - rss_before, 0),
+            "pid": os.getpid(),
+        }
+        _models[key] = model
+    return model
+
+def get_model(name=DEFAULT_MODEL, disable=()):
+    """Return a spaCy model, loading it once per process on first use"""
+    disable = tuple(sorted(disable))
+    return _load_once((name, disable), lambda: spacy.load(name, disable=list(disable)))
+
+def get_encoder():
+    """Return the sentence encoder used for search and linking, loaded once per process"""
+    from nlp.semantic_search import initialize_encoder
+    return _load_once(("sentence-encoder", ()), initialize_encoder)
+
+def model_stats():
+    """Load time and memory of every model loaded in this process"""
+    return [dict(stats) for stats in _stats.values()]
+
+def preload(*specs, encoder=False, freeze=True):
+    """Load models in the parent process before forking workers.
+
+    gc.freeze() moves the loaded objects out of garbage collection so their
+    copy-on-write pages stay shared with forked workers.
+    """
+    for spec in specs or (DEFAULT_MODEL,):
+        if isinstance(spec, str):
+            get_model(spec)
+        else:
+            get_model(*spec)
+    if encoder:
+        get_encoder()
+    if freeze:
+        gc.freeze()
@@ -0,0 +1,60 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from nlp.cross_domain import check_entity_similarity, RELATED_THRESHOLD
+
+# Names per side of one unit of work sent to a worker
+BLOCK_SIZE = 256
+
+def _score_block(task):
+    """Worker: score one block of names against another with the string heuristic"""
+    offset1, names1, new1, offset2, names2, new2, min_score = task
+    results = []
+    for i, name1 in enumerate(names1):
+        for j, name2 in enumerate(names2):
+            if new1 is not None and not (new1[i] or new2[j]):
+                continue
+            score = check_entity_similarity(name1, name2)
+            if score > min_score:
+                results.append((offset1 + i, offset2 + j, score))
+    return results
+
+def _blocks(values, block_size):
+    for start in range(0, len(values), block_size):
+        yield start, values[start:start + block_size]
+
+def score_pairs_parallel(name_lists, pairs, new_masks=None, max_workers=None,
+                         block_size=BLOCK_SIZE, min_score=RELATED_THRESHOLD):
+    """Score name pairs of several (list_a, list_b) combinations on a process pool.
+
+    name_lists maps a key to a tuple of names; pairs lists (key_a, key_b)
+    combinations to compare. new_masks optionally maps each key to a bytes
+    object flagging new names, and pairs with no new name are skipped.
+    Returns one list of (i, j, score) per pair, ordered by i then j exactly
+    like nested serial loops, keeping only scores above min_score.
+    """
+    tasks = []
+    owners = []
+    for pair_index, (key1, key2) in enumerate(pairs):
+        names1, names2 = name_lists[key1], name_lists[key2]
+        for offset1, block1 in _blocks(names1, block_size):
+            for offset2, block2 in _blocks(names2, block_size):
+                new1 = new2 = None
+                if new_masks is not None:
+                    new1 = new_masks[key1][offset1:offset1 + block_size]
+                    new2 = new_masks[key2][offset2:offset2 + block_size]
+                    if not (any(new1) or any(new2)):
+                        continue
+                tasks.append((offset1, block1, new1, offset2, block2, new2, min_score))
+                owners.append(pair_index)
+
+    results = [[] for _ in pairs]
+    if not tasks:
+        return results
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for pair_index, block_results in zip(owners, executor.map(_score_block, tasks, chunksize=4)):
+            results[pair_index].extend(block_results)
+
+    for pair_results in results:
+        pair_results.sort(key=lambda r: (r[0], r[1]))
+    return results
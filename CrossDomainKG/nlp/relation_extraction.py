@@ -1,36 +1,120 @@
-import spacy
+import numpy as np
+from spacy.attrs import DEP, POS, HEAD
+from spacy.parts_of_speech import IDS as POS_IDS
+from spacy.strings import get_string_id
 
-def extract_relations(text, entities, nlp_model):
-    """Extract relationships between entities"""
-    doc = nlp_model(text)
-    relations = []
-    
-    # Simple pattern-based relation extraction
-    for token in doc:
-        if token.dep_ in ('nsubj', 'nsubjpass') and token.head.pos_ == 'VERB':
-            subject = token.text
-            verb = token.head.text
-            for child in token.head.children:
-                if child.dep_ in ('dobj', 'attr', 'prep'):
-                    object_text = child.text
-                    
-                    # Find corresponding entity objects
-                    entity1 = find_entity(subject, entities)
-                    entity2 = find_entity(object_text, entities)
-                    
-                    if entity1 and entity2:
-                        relations.append({
-                            'entity1': entity1,
-                            'entity2': entity2,
-                            'type': verb,
-                            'confidence': 0.85
-                        })
-    
-    return relations
+# Dependency patterns of a (subject, verb, object) relation: a subject child and an
+# object child of the same verb. Domains not listed use 'default'; a domain entry
+# only needs the keys it changes.
+RELATION_PATTERNS = {
+    'default': {
+        'subject_deps': ('nsubj', 'nsubjpass'),
+        'verb_pos': ('VERB',),
+        'object_deps': ('dobj', 'attr', 'prep'),
+        'confidence': 0.85,
+    },
+}
+
+# domain -> compiled patterns (integer attribute ids)
+_compiled = {}
+
+def register_relation_patterns(domain, **patterns):
+    """Override relation patterns for one domain, e.g. object_deps=('dobj', 'pobj')"""
+    RELATION_PATTERNS[domain] = patterns
+    _compiled.pop(domain, None)
+
+def relation_patterns(domain=None):
+    """Compiled patterns of a domain: dependency and part-of-speech ids as numpy arrays"""
+    compiled = _compiled.get(domain)
+    if compiled is None:
+        patterns = dict(RELATION_PATTERNS['default'])
+        patterns.update(RELATION_PATTERNS.get(domain) or {})
+        compiled = {
+            'subject_deps': np.array([get_string_id(d) for d in patterns['subject_deps']], dtype=np.uint64),
+            'verb_pos': np.array([POS_IDS[p] for p in patterns['verb_pos']], dtype=np.uint64),
+            'object_deps': np.array([get_string_id(d) for d in patterns['object_deps']], dtype=np.uint64),
+            'confidence': patterns['confidence'],
+        }
+        _compiled[domain] = compiled
+    return compiled
+
+def relation_triples_many(docs, domain=None):
+    """(subject, verb, object) token indices of every relation, one array per parsed Doc.
+
+    Works on doc.to_array integer columns instead of walking tokens: the
+    arrays of the whole batch are concatenated, subjects and objects are
+    selected by dependency id, kept when their head is a verb, and paired per
+    verb. Rows are ordered by subject then object token, the order a
+    token-by-token walk over subjects and their verb's children gives.
+    """
+    patterns = relation_patterns(domain)
+    lengths = np.array([len(doc) for doc in docs], dtype=np.int64)
+    starts = np.cumsum(lengths) - lengths
+    empty = np.zeros((0, 3), dtype=np.int64)
+    if not lengths.sum():
+        return [empty for _ in docs]
+
+    array = np.concatenate([doc.to_array([DEP, POS, HEAD]).reshape(-1, 3) for doc in docs])
+    heads = np.arange(len(array)) + array[:, 2].astype(np.int64)
+    head_is_verb = np.isin(array[heads, 1], patterns['verb_pos'])
+    subjects = np.flatnonzero(np.isin(array[:, 0], patterns['subject_deps']) & head_is_verb)
+    objects = np.flatnonzero(np.isin(array[:, 0], patterns['object_deps']) & head_is_verb)
+    if not len(subjects) or not len(objects):
+        return [empty for _ in docs]
+
+    # Pair every subject with every object sharing its verb (objects stay in token order)
+    objects = objects[np.argsort(heads[objects], kind='stable')]
+    object_heads = heads[objects]
+    first = np.searchsorted(object_heads, heads[subjects], side='left')
+    counts = np.searchsorted(object_heads, heads[subjects], side='right') - first
+    subject_rows = np.repeat(subjects, counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    object_rows = objects[np.repeat(first, counts) + offsets]
+    triples = np.column_stack([subject_rows, heads[subject_rows], object_rows])
+
+    # Rows are sorted by subject, so each Doc's relations are one contiguous slice
+    bounds = np.searchsorted(subject_rows, np.append(starts, len(array)))
+    return [triples[bounds[i]:bounds[i + 1]] - starts[i] for i in range(len(docs))]
+
+def relation_triples(doc, domain=None):
+    """(subject, verb, object) token indices of every relation in a parsed Doc"""
+    return relation_triples_many([doc], domain)[0]
 
 def find_entity(text, entities):
     """Find entity object by text"""
     for entity in entities:
         if entity.name.lower() in text.lower() or text.lower() in entity.name.lower():
             return entity
-    return None
\ No newline at end of file
+    return None
+
+def doc_relations(doc, entities, domain=None, triples=None):
+    """Relations of a parsed Doc between the given entities, matched by token text.
+
+    triples may be passed in from relation_triples_many over the Doc's batch.
+    """
+    confidence = relation_patterns(domain)['confidence']
+    matched = {}
+
+    def lookup(text):
+        if text not in matched:
+            matched[text] = find_entity(text, entities)
+        return matched[text]
+
+    relations = []
+    if triples is None:
+        triples = relation_triples(doc, domain)
+    for subject, verb, obj in triples.tolist():
+        entity1 = lookup(doc[subject].text)
+        entity2 = lookup(doc[obj].text)
+        if entity1 and entity2:
+            relations.append({
+                'entity1': entity1,
+                'entity2': entity2,
+                'type': doc[verb].text,
+                'confidence': confidence
+            })
+    return relations
+
+def extract_relations(text, entities, nlp_model, domain=None):
+    """Extract relationships between entities"""
+    return doc_relations(nlp_model(text), entities, domain)
@@ -0,0 +1,253 @@
+import heapq
+import math
+import threading
+import time
+
+import numpy as np
+from scipy import sparse
+
+from models import db, Dataset, Entity, Relation
+
+DEFAULT_MAX_HOPS = 4
+MAX_HOPS_LIMIT = 8
+DEFAULT_TIME_LIMIT = 2.0  # seconds
+MAX_TIME_LIMIT = 10.0
+MAX_PATHS = 20
+# Paths popped from the search queue before giving up, whatever the time limit
+MAX_EXPANSIONS = 200000
+# Confidence used for relations stored without one, and the floor that keeps -log finite
+DEFAULT_CONFIDENCE = 1.0
+MIN_CONFIDENCE = 1e-6
+
+class PathIndex:
+    """Adjacency of all of a user's entities in CSR form, with node attributes for path output.
+
+    Parallel relations between two entities collapse to the most confident one.
+    """
+    def __init__(self, signature, entities, relations, domains):
+        self.signature = signature
+        self.entity_ids = np.array([row.id for row in entities], dtype=np.int64)
+        self.names = [row.name for row in entities]
+        self.types = [row.type for row in entities]
+        self.dataset_ids = [row.dataset_id for row in entities]
+        self.domains = [domains.get(row.dataset_id) for row in entities]
+        self.position = {int(entity_id): i for i, entity_id in enumerate(self.entity_ids)}
+        self.by_name = {}
+        for i, name in enumerate(self.names):
+            self.by_name.setdefault(name.lower(), []).append(i)
+
+        best = {}  # (u, v) -> (confidence, relation id, type)
+        for relation in relations:
+            u = self.position.get(relation.entity1_id)
+            v = self.position.get(relation.entity2_id)
+            if u is None or v is None or u == v:
+                continue
+            confidence = relation.confidence if relation.confidence is not None else DEFAULT_CONFIDENCE
+            for key in ((u, v), (v, u)):
+                if key not in best or confidence > best[key][0]:
+                    best[key] = (confidence, relation.id, relation.relation_type)
+
+        n = len(self.entity_ids)
+        keys = sorted(best)
+        rows = np.array([u for u, _ in keys], dtype=np.int64)
+        self.indices = np.array([v for _, v in keys], dtype=np.int64)
+        self.indptr = np.searchsorted(rows, np.arange(n + 1)) if n else np.zeros(1, dtype=np.int64)
+        self.confidence = np.array([best[key][0] for key in keys], dtype=np.float64)
+        self.relation_ids = [best[key][1] for key in keys]
+        self.relation_types = [best[key][2] for key in keys]
+        self.matrix = sparse.csr_matrix(
+            (np.ones(len(keys)), self.indices, self.indptr), shape=(n, n))
+
+    def neighbours(self, node):
+        """(neighbour, edge position) pairs of a node"""
+        start, end = self.indptr[node], self.indptr[node + 1]
+        return zip(self.indices[start:end].tolist(), range(start, end))
+
+    def resolve(self, value):
+        """Node positions of an entity id or a (case-insensitive) entity name"""
+        value = (value or '').strip()
+        if value.isdigit() and int(value) in self.position:
+            return [self.position[int(value)]]
+        return list(self.by_name.get(value.lower(), []))
+
+# user id -> PathIndex
+_indexes = {}
+_lock = threading.Lock()
+
+def _signature(datasets):
+    """Changes when a dataset is added, removed, re-domained or re-versioned, or its entities
+    or relations (confidence included) change"""
+    dataset_ids = [d.id for d in datasets]
+    entities = db.session.execute(
+        db.select(db.func.count(Entity.id), db.func.max(Entity.id)).where(Entity.dataset_id.in_(dataset_ids))
+    ).one()
+    relations = db.session.execute(
+        db.select(db.func.count(Relation.id), db.func.max(Relation.id), db.func.sum(Relation.confidence))
+        .where(Relation.dataset_id.in_(dataset_ids))
+    ).one()
+    return tuple((d.id, d.domain, d.version) for d in datasets) + tuple(entities) + tuple(relations)
+
+def get_path_index(user_id):
+    """Cached adjacency index of a user's graph, rebuilt when the signature changed"""
+    datasets = Dataset.query.filter_by(user_id=user_id, deleted=False).order_by(Dataset.id).all()
+    signature = _signature(datasets)
+    index = _indexes.get(user_id)
+    if index is not None and index.signature == signature:
+        return index
+
+    with _lock:
+        index = _indexes.get(user_id)
+        if index is None or index.signature != signature:
+            dataset_ids = [d.id for d in datasets]
+            entities = db.session.execute(
+                db.select(Entity.id, Entity.name, Entity.type, Entity.dataset_id)
+                .where(Entity.dataset_id.in_(dataset_ids)).order_by(Entity.id)
+            ).all()
+            relations = db.session.execute(
+                db.select(Relation.id, Relation.entity1_id, Relation.entity2_id,
+                          Relation.relation_type, Relation.confidence)
+                .where(Relation.dataset_id.in_(dataset_ids))
+            ).all()
+            index = PathIndex(signature, entities, relations, {d.id: d.domain for d in datasets})
+            _indexes[user_id] = index
+    return index
+
+def clear_path_indexes(user_id=None):
+    if user_id is None:
+        _indexes.clear()
+    else:
+        _indexes.pop(user_id, None)
+
+def bidirectional_hops(index, sources, targets, max_hops, deadline):
+    """Fewest hops between any source and any target, or None beyond max_hops.
+
+    Expands the smaller frontier each round, so a hub on one side does not
+    drag the whole graph in before the other side is explored.
+    """
+    sources, targets = set(sources), set(targets)
+    if sources & targets:
+        return 0
+    seen = [dict.fromkeys(sources, 0), dict.fromkeys(targets, 0)]
+    frontiers = [sources, targets]
+    depth = [0, 0]
+    while frontiers[0] and frontiers[1] and depth[0] + depth[1] < max_hops:
+        if time.monotonic() > deadline:
+            return None
+        side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+        depth[side] += 1
+        next_frontier = set()
+        for node in frontiers[side]:
+            for neighbour, _ in index.neighbours(node):
+                if neighbour in seen[1 - side]:
+                    return depth[side] + seen[1 - side][neighbour]
+                if neighbour not in seen[side]:
+                    seen[side][neighbour] = depth[side]
+                    next_frontier.add(neighbour)
+        frontiers[side] = next_frontier
+    return None
+
+def hops_to(index, targets, max_hops):
+    """Hop distance to the nearest target for every node within max_hops (-1 elsewhere);
+    one sparse matrix-vector product per level"""
+    n = len(index.entity_ids)
+    distance = np.full(n, -1, dtype=np.int64)
+    frontier = np.zeros(n, dtype=bool)
+    frontier[targets] = True
+    distance[frontier] = 0
+    for depth in range(1, max_hops + 1):
+        reached = (index.matrix @ frontier.astype(np.float64) > 0) & (distance < 0)
+        if not reached.any():
+            break
+        distance[reached] = depth
+        frontier = reached
+    return distance
+
+def find_paths(index, sources, targets, k=3, mode='shortest', max_hops=DEFAULT_MAX_HOPS,
+               cross_domain=False, time_limit=DEFAULT_TIME_LIMIT):
+    """Top-k simple paths from any source to any target.
+
+    mode 'shortest' ranks by hop count, 'confidence' by the product of edge
+    confidences (best-first on the sum of -log confidence). With cross_domain
+    only paths with at least one edge between different domains count.
+    Returns (paths as node/edge position lists, stats).
+    """
+    start = time.monotonic()
+    deadline = start + time_limit
+    stats = {'expanded': 0, 'truncated': False, 'shortest_hops': None}
+    targets_set = set(targets)
+
+    stats['shortest_hops'] = bidirectional_hops(index, sources, targets, max_hops, deadline)
+    if stats['shortest_hops'] is None:
+        stats['truncated'] = time.monotonic() > deadline
+        stats['seconds'] = round(time.monotonic() - start, 4)
+        return [], stats
+
+    # Prune every partial path that cannot reach a target within the hop limit
+    remaining = hops_to(index, np.array(targets), max_hops)
+    domains = index.domains
+
+    # Queue entries: (cost, hops, tie breaker, nodes, edges, crossed)
+    queue = []
+    counter = 0
+    for source in sources:
+        heapq.heappush(queue, (0.0, 0, counter, (source,), (), False))
+        counter += 1
+
+    # Each (node, crossed) state is settled at most k times: the k-shortest-paths bound
+    settled = {}
+    paths = []
+    while queue and len(paths) < k:
+        cost, hops, _, nodes, edges, crossed = heapq.heappop(queue)
+        node = nodes[-1]
+        state = (node, crossed)
+        settled[state] = settled.get(state, 0) + 1
+        if settled[state] > k:
+            continue
+
+        if node in targets_set and hops and (crossed or not cross_domain):
+            paths.append((cost, nodes, edges, crossed))
+            continue
+
+        stats['expanded'] += 1
+        if stats['expanded'] >= MAX_EXPANSIONS or (stats['expanded'] % 256 == 0 and time.monotonic() > deadline):
+            stats['truncated'] = True
+            break
+        if hops >= max_hops:
+            continue
+
+        for neighbour, edge in index.neighbours(node):
+            if neighbour in nodes or remaining[neighbour] < 0 or hops + 1 + remaining[neighbour] > max_hops:
+                continue
+            step = 1.0 if mode == 'shortest' else -math.log(max(index.confidence[edge], MIN_CONFIDENCE))
+            crosses = crossed or domains[node] != domains[neighbour]
+            heapq.heappush(queue, (cost + step, hops + 1, counter, nodes + (neighbour,), edges + (edge,), crosses))
+            counter += 1
+
+    stats['seconds'] = round(time.monotonic() - start, 4)
+    return paths, stats
+
+def describe_path(index, path):
+    """JSON form of a path found by find_paths"""
+    cost, nodes, edges, crossed = path
+    confidence = 1.0
+    for edge in edges:
+        confidence *= index.confidence[edge]
+    return {
+        'hops': len(edges),
+        'confidence': round(float(confidence), 6),
+        'crosses_domains': crossed,
+        'nodes': [{
+            'id': int(index.entity_ids[node]),
+            'name': index.names[node],
+            'type': index.types[node],
+            'dataset_id': index.dataset_ids[node],
+            'domain': index.domains[node],
+        } for node in nodes],
+        'edges': [{
+            'id': index.relation_ids[edge],
+            'from': int(index.entity_ids[a]),
+            'to': int(index.entity_ids[b]),
+            'relation_type': index.relation_types[edge],
+            'confidence': float(index.confidence[edge]),
+        } for a, b, edge in zip(nodes, nodes[1:], edges)],
+    }
@@ -0,0 +1,97 @@
+import cProfile
+import io
+import marshal
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from flask import has_request_context, request
+from flask_login import current_user
+
+from models import db, ProfileReport
+
+# Rows of the cProfile table and allocation sites kept in the text report
+TOP_FUNCTIONS = 50
+TOP_ALLOCATIONS = 25
+# Stack depth recorded per allocation; deeper is slower
+TRACEMALLOC_FRAMES = 5
+
+# Only one cProfile profiler can be active at a time; held while one runs
+_active = threading.Lock()
+
+def profiling_requested():
+    """True when the current request asked for a profile.
+
+    Admins opt in per request with an `X-Profile: 1` header; an admin can
+    also flag a user so all of that user's uploads and searches are profiled.
+    """
+    if not has_request_context() or not current_user.is_authenticated:
+        return False
+    if current_user.is_admin and request.headers.get('X-Profile') == '1':
+        return True
+    return bool(current_user.profiling_enabled)
+
+@contextmanager
+def profiled(target, enabled, dataset_id=None, context=None):
+    """Run the block under cProfile and tracemalloc and store a ProfileReport.
+
+    Yields the unsaved report (None when disabled) so the caller can attach
+    a job id. The report is committed after the block, also when it fails,
+    so the caller must have committed or rolled back its own work by then.
+    """
+    if not enabled or not _active.acquire(blocking=False):
+        yield None
+        return
+
+    try:
+        report = ProfileReport(target=target, dataset_id=dataset_id, context=context,
+                               user_id=current_user.id if current_user.is_authenticated else None)
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        tracemalloc.reset_peak()
+        profiler = cProfile.Profile()
+
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            yield report
+        except Exception as e:
+            report.error_message = str(e)
+            raise
+        finally:
+            profiler.disable()
+            report.wall_seconds = time.perf_counter() - start
+
+            _, report.peak_memory_bytes = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            if not tracing:
+                tracemalloc.stop()
+
+            _store(report, profiler, snapshot)
+    finally:
+        _active.release()
+
+def _store(report, profiler, snapshot):
+    """Fill in the report bodies and commit it"""
+    out = io.StringIO()
+    stats = pstats.Stats(profiler, stream=out)
+    stats.sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+    report.stats_text = out.getvalue()
+    # Same format as pstats.dump_stats(), so downloads open in pstats or snakeviz
+    report.profile_data = marshal.dumps(stats.stats)
+
+    allocations = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    ]).statistics('lineno')[:TOP_ALLOCATIONS]
+    report.memory_text = '\n'.join(str(stat) for stat in allocations)
+
+    try:
+        db.session.add(report)
+        db.session.commit()
+    except Exception as e:
+        print(f"Error storing profile report: {e}")
+        db.session.rollback()
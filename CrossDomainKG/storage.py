@@ -0,0 +1,120 @@
+import hashlib
+import os
+import tempfile
+import threading
+
+from models import db, Dataset
+
+OBJECTS_DIR = 'objects'
+COPY_BUFFER_BYTES = 1024 * 1024
+
+# Held while an object is stored or its reference count is checked and it is unlinked
+_lock = threading.Lock()
+# Object name -> uploads that stored it and whose Dataset rows are not committed yet.
+# release_upload never unlinks a pinned object, however many rows refer to it.
+_pinned = {}
+
+def object_name(content_hash, extension):
+    """Upload-folder relative path of stored content: objects/<hash[:2]>/<hash><ext>.
+
+    The extension is kept because it decides how a file is ingested (CSV or text).
+    """
+    return os.path.join(OBJECTS_DIR, content_hash[:2], content_hash + extension.lower())
+
+def _store(upload_folder, temp_path, content_hash, extension):
+    name = object_name(content_hash, extension)
+    path = os.path.join(upload_folder, name)
+    if os.path.exists(path):
+        os.remove(temp_path)  # same content is already stored
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temp_path, path)
+    return name
+
+def save_upload(file, upload_folder):
+    """Store an uploaded file once per distinct content; returns (relative filename, sha256 hex).
+
+    The upload is streamed to a temporary file while it is hashed, then moved
+    to its content address, or dropped when that content is already stored.
+    The object stays pinned until unpin_uploads is called for it, once the
+    Dataset row referring to it is committed.
+    """
+    extension = os.path.splitext(file.filename or '')[1]
+    digest = hashlib.sha256()
+    fd, temp_path = tempfile.mkstemp(dir=upload_folder, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                block = file.stream.read(COPY_BUFFER_BYTES)
+                if not block:
+                    break
+                digest.update(block)
+                out.write(block)
+    except Exception:
+        os.remove(temp_path)
+        raise
+    content_hash = digest.hexdigest()
+    with _lock:
+        name = _store(upload_folder, temp_path, content_hash, extension)
+        _pinned[name] = _pinned.get(name, 0) + 1
+    return name, content_hash
+
+def unpin_uploads(names):
+    """Let release_upload delete these objects again; their Dataset rows are committed (or abandoned)"""
+    with _lock:
+        for name in names:
+            count = _pinned.get(name, 0) - 1
+            if count > 0:
+                _pinned[name] = count
+            else:
+                _pinned.pop(name, None)
+
+def hash_file(path):
+    """sha256 hex digest of a stored file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(COPY_BUFFER_BYTES), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def release_upload(filename, upload_folder, keep_dataset_id=None):
+    """Delete a stored file unless another dataset or an upload in progress still refers to it"""
+    if not filename:
+        return
+    with _lock:
+        if filename in _pinned:
+            return
+        query = Dataset.query.filter(Dataset.filename == filename)
+        if keep_dataset_id is not None:
+            query = query.filter(Dataset.id != keep_dataset_id)
+        if query.first() is not None:
+            return
+        path = os.path.join(upload_folder, filename)
+        if os.path.exists(path):
+            os.remove(path)
+
+def adopt_legacy_uploads(upload_folder):
+    """Move files of datasets stored before content addressing into the object store.
+
+    Duplicate copies collapse into one object; files no dataset refers to are left alone.
+    Returns the number of datasets moved.
+    """
+    moved = 0
+    for dataset in Dataset.query.filter(Dataset.content_hash.is_(None), Dataset.filename != '').all():
+        path = os.path.join(upload_folder, dataset.filename)
+        if not os.path.isfile(path):
+            continue
+        content_hash = hash_file(path)
+        extension = os.path.splitext(dataset.filename)[1]
+        name = object_name(content_hash, extension)
+        target = os.path.join(upload_folder, name)
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(path, target)
+        elif os.path.exists(path):
+            os.remove(path)
+        dataset.filename = name
+        dataset.content_hash = content_hash
+        moved += 1
+    db.session.commit()
+    return moved
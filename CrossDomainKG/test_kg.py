@@ -0,0 +1,229 @@
+import hashlib
+import io
+import os
+import tempfile
+
+import pytest
+
+# The app reads its database and upload folder when imported
+_tmp = tempfile.mkdtemp()
+os.environ['KG_DATABASE_URI'] = 'sqlite:///' + os.path.join(_tmp, 'kg.db')
+os.environ['KG_UPLOAD_FOLDER'] = os.path.join(_tmp, 'uploads')
+
+import app as kg
+import cleanup
+import linking
+from ingestion import hash_chunk, iter_chunks
+from models import db, Dataset, DatasetChunk, Entity, Relation, EntityEmbedding, EntityIndexTerm
+from nlp.csv_schema import column_entity_type
+
+HEADER = 'Patient,Disease,Medication,Hospital\n'
+ROWS = [
+    'Alice Moreau,Diabetes,Metformin,CityCare Hospital\n',
+    'Bruno Keller,Asthma,Salbutamol,Metro Health Clinic\n',
+    'Chen Wei,Hypertension,Lisinopril,CityCare Hospital\n',
+    'Dana Okafor,Migraine,Sumatriptan,Northside Clinic\n',
+]
+
+@pytest.fixture(scope='module', autouse=True)
+def database():
+    with kg.app.app_context():
+        kg.init_db()
+    yield
+
+def wait_for_background():
+    """Let the background worker finish queued purges and analyses"""
+    cleanup._executor.submit(lambda: None).result()
+
+def client_for(username):
+    client = kg.app.test_client()
+    client.post('/register', data={'username': username, 'email': f'{username}@example.com', 'password': 'pw'})
+    return client
+
+def admin_client():
+    client = kg.app.test_client()
+    client.post('/login', data={'email': 'admin@example.com', 'password': 'admin123'})
+    return client
+
+def upload(client, content, name, domain='healthcare'):
+    return client.post('/upload', data={'domain': domain, 'file': (io.BytesIO(content.encode()), name)},
+                       content_type='multipart/form-data')
+
+def dataset_named(name):
+    return Dataset.query.filter_by(name=name, deleted=False).one()
+
+def entity_names(dataset_id):
+    return sorted(e.name for e in Entity.query.filter_by(dataset_id=dataset_id))
+
+# Chunk hashing
+def test_hash_chunk_is_sha256_of_the_text():
+    assert hash_chunk('Diabetes, Metformin') == hashlib.sha256('Diabetes, Metformin'.encode('utf-8')).hexdigest()
+    assert hash_chunk('a') != hash_chunk('a ')
+
+def test_iter_chunks_splits_text_into_paragraphs(tmp_path):
+    path = tmp_path / 'notes.txt'
+    path.write_text('First line\nsame paragraph\n\n\nSecond paragraph\n', encoding='utf-8')
+    assert list(iter_chunks(str(path))) == ['First line same paragraph', 'Second paragraph']
+
+def test_reupload_keeps_unchanged_rows_and_retracts_removed_ones():
+    client = client_for('reuploader')
+    upload(client, HEADER + ''.join(ROWS), 'patients.csv')
+    with kg.app.app_context():
+        dataset = dataset_named('patients.csv')
+        before = {e.name: e.id for e in Entity.query.filter_by(dataset_id=dataset.id)}
+        assert {'Diabetes', 'Migraine', 'Sumatriptan'} <= set(before)
+
+    upload(client, HEADER + ''.join(ROWS[:3]) + 'Eve Laurent,Influenza,Oseltamivir,Northside Clinic\n',
+           'patients.csv')
+    with kg.app.app_context():
+        dataset = dataset_named('patients.csv')
+        after = {e.name: e.id for e in Entity.query.filter_by(dataset_id=dataset.id)}
+        assert dataset.version > 1
+        assert DatasetChunk.query.filter_by(dataset_id=dataset.id).count() == 4
+        # Unchanged rows keep their entities, the replaced row's entities are gone
+        assert after['Diabetes'] == before['Diabetes']
+        assert after['CityCare Hospital'] == before['CityCare Hospital']
+        assert 'Migraine' not in after and 'Sumatriptan' not in after
+        assert 'Influenza' in after
+
+# Clone on re-upload of identical content
+def test_identical_content_is_cloned_with_its_index_rows(monkeypatch):
+    client = client_for('cloner')
+    upload(client, HEADER + ''.join(ROWS), 'ward_a.csv')
+
+    encoded = []
+    encode_names = linking.encode_names
+    monkeypatch.setattr(linking, 'encode_names', lambda names, encoder: encoded.extend(names) or encode_names(names, encoder))
+    upload(client, HEADER + ''.join(ROWS), 'ward_b.csv')
+
+    with kg.app.app_context():
+        source, clone = dataset_named('ward_a.csv'), dataset_named('ward_b.csv')
+        assert source.filename == clone.filename
+        assert entity_names(clone.id) == entity_names(source.id)
+        clone_ids = db.select(Entity.id).where(Entity.dataset_id == clone.id)
+        assert EntityEmbedding.query.filter(EntityEmbedding.entity_id.in_(clone_ids)).count() == len(entity_names(clone.id))
+        assert EntityIndexTerm.query.filter(EntityIndexTerm.entity_id.in_(clone_ids)).count() > 0
+    assert encoded == []
+
+# HTTP caching
+def test_etag_answers_304_until_the_dataset_changes():
+    client = client_for('cacher')
+    upload(client, HEADER + ''.join(ROWS), 'cached.csv')
+    with kg.app.app_context():
+        dataset = dataset_named('cached.csv')
+        dataset_id = dataset.id
+        relation_id = Relation.query.filter_by(dataset_id=dataset_id).first().id
+
+    first = client.get(f'/api/dataset_stats/{dataset_id}')
+    assert first.status_code == 200 and first.headers['ETag']
+    assert client.get(f'/api/dataset_stats/{dataset_id}',
+                      headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+
+    assert admin_client().post(f'/api/approve_relation/{relation_id}').status_code == 200
+    changed = client.get(f'/api/dataset_stats/{dataset_id}', headers={'If-None-Match': first.headers['ETag']})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != first.headers['ETag']
+
+# Soft delete and background purge
+def test_delete_hides_the_dataset_then_purges_its_rows_and_file():
+    client = client_for('deleter')
+    upload(client, HEADER + ''.join(ROWS) + 'Farah Nasser,Anemia,Ferrous sulfate,Westgate Clinic\n', 'gone.csv')
+    with kg.app.app_context():
+        dataset = dataset_named('gone.csv')
+        dataset_id, filename = dataset.id, dataset.filename
+
+    assert client.delete(f'/api/dataset/{dataset_id}').status_code == 202
+    assert client.get(f'/api/dataset_stats/{dataset_id}').status_code == 404
+    wait_for_background()
+
+    with kg.app.app_context():
+        assert db.session.get(Dataset, dataset_id) is None
+        assert Entity.query.filter_by(dataset_id=dataset_id).count() == 0
+        assert DatasetChunk.query.filter_by(dataset_id=dataset_id).count() == 0
+    assert not os.path.exists(os.path.join(kg.app.config['UPLOAD_FOLDER'], filename))
+
+# Export and import
+@pytest.mark.parametrize('fmt, filename', [('ndjson', 'graph.ndjson'), ('graphml', 'graph.graphml')])
+def test_export_import_round_trip(fmt, filename):
+    client = client_for(f'porter_{fmt}')
+    upload(client, HEADER + ''.join(ROWS), f'export_{fmt}.csv')
+    with kg.app.app_context():
+        source = dataset_named(f'export_{fmt}.csv')
+        source_id = source.id
+        relations = Relation.query.filter_by(dataset_id=source_id).count()
+
+    exported = client.get(f'/api/export/{source_id}?format={fmt}')
+    assert exported.status_code == 200
+    imported = client.post('/api/import', data={'file': (io.BytesIO(exported.data), filename)},
+                           content_type='multipart/form-data')
+    assert imported.status_code == 200
+    assert imported.json['relations'] == relations and imported.json['skipped_relations'] == 0
+
+    with kg.app.app_context():
+        [copy] = imported.json['datasets']
+        assert entity_names(copy['id']) == entity_names(source_id)
+        copy_ids = db.select(Entity.id).where(Entity.dataset_id == copy['id'])
+        # Imported entities are indexed for linking
+        assert EntityEmbedding.query.filter(EntityEmbedding.entity_id.in_(copy_ids)).count() == len(entity_names(source_id))
+
+# Top-k paths
+def test_paths_are_ranked_by_hops_or_confidence():
+    client = client_for('pathfinder')
+    with kg.app.app_context():
+        user_id = kg.User.query.filter_by(username='pathfinder').one().id
+        finance = Dataset(name='f', domain='finance', filename='', user_id=user_id, processed=True)
+        health = Dataset(name='h', domain='healthcare', filename='', user_id=user_id, processed=True)
+        db.session.add_all([finance, health])
+        db.session.flush()
+        names = {'Source': finance, 'Weak': finance, 'Strong1': health, 'Strong2': health, 'Target': health}
+        entities = {name: Entity(name=name, type='ORG', dataset_id=dataset.id) for name, dataset in names.items()}
+        db.session.add_all(entities.values())
+        db.session.flush()
+        # Source - Weak - Target: 2 hops, confidence 0.1; Source - Strong1 - Strong2 - Target: 3 hops, 0.729
+        for a, b, confidence in [('Source', 'Weak', 0.1), ('Weak', 'Target', 1.0), ('Source', 'Strong1', 0.9),
+                                 ('Strong1', 'Strong2', 0.9), ('Strong2', 'Target', 0.9)]:
+            db.session.add(Relation(entity1_id=entities[a].id, entity2_id=entities[b].id, relation_type='rel',
+                                    confidence=confidence, dataset_id=names[a].id))
+        db.session.commit()
+
+    shortest = client.get('/api/paths?source=Source&target=Target&k=2&mode=shortest').json
+    assert [p['hops'] for p in shortest['paths']] == [2, 3]
+    confident = client.get('/api/paths?source=Source&target=Target&k=2&mode=confidence').json
+    assert [p['hops'] for p in confident['paths']] == [3, 2]
+    assert confident['paths'][0]['confidence'] == pytest.approx(0.729)
+    assert client.get('/api/paths?source=Source&target=Nobody').status_code == 404
+
+# Faceted graph filter
+def test_filter_keeps_parallel_relations_and_combines_facets():
+    client = client_for('filterer')
+    with kg.app.app_context():
+        user_id = kg.User.query.filter_by(username='filterer').one().id
+        dataset = Dataset(name='g', domain='science', filename='', user_id=user_id, processed=True)
+        db.session.add(dataset)
+        db.session.flush()
+        a, b = Entity(name='A', type='ORG', dataset_id=dataset.id), Entity(name='B', type='PERSON', dataset_id=dataset.id)
+        db.session.add_all([a, b])
+        db.session.flush()
+        for relation_type, confidence, approved in [('works_at', 0.9, True), ('visits', 0.6, False), ('visits', 0.3, False)]:
+            db.session.add(Relation(entity1_id=b.id, entity2_id=a.id, relation_type=relation_type,
+                                    confidence=confidence, approved=approved, dataset_id=dataset.id))
+        db.session.commit()
+
+    graph = client.get('/api/graph/filter').json
+    assert len(graph['nodes']) == 2 and len(graph['edges']) == 3
+    visits = client.get('/api/graph/filter?relation_types=visits&confidence=medium,high').json
+    assert [(e['label'], e['confidence']) for e in visits['edges']] == [('visits', 0.6)]
+    people = client.get('/api/graph/filter?types=PERSON').json
+    assert [n['label'] for n in people['nodes']] == ['B'] and people['edges'] == []
+    assert client.get('/api/graph/filter?confidence=huge').status_code == 400
+
+# CSV schema
+@pytest.mark.parametrize('column, entity_type', [
+    ('Patient', 'PERSON'), ('Lead Researcher', 'PERSON'), ('Authors', 'PERSON'), ('Hospital Name', 'ORG'),
+    ('Diseases', 'DISEASE'), ('Drug_Name', 'MEDICINE'), ('City', 'GPE'), ('Cities', 'GPE'), ('name', 'PERSON'),
+    # Keywords inside other words do not count
+    ('Ethnicity', 'ETHNICITY'), ('Capacity', 'CAPACITY'), ('Electricity', 'ELECTRICITY'),
+    ('Statement', 'STATEMENT'), ('Estate', 'ESTATE'), ('Authority', 'AUTHORITY'),
+])
+def test_column_entity_type(column, entity_type):
+    assert column_entity_type(column) == entity_type
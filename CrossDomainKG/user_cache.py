@@ -0,0 +1,48 @@
+import os
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import make_transient_to_detached
+
+from models import db, User
+
+# Seconds a cached user is trusted; bounds how long other processes can serve
+# a stale row after an update, since invalidation is per process
+USER_CACHE_TTL = float(os.environ.get('KG_USER_CACHE_TTL', '60'))
+
+_users = {}
+_lock = threading.Lock()
+
+def _snapshot(user):
+    """Column values of a loaded user"""
+    return {attr.key: getattr(user, attr.key) for attr in db.inspect(User).column_attrs}
+
+def get_user(user_id):
+    """User for Flask-Login, from the cache when fresh, otherwise loaded and cached"""
+    now = time.monotonic()
+    cached = _users.get(user_id)
+    if cached and cached[0] > now:
+        # Rebuild a detached instance and attach it to this request's session without a SELECT
+        user = User(**cached[1])
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+
+    user = db.session.get(User, user_id)
+    if user is not None:
+        with _lock:
+            _users[user_id] = (now + USER_CACHE_TTL, _snapshot(user))
+    return user
+
+def invalidate_user(user_id):
+    with _lock:
+        _users.pop(user_id, None)
+
+def clear_user_cache():
+    with _lock:
+        _users.clear()
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_on_change(mapper, connection, target):
+    invalidate_user(target.id)
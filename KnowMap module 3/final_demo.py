@@ -1,7 +1,7 @@
 import networkx as nx
 from  pyvis.network import Network
 import json
-from networkx.readwrite import json_graph
+import weakref
 
 # ---------------------------
 # STEP 1: NLP Output (Triples)
@@ -40,13 +40,28 @@ def build_knowledge_graph(triples, domain_map):
 # ---------------------------
 # STEP 4: Filter by Domain (Slide 14)
 # ---------------------------
+# Secondary indexes over node attributes: graph -> {attribute: (graph size, {lowercased value: nodes})}.
+# Built on first use and rebuilt only when nodes or edges were added or removed.
+_node_indexes = weakref.WeakKeyDictionary()
+
+def node_attribute_index(G, attribute):
+    indexes = _node_indexes.setdefault(G, {})
+    size = (G.number_of_nodes(), G.number_of_edges())
+    cached = indexes.get(attribute)
+    if cached is None or cached[0] != size:
+        index = {}
+        for n, value in G.nodes(data=attribute, default=""):
+            index.setdefault(str(value).lower(), set()).add(n)
+        cached = indexes[attribute] = (size, index)
+    return cached[1]
+
 def filter_graph_by_domain(G, selected_domain):
     if selected_domain.lower() == "all":
         return G
-    nodes_to_keep = [
-        n for n, d in G.nodes(data=True)
-        if d.get("domain", "").lower() == selected_domain.lower()
-    ]
+    # Several domains may be given, e.g. "Technology, Medical"
+    wanted = [d.strip().lower() for d in selected_domain.split(",") if d.strip()]
+    index = node_attribute_index(G, "domain")
+    nodes_to_keep = set().union(*(index.get(d, ()) for d in wanted))
     return G.subgraph(nodes_to_keep).copy()
 
 # ---------------------------
@@ -101,11 +116,19 @@ def create_interactive_graph(G):
 # ---------------------------
 # STEP 6: Export JSON (Slide 15)
 # ---------------------------
-def export_graph_json(G):
-    data = json_graph.node_link_data(G)
-    with open("graph.json", "w") as f:
-        json.dump(data, f, indent=4)
-    print("✅ Graph exported as graph.json for D3.js visualization")
+def export_graph_json(G, path="graph.json"):
+    # Same node-link layout as json_graph.node_link_data, written one node/link at a time
+    # so the whole document never has to be built in memory
+    with open(path, "w") as f:
+        f.write('{"directed": %s, "multigraph": %s, "graph": %s, "nodes": [' % (
+            json.dumps(G.is_directed()), json.dumps(G.is_multigraph()), json.dumps(G.graph)))
+        for i, (node, data) in enumerate(G.nodes(data=True)):
+            f.write(("," if i else "") + "\n" + json.dumps({**data, "id": node}))
+        f.write('\n], "edges": [')
+        for i, (source, target, data) in enumerate(G.edges(data=True)):
+            f.write(("," if i else "") + "\n" + json.dumps({**data, "source": source, "target": target}))
+        f.write("\n]}\n")
+    print(f"✅ Graph exported as {path} for D3.js visualization")
 
 # ---------------------------
 # MAIN EXECUTION (LIVE DEMO FLOW)
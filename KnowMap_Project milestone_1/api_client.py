@@ -0,0 +1,78 @@
+import os
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Backend URL
+API_URL = os.environ.get("KNOWMAP_API_URL", "http://localhost:8001")
+
+HEALTH_TTL_SECONDS = 15     # how long a backend status check is reused across reruns
+PROFILE_TTL_SECONDS = 300   # how long a profile read is cached; saving clears it earlier
+TIMEOUT = (2, 10)           # (connect, read) seconds
+
+class BackendError(Exception):
+    pass
+
+# One pooled keep-alive session per Streamlit server process, shared by all reruns and users.
+# Connection failures are retried for every method (nothing reached the backend);
+# 502/503/504 answers only for GETs, so a signup or save is never sent twice.
+@st.cache_resource
+def get_session():
+    retry = Retry(
+        total=3,
+        connect=3,
+        read=2,
+        status=2,
+        backoff_factor=0.3,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"GET"}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def _auth(token):
+    return {"Authorization": f"Bearer {token}"} if token else {}
+
+# Backend status, checked at most once per HEALTH_TTL_SECONDS instead of on every rerun
+@st.cache_data(ttl=HEALTH_TTL_SECONDS, show_spinner=False)
+def check_backend():
+    try:
+        return get_session().get(f"{API_URL}/", timeout=(1, 2)).status_code == 200
+    except requests.RequestException:
+        return False
+
+def signup(username, password):
+    return get_session().post(f"{API_URL}/signup", json={"username": username, "password": password},
+                              timeout=TIMEOUT)
+
+def login(username, password):
+    response = get_session().post(f"{API_URL}/login", json={"username": username, "password": password},
+                                  timeout=TIMEOUT)
+    if response.status_code == 200:
+        # A new login must not see a profile cached for an earlier session
+        get_profile.clear()
+    return response
+
+# Profile of a user; failures raise BackendError, so only successful reads are cached
+@st.cache_data(ttl=PROFILE_TTL_SECONDS, show_spinner=False)
+def get_profile(username, token):
+    try:
+        response = get_session().get(f"{API_URL}/get_profile/{username}", headers=_auth(token), timeout=TIMEOUT)
+    except requests.RequestException as e:
+        raise BackendError(str(e))
+    if response.status_code != 200:
+        raise BackendError(response.text)
+    return response.json()
+
+def save_profile(username, interests, token):
+    response = get_session().post(f"{API_URL}/save_profile", json={"username": username, "interests": interests},
+                                  headers=_auth(token), timeout=TIMEOUT)
+    if response.status_code == 200:
+        get_profile.clear()
+    return response
@@ -1,12 +1,12 @@
 import streamlit as st
 import pandas as pd
 import wikipedia
-import requests
 import json
 import time
 
-# Backend URL
-API_URL = "http://localhost:8001"
+import api_client as api
+from api_client import API_URL, check_backend
+from csv_profiler import profile_csv
 
 st.set_page_config(page_title="KnowMap Tool", layout="wide")
 
@@ -22,14 +22,6 @@ if "interests" not in st.session_state:
 if "active_tab" not in st.session_state:
     st.session_state.active_tab = "Profile Setup"
 
-# Backend connection check
-def check_backend():
-    try:
-        r = requests.get(f"{API_URL}/", timeout=2)
-        return r.status_code == 200
-    except:
-        return False
-
 # --- SIDEBAR: AUTHENTICATION ---
 with st.sidebar:
     st.header("🔑 User Access")
@@ -48,11 +40,7 @@ with st.sidebar:
         if st.button("Create Account", use_container_width=True):
             if user_input and pass_input:
                 try:
-                    resp = requests.post(
-                        f"{API_URL}/signup", 
-                        json={"username": user_input, "password": pass_input},
-                        timeout=5
-                    )
+                    resp = api.signup(user_input, pass_input)
                     if resp.status_code == 200:
                         st.success("✅ Account Created! Now Login.")
                     else:
@@ -66,11 +54,7 @@ with st.sidebar:
         if st.button("Login", use_container_width=True):
             if user_input and pass_input:
                 try:
-                    resp = requests.post(
-                        f"{API_URL}/login", 
-                        json={"username": user_input, "password": pass_input},
-                        timeout=5
-                    )
+                    resp = api.login(user_input, pass_input)
                     if resp.status_code == 200:
                         data = resp.json()
                         st.session_state.logged_in = True
@@ -79,14 +63,9 @@ with st.sidebar:
                         
                         # Fetch profile
                         try:
-                            profile_resp = requests.get(
-                                f"{API_URL}/get_profile/{user_input}",
-                                timeout=3
-                            )
-                            if profile_resp.status_code == 200:
-                                profile_data = profile_resp.json()
-                                st.session_state.interests = profile_data.get("interests", [])
-                        except:
+                            profile_data = api.get_profile(user_input, st.session_state.token)
+                            st.session_state.interests = profile_data.get("interests", [])
+                        except api.BackendError:
                             pass
                         
                         st.success(f"✅ Welcome, {user_input}!")
@@ -119,6 +98,7 @@ if st.session_state.logged_in:
         st.write(f"Username: {st.session_state.username}")
         st.write(f"Interests: {st.session_state.interests}")
         if st.button("Test Backend"):
+            check_backend.clear()
             if check_backend():
                 st.success("✅ Backend is reachable")
             else:
@@ -146,14 +126,7 @@ if st.session_state.logged_in:
                 try:
                     with st.spinner("Saving profile..."):
                         if check_backend():
-                            resp = requests.post(
-                                f"{API_URL}/save_profile", 
-                                json={
-                                    "username": st.session_state.username, 
-                                    "interests": interests
-                                },
-                                timeout=5
-                            )
+                            resp = api.save_profile(st.session_state.username, interests, st.session_state.token)
                             
                             if resp.status_code == 200:
                                 st.session_state.interests = interests
@@ -199,20 +172,36 @@ if st.session_state.logged_in:
             
             if uploaded_file is not None:
                 try:
-                    df = pd.read_csv(uploaded_file)
+                    # Profile the file chunk by chunk once; reruns reuse the stored profile
+                    profile_key = (uploaded_file.name, uploaded_file.size)
+                    if st.session_state.get("csv_profile_key") != profile_key:
+                        progress = st.progress(0.0, text="Profiling file...")
+
+                        def show_progress(rows, bytes_read, total_bytes):
+                            progress.progress(min(bytes_read / max(total_bytes, 1), 1.0),
+                                              text=f"Profiling file... {rows:,} rows")
+
+                        st.session_state.csv_profile = profile_csv(uploaded_file, on_progress=show_progress)
+                        st.session_state.csv_profile_key = profile_key
+                        progress.empty()
+                    profile = st.session_state.csv_profile
                     st.success(f"✅ File loaded: {uploaded_file.name}")
                     
                     # Show dataset info
                     col1, col2, col3 = st.columns(3)
                     with col1:
-                        st.metric("Rows", df.shape[0])
+                        st.metric("Rows", f"{profile['rows']:,}")
                     with col2:
-                        st.metric("Columns", df.shape[1])
+                        st.metric("Columns", len(profile["columns"]))
                     with col3:
-                        st.metric("Memory", f"{df.memory_usage().sum() / 1024:.1f} KB")
+                        st.metric("File Size", f"{profile['bytes'] / 1024 / 1024:.1f} MB")
+                    
+                    st.subheader("Column Profile:")
+                    st.dataframe(pd.DataFrame(profile["columns"]), use_container_width=True, hide_index=True)
+                    st.caption("Distinct counts are HyperLogLog estimates (about ±2%).")
                     
                     st.subheader("Data Preview:")
-                    st.dataframe(df.head(10), use_container_width=True)
+                    st.dataframe(profile["preview"], use_container_width=True)
                     
                 except Exception as e:
                     st.error(f"❌ Error reading file: {str(e)}")
@@ -285,7 +274,7 @@ if st.session_state.logged_in:
                         formatted_query = query.replace(' ', '+')
                         url = f"http://export.arxiv.org/api/query?search_query=all:{formatted_query}&max_results={max_results}&sortBy=submittedDate&sortOrder=descending"
                         
-                        response = requests.get(url, timeout=10)
+                        response = api.get_session().get(url, timeout=10)
                         
                         if response.status_code == 200:
                             st.success(f"✅ Found papers for: {query}")
@@ -0,0 +1,102 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+# Login throughput of the backend for different bcrypt pool sizes.
+# For each pool size a fresh uvicorn server is started, then --clients threads
+# log in as fast as they can for --duration seconds while one more thread pings "/"
+# to show that other endpoints stay responsive during the burst.
+#
+#     python bench_login.py --workers 1 2 4 --clients 16 --duration 10
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ACCOUNT = {"username": "bench_user", "password": "bench_password"}
+
+def start_server(port, workers, rounds, work_dir):
+    env = dict(os.environ, BCRYPT_WORKERS=str(workers), BCRYPT_ROUNDS=str(rounds))
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", HERE, "--port", str(port)],
+        cwd=work_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(120):
+        try:
+            requests.get(url + "/", timeout=1)
+            return process, url
+        except requests.RequestException:
+            time.sleep(0.5)
+    process.kill()
+    raise RuntimeError("backend did not start")
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(int(len(values) * pct / 100), len(values) - 1)] if values else 0.0
+
+# Hammer /login from `clients` threads; returns (logins/s, errors, ping latencies in ms)
+def run_burst(url, clients, duration):
+    deadline = time.perf_counter() + duration
+    counts = [0] * clients
+    errors = [0] * clients
+    pings = []
+
+    def login_loop(index):
+        session = requests.Session()
+        while time.perf_counter() < deadline:
+            try:
+                ok = session.post(url + "/login", json=ACCOUNT, timeout=30).status_code == 200
+            except requests.RequestException:
+                ok = False
+            counts[index] += ok
+            errors[index] += not ok
+
+    def ping_loop():
+        session = requests.Session()
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            session.get(url + "/", timeout=30)
+            pings.append((time.perf_counter() - start) * 1000)
+            time.sleep(0.05)
+
+    threads = [threading.Thread(target=login_loop, args=(i,)) for i in range(clients)]
+    threads.append(threading.Thread(target=ping_loop))
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return sum(counts) / elapsed, sum(errors), pings
+
+def main():
+    cores = os.cpu_count() or 1
+    default_workers = sorted({1, 2, cores} | ({cores // 2} if cores >= 4 else set()))
+
+    parser = argparse.ArgumentParser(description="Login throughput versus bcrypt pool size")
+    parser.add_argument("--workers", type=int, nargs="+", default=default_workers)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--rounds", type=int, default=12, help="BCRYPT_ROUNDS for the server")
+    parser.add_argument("--port", type=int, default=8091)
+    args = parser.parse_args()
+
+    print(f"{cores} cores, {args.clients} clients, bcrypt rounds {args.rounds}")
+    print(f"{'workers':>8}{'logins/s':>10}{'errors':>8}{'ping p50 ms':>13}{'ping p95 ms':>13}")
+    for workers in args.workers:
+        with tempfile.TemporaryDirectory() as work_dir:
+            process, url = start_server(args.port, workers, args.rounds, work_dir)
+            try:
+                requests.post(url + "/signup", json=ACCOUNT, timeout=30)
+                rate, errors, pings = run_burst(url, args.clients, args.duration)
+            finally:
+                process.terminate()
+                process.wait()
+        print(f"{workers:>8}{rate:>10.1f}{errors:>8}{percentile(pings, 50):>13.1f}{percentile(pings, 95):>13.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # pandas chunked reader is used instead
+    pa = None
+
+BLOCK_BYTES = 16 * 1024 * 1024   # bytes pyarrow parses per batch
+CHUNK_ROWS = 100_000             # rows per chunk for the pandas fallback
+PREVIEW_ROWS = 10
+HLL_PRECISION = 12               # 4096 registers: ~1.6% standard error, 4 KB per column
+
+# HyperLogLog distinct-count sketch over 64-bit value hashes
+class HyperLogLog:
+    def __init__(self, precision=HLL_PRECISION):
+        self.p = precision
+        self.m = 1 << precision
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+
+    def add_hashes(self, hashes):
+        if not len(hashes):
+            return
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        index = (hashes >> np.uint64(64 - self.p)).astype(np.int64)
+        rest = hashes & np.uint64((1 << (64 - self.p)) - 1)
+        # Position of the first set bit in the remaining 64-p bits (52 bits convert to float exactly)
+        bit_length = np.frexp(rest.astype(np.float64))[1]
+        rank = (64 - self.p - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def count(self):
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)  # linear counting for small cardinalities
+        return int(round(estimate))
+
+# Running statistics of one column
+class ColumnProfile:
+    def __init__(self, name):
+        self.name = name
+        self.dtype = None
+        self.nulls = 0
+        self.count = 0
+        self.sketch = HyperLogLog()
+
+    def update(self, series, dtype):
+        if self.dtype is None:
+            self.dtype = dtype
+        elif self.dtype != dtype:
+            self.dtype = "mixed"
+        self.count += len(series)
+        values = series.dropna()
+        self.nulls += len(series) - len(values)
+        self.sketch.add_hashes(pd.util.hash_pandas_object(values, index=False).to_numpy())
+
+    def to_dict(self):
+        return {
+            "column": self.name,
+            "type": self.dtype or "empty",
+            "non_null": self.count - self.nulls,
+            "nulls": self.nulls,
+            "null_pct": round(100 * self.nulls / self.count, 2) if self.count else 0.0,
+            "distinct_approx": self.sketch.count(),
+        }
+
+# Column number of a pyarrow conversion error ("In CSV column #3: ...")
+def _failed_column(error):
+    match = re.search(r"column #(\d+)", str(error))
+    return int(match.group(1)) if match else None
+
+# Record batches of a CSV, parsed block by block. pyarrow infers column types from the
+# first block; a column that fails to convert later is re-read as text from the start.
+def _arrow_batches(f, column_types):
+    f.seek(0)
+    reader = pa_csv.open_csv(
+        f,
+        read_options=pa_csv.ReadOptions(block_size=BLOCK_BYTES),
+        convert_options=pa_csv.ConvertOptions(column_types=column_types),
+    )
+    for batch in reader:
+        yield batch
+
+def _profile_arrow(f, on_progress, total_bytes):
+    column_types = {}
+    while True:
+        columns, preview, rows = {}, None, 0
+        try:
+            for batch in _arrow_batches(f, column_types):
+                if preview is None:
+                    preview = batch.slice(0, PREVIEW_ROWS).to_pandas()
+                    columns = {name: ColumnProfile(name) for name in batch.schema.names}
+                for name, array in zip(batch.schema.names, batch.columns):
+                    columns[name].update(array.to_pandas(), str(array.type))
+                rows += batch.num_rows
+                if on_progress:
+                    on_progress(rows, f.tell(), total_bytes)
+            return rows, columns, preview
+        except pa.ArrowInvalid as e:
+            index = _failed_column(e)
+            if index is None or not columns or index >= len(columns):
+                raise
+            name = list(columns)[index]
+            if column_types.get(name) == pa.string():
+                raise
+            column_types[name] = pa.string()
+
+def _profile_pandas(f, on_progress, total_bytes):
+    f.seek(0)
+    columns, preview, rows = {}, None, 0
+    for chunk in pd.read_csv(f, chunksize=CHUNK_ROWS, low_memory=True):
+        if preview is None:
+            preview = chunk.head(PREVIEW_ROWS)
+            columns = {name: ColumnProfile(name) for name in chunk.columns}
+        for name in chunk.columns:
+            columns[name].update(chunk[name], str(chunk[name].dtype))
+        rows += len(chunk)
+        if on_progress:
+            on_progress(rows, f.tell(), total_bytes)
+    return rows, columns, preview
+
+# Profile a CSV (path or binary file object) in bounded memory: row count, per-column type,
+# null counts and approximate distinct counts, computed one chunk at a time, and a preview
+# of the first rows. on_progress(rows, bytes_read, total_bytes) is called after each chunk.
+def profile_csv(source, on_progress=None):
+    owns_file = isinstance(source, str)
+    f = open(source, "rb") if owns_file else source
+    try:
+        f.seek(0, 2)
+        total_bytes = f.tell()
+        if pa is not None:
+            rows, columns, preview = _profile_arrow(f, on_progress, total_bytes)
+            engine = "pyarrow"
+        else:
+            rows, columns, preview = _profile_pandas(f, on_progress, total_bytes)
+            engine = "pandas"
+    finally:
+        if owns_file:
+            f.close()
+
+    return {
+        "rows": rows,
+        "columns": [column.to_dict() for column in columns.values()],
+        "preview": preview if preview is not None else pd.DataFrame(),
+        "bytes": total_bytes,
+        "engine": engine,
+    }
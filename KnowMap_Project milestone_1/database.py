@@ -1,10 +1,15 @@
-from sqlalchemy import Column, Integer, String, create_engine, ForeignKey
+from sqlalchemy import Column, Integer, String, LargeBinary, Table, Index, create_engine, ForeignKey, select, insert
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 
 # Database connection setup
 engine = create_engine("sqlite:///./knowmap.db", connect_args={"check_same_thread": False})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Async engine used by the request handlers; aiosqlite runs SQLite off the event loop
+async_engine = create_async_engine("sqlite+aiosqlite:///./knowmap.db")
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 # User Table
@@ -28,7 +33,57 @@ class UserProfile(Base):
     # Relationship with user
     user = relationship("User", back_populates="profile")
 
+# Interest Table - one row per distinct interest, shared by all users
+class Interest(Base):
+    __tablename__ = "interests"
+    id = Column(Integer, primary_key=True)
+    name = Column(String, unique=True, nullable=False, index=True)  # normalised key, see interest_key()
+    label = Column(String, nullable=False)  # as first entered
+    embedding = Column(LargeBinary, nullable=True)  # float32, L2-normalised; filled on first save
+
+# User <-> Interest link, in the order the user listed them
+user_interests = Table(
+    "user_interests",
+    Base.metadata,
+    Column("user_id", Integer, ForeignKey("users.id"), primary_key=True),
+    Column("interest_id", Integer, ForeignKey("interests.id"), primary_key=True),
+    Column("position", Integer, nullable=False, default=0),
+    Index("ix_user_interests_interest_user", "interest_id", "user_id"),
+)
+
+def interest_key(label):
+    """Case- and whitespace-insensitive key of an interest"""
+    return " ".join(label.split()).lower()
+
+# Move comma-joined profile interests into the interests tables (runs once per user)
+def migrate_interests():
+    with SessionLocal() as db:
+        linked = select(user_interests.c.user_id)
+        profiles = db.query(UserProfile).filter(UserProfile.interests != "", UserProfile.user_id.not_in(linked)).all()
+        if not profiles:
+            return
+        
+        interests = {i.name: i for i in db.query(Interest)}
+        rows = []
+        for profile in profiles:
+            labels = {}
+            for label in profile.interests.split(","):
+                if label.strip():
+                    labels.setdefault(interest_key(label), label.strip())
+            for position, (key, label) in enumerate(labels.items()):
+                if key not in interests:
+                    interests[key] = Interest(name=key, label=label)
+                    db.add(interests[key])
+                    db.flush()
+                rows.append({"user_id": profile.user_id, "interest_id": interests[key].id, "position": position})
+        
+        if rows:
+            db.execute(insert(user_interests).prefix_with("OR IGNORE"), rows)
+        db.commit()
+        print(f"✅ Migrated interests of {len(profiles)} profiles")
+
 # Create tables
 print("🔄 Creating database tables...")
 Base.metadata.create_all(bind=engine)
+migrate_interests()
 print("✅ Database tables created successfully!")
\ No newline at end of file
@@ -1,12 +1,22 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from prometheus_client import CollectorRegistry, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from sqlalchemy import event, select, insert, delete, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 import bcrypt  # Direct bcrypt import
-from jose import jwt
+from jose import jwt, JWTError
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
+import asyncio
+import os
+import time
+import numpy as np
 import database
+import recommendations
 
 app = FastAPI()
 
@@ -19,24 +29,83 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Prometheus metrics, served at /metrics
+METRICS = CollectorRegistry()
+REQUEST_LATENCY = Histogram(
+    "knowmap_request_duration_seconds", "Request latency by route",
+    ["method", "route", "status"], registry=METRICS,
+)
+PASSWORD_SECONDS = Histogram(
+    "knowmap_password_seconds", "bcrypt time by operation",
+    ["operation"], registry=METRICS,
+)
+DB_WRITE_SECONDS = Histogram(
+    "knowmap_db_write_seconds", "Time spent in INSERT, UPDATE and DELETE statements",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1), registry=METRICS,
+)
+
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by the route template, not the raw path, to keep cardinality bounded
+        route = request.scope.get("route")
+        path = route.path if route else "unmatched"
+        REQUEST_LATENCY.labels(request.method, path, status).observe(time.perf_counter() - start)
+
+def _start_query(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_start"] = time.perf_counter()
+
+def _end_query(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info.pop("query_start", None)
+    if start is not None and statement.lstrip()[:6].upper() in ("INSERT", "UPDATE", "DELETE"):
+        DB_WRITE_SECONDS.observe(time.perf_counter() - start)
+
+for _engine in (database.engine, database.async_engine.sync_engine):
+    event.listen(_engine, "before_cursor_execute", _start_query)
+    event.listen(_engine, "after_cursor_execute", _end_query)
+
 # Security Config
 SECRET_KEY = "knowmap_super_secret_key"
 ALGORITHM = "HS256"
 
+# bcrypt cost factor (2^rounds iterations); lower it only for local testing
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+# bcrypt releases the GIL, so a thread pool hashes on several cores at once;
+# the bound keeps a burst of logins from starving the rest of the process
+PASSWORD_POOL = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("BCRYPT_WORKERS", str(os.cpu_count() or 1))),
+    thread_name_prefix="bcrypt",
+)
+
 # Password hashing functions using bcrypt directly
 def hash_password(password: str) -> str:
     """Hash a password using bcrypt"""
     # Convert password to bytes and hash
     password_bytes = password.encode('utf-8')
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password_bytes, salt)
+    salt = bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
+    with PASSWORD_SECONDS.labels("hash").time():
+        hashed = bcrypt.hashpw(password_bytes, salt)
     return hashed.decode('utf-8')
 
 def verify_password(password: str, hashed: str) -> bool:
     """Verify a password against its hash"""
     password_bytes = password.encode('utf-8')
     hashed_bytes = hashed.encode('utf-8')
-    return bcrypt.checkpw(password_bytes, hashed_bytes)
+    with PASSWORD_SECONDS.labels("verify").time():
+        return bcrypt.checkpw(password_bytes, hashed_bytes)
+
+# Async wrappers: hashing runs on the bcrypt pool, never on the event loop
+async def hash_password_async(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(PASSWORD_POOL, hash_password, password)
+
+async def verify_password_async(password: str, hashed: str) -> bool:
+    return await asyncio.get_running_loop().run_in_executor(PASSWORD_POOL, verify_password, password, hashed)
 
 # Pydantic Models
 class UserAuth(BaseModel):
@@ -47,6 +116,11 @@ class ProfileData(BaseModel):
     username: str
     interests: List[str]
 
+# Identity carried by a verified access token
+class TokenUser(BaseModel):
+    id: int
+    username: str
+
 # Database dependency
 def get_db():
     db = database.SessionLocal()
@@ -55,25 +129,113 @@ def get_db():
     finally:
         db.close()
 
+# Async database dependency used by the request handlers
+async def get_async_db():
+    async with database.AsyncSessionLocal() as db:
+        yield db
+
+async def find_user(db: AsyncSession, username: str):
+    return await db.scalar(select(database.User).where(database.User.username == username))
+
+async def find_profile(db: AsyncSession, user_id: int):
+    return await db.scalar(select(database.UserProfile).where(database.UserProfile.user_id == user_id))
+
+# Stateless JWT dependency: identity comes from the signed token, not the users table.
+# Requests without a token still work and fall back to a username lookup (except recommendations).
+bearer_scheme = HTTPBearer(auto_error=False)
+
+def get_token_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme)) -> Optional[TokenUser]:
+    if credentials is None:
+        return None
+    try:
+        claims = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    if "uid" not in claims:
+        raise HTTPException(status_code=401, detail="Token has no user id, please log in again")
+    return TokenUser(id=claims["uid"], username=claims["sub"])
+
+# Interests of a user in the order they were listed
+async def load_user_interests(db: AsyncSession, user_id: int):
+    result = await db.scalars(
+        select(database.Interest)
+        .join(database.user_interests, database.user_interests.c.interest_id == database.Interest.id)
+        .where(database.user_interests.c.user_id == user_id)
+        .order_by(database.user_interests.c.position)
+    )
+    return result.all()
+
+# Replace a user's interests, creating shared interest rows as needed; returns their ids
+async def save_user_interests(db: AsyncSession, user_id: int, labels: List[str]):
+    wanted = {}
+    for label in labels:
+        if label.strip():
+            wanted.setdefault(database.interest_key(label), label.strip())
+    
+    ids = {}
+    if wanted:
+        # OR IGNORE: concurrent saves may create the same interest
+        await db.execute(insert(database.Interest).prefix_with("OR IGNORE"),
+                         [{"name": key, "label": label} for key, label in wanted.items()])
+        rows = await db.execute(select(database.Interest.name, database.Interest.id)
+                                .where(database.Interest.name.in_(list(wanted))))
+        ids = dict(rows.all())
+    
+    await db.execute(delete(database.user_interests).where(database.user_interests.c.user_id == user_id))
+    if wanted:
+        await db.execute(insert(database.user_interests), [
+            {"user_id": user_id, "interest_id": ids[key], "position": position}
+            for position, key in enumerate(wanted)
+        ])
+    return list(ids.values())
+
+# Precompute embeddings of interests that have none (runs after the response is sent)
+async def embed_interests(interest_ids: List[int]):
+    async with database.AsyncSessionLocal() as db:
+        interests = (await db.scalars(select(database.Interest).where(
+            database.Interest.id.in_(interest_ids), database.Interest.embedding.is_(None)
+        ))).all()
+        if not interests:
+            return
+        try:
+            vectors = await asyncio.get_running_loop().run_in_executor(
+                None, recommendations.encode_interests, [i.label for i in interests])
+        except recommendations.RecommendationsUnavailable as e:
+            print(f"⚠️ Interest embeddings skipped: {e}")
+            return
+        for interest, vector in zip(interests, vectors):
+            await db.execute(update(database.Interest).where(database.Interest.id == interest.id)
+                             .values(embedding=vector.tobytes()))
+        await db.commit()
+
+async def resolve_user_id(db: AsyncSession, username: str, token_user: Optional[TokenUser]):
+    """Id of the user, from the token when there is one, else looked up by username"""
+    if token_user is not None:
+        if token_user.username != username:
+            raise HTTPException(status_code=403, detail="Token belongs to another user")
+        return token_user.id
+    user = await find_user(db, username)
+    return user.id if user else None
+
 @app.get("/")
 def read_root():
     return {"status": "Backend is running!"}
 
 # 1. SIGNUP ENDPOINT - FIXED with direct bcrypt
 @app.post("/signup")
-def signup(request: UserAuth, db: Session = Depends(get_db)):
+async def signup(request: UserAuth, db: AsyncSession = Depends(get_async_db)):
     try:
         print(f"📝 Signup attempt for user: {request.username}")
         print(f"📝 Password length: {len(request.password)}")
         
         # Check if user exists
-        user = db.query(database.User).filter(database.User.username == request.username).first()
+        user = await find_user(db, request.username)
         if user:
             raise HTTPException(status_code=400, detail="Username already exists")
         
         # Hash password using direct bcrypt
         try:
-            hashed_pw = hash_password(request.password)
+            hashed_pw = await hash_password_async(request.password)
             print(f"✅ Password hashed successfully")
             print(f"   Hash length: {len(hashed_pw)}")
         except Exception as e:
@@ -86,8 +248,8 @@ def signup(request: UserAuth, db: Session = Depends(get_db)):
             hashed_password=hashed_pw
         )
         db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
+        await db.commit()
+        await db.refresh(new_user)
         
         print(f"✅ User created with ID: {new_user.id}")
         
@@ -98,7 +260,7 @@ def signup(request: UserAuth, db: Session = Depends(get_db)):
             saved_graphs=""
         )
         db.add(new_profile)
-        db.commit()
+        await db.commit()
         
         print(f"✅ Empty profile created for user")
         
@@ -114,18 +276,18 @@ def signup(request: UserAuth, db: Session = Depends(get_db)):
 
 # 2. LOGIN ENDPOINT - FIXED with direct bcrypt
 @app.post("/login")
-def login(request: UserAuth, db: Session = Depends(get_db)):
+async def login(request: UserAuth, db: AsyncSession = Depends(get_async_db)):
     try:
         print(f"🔑 Login attempt for user: {request.username}")
         
-        user = db.query(database.User).filter(database.User.username == request.username).first()
+        user = await find_user(db, request.username)
         if not user:
             print(f"❌ User not found: {request.username}")
             raise HTTPException(status_code=401, detail="Invalid credentials")
         
         # Verify password using direct bcrypt
         try:
-            password_valid = verify_password(request.password, user.hashed_password)
+            password_valid = await verify_password_async(request.password, user.hashed_password)
             print(f"✅ Password verification result: {password_valid}")
         except Exception as e:
             print(f"❌ Password verification error: {str(e)}")
@@ -138,6 +300,7 @@ def login(request: UserAuth, db: Session = Depends(get_db)):
         # Create token
         token_data = {
             "sub": user.username, 
+            "uid": user.id,
             "exp": datetime.utcnow() + timedelta(hours=24)
         }
         token = jwt.encode(token_data, SECRET_KEY, algorithm=ALGORITHM)
@@ -157,26 +320,27 @@ def login(request: UserAuth, db: Session = Depends(get_db)):
 
 # 3. SAVE PROFILE ENDPOINT
 @app.post("/save_profile")
-def save_profile(profile: ProfileData, db: Session = Depends(get_db)):
+async def save_profile(profile: ProfileData, background_tasks: BackgroundTasks,
+                       db: AsyncSession = Depends(get_async_db),
+                       token_user: Optional[TokenUser] = Depends(get_token_user)):
     try:
         print(f"💾 Save profile for user: {profile.username}")
         print(f"   Interests: {profile.interests}")
         
-        # Find user by username
-        user = db.query(database.User).filter(database.User.username == profile.username).first()
-        if not user:
+        # Find user, from the access token when one is sent
+        user_id = await resolve_user_id(db, profile.username, token_user)
+        if not user_id:
             print(f"❌ User not found: {profile.username}")
             raise HTTPException(status_code=404, detail="User not found")
         
-        print(f"✅ Found user with ID: {user.id}")
+        print(f"✅ Found user with ID: {user_id}")
         
-        # Convert interests list to string
+        # Normalised interests; the comma-joined string is kept for older readers
+        interest_ids = await save_user_interests(db, user_id, profile.interests)
         interests_str = ", ".join(profile.interests) if profile.interests else ""
         
         # Check if profile exists
-        existing_profile = db.query(database.UserProfile).filter(
-            database.UserProfile.user_id == user.id
-        ).first()
+        existing_profile = await find_profile(db, user_id)
         
         if existing_profile:
             print("🔄 Updating existing profile")
@@ -184,13 +348,15 @@ def save_profile(profile: ProfileData, db: Session = Depends(get_db)):
         else:
             print("🆕 Creating new profile")
             new_profile = database.UserProfile(
-                user_id=user.id,
+                user_id=user_id,
                 interests=interests_str,
                 saved_graphs=""
             )
             db.add(new_profile)
         
-        db.commit()
+        await db.commit()
+        recommendations.invalidate(user_id)
+        background_tasks.add_task(embed_interests, interest_ids)
         print("✅ Profile saved successfully")
         
         return {"message": "Profile updated successfully", "status": "success"}
@@ -205,26 +371,22 @@ def save_profile(profile: ProfileData, db: Session = Depends(get_db)):
 
 # 4. GET PROFILE ENDPOINT
 @app.get("/get_profile/{username}")
-def get_profile(username: str, db: Session = Depends(get_db)):
+async def get_profile(username: str, db: AsyncSession = Depends(get_async_db),
+                      token_user: Optional[TokenUser] = Depends(get_token_user)):
     try:
         print(f"📂 Get profile for user: {username}")
         
-        user = db.query(database.User).filter(database.User.username == username).first()
-        if not user:
+        user_id = await resolve_user_id(db, username, token_user)
+        if not user_id:
             raise HTTPException(status_code=404, detail="User not found")
         
-        profile = db.query(database.UserProfile).filter(
-            database.UserProfile.user_id == user.id
-        ).first()
+        profile = await find_profile(db, user_id)
+        interests_list = [interest.label for interest in await load_user_interests(db, user_id)]
         
-        if profile:
-            interests_list = profile.interests.split(", ") if profile.interests else []
-            return {
-                "interests": interests_list,
-                "saved_graphs": profile.saved_graphs or ""
-            }
-        else:
-            return {"interests": [], "saved_graphs": ""}
+        return {
+            "interests": interests_list,
+            "saved_graphs": (profile.saved_graphs or "") if profile else ""
+        }
             
     except HTTPException:
         raise
@@ -251,4 +413,56 @@ def debug(db: Session = Depends(get_db)):
             "profiles": [{"id": p.id, "user_id": p.user_id, "interests": p.interests} for p in profiles]
         }
     except Exception as e:
-        return {"error": str(e)}
\ No newline at end of file
+        return {"error": str(e)}
+
+# 6. INTEREST ENDPOINTS
+@app.get("/interests/{name}/users")
+async def users_with_interest(name: str, db: AsyncSession = Depends(get_async_db)):
+    usernames = await db.scalars(
+        select(database.User.username)
+        .join(database.user_interests, database.user_interests.c.user_id == database.User.id)
+        .join(database.Interest, database.Interest.id == database.user_interests.c.interest_id)
+        .where(database.Interest.name == database.interest_key(name))
+        .order_by(database.User.username)
+    )
+    return {"interest": name, "users": usernames.all()}
+
+# Datasets and entities of the user's own knowledge graph ranked against their interests.
+# Needs the user's token: there is no username fallback for another user's data.
+@app.get("/recommendations/{username}")
+async def get_recommendations(username: str, limit: int = Query(10, ge=1, le=recommendations.MAX_RECOMMENDATIONS),
+                              db: AsyncSession = Depends(get_async_db),
+                              token_user: Optional[TokenUser] = Depends(get_token_user)):
+    if token_user is None:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    user_id = await resolve_user_id(db, username, token_user)
+    if not user_id:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    result = recommendations.cached(user_id, limit)
+    if result is not None:
+        return result
+    
+    interests = await load_user_interests(db, user_id)
+    if not interests:
+        return {"datasets": [], "entities": []}
+    
+    if any(interest.embedding is None for interest in interests):
+        await embed_interests([interest.id for interest in interests])
+        db.expire_all()
+        interests = await load_user_interests(db, user_id)
+        if any(interest.embedding is None for interest in interests):
+            raise HTTPException(status_code=503, detail="Interest embeddings are not available")
+    
+    labels = [interest.label for interest in interests]
+    vectors = np.stack([np.frombuffer(interest.embedding, dtype=np.float32) for interest in interests])
+    try:
+        return await asyncio.get_running_loop().run_in_executor(
+            None, recommendations.recommend, user_id, token_user.username, labels, vectors, limit)
+    except recommendations.RecommendationsUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+# 7. METRICS ENDPOINT
+@app.get("/metrics")
+def metrics():
+    return Response(generate_latest(METRICS), media_type=CONTENT_TYPE_LATEST)
\ No newline at end of file
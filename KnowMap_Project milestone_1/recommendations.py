@@ -0,0 +1,205 @@
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+# CrossDomainKG SQLite database whose entity embedding index is ranked
+KG_DATABASE_PATH = os.environ.get("KG_DATABASE_PATH", "")
+# Must be the model CrossDomainKG encodes entity names with, so vectors are comparable
+ENCODER_MODEL = os.environ.get("KG_ENCODER_MODEL", "paraphrase-MiniLM-L3-v2")
+# Seconds between checks of the KG database for new embeddings
+INDEX_REFRESH_SECONDS = 60
+# Seconds a user's recommendations stay cached; saving the profile clears them earlier
+CACHE_TTL_SECONDS = 300
+
+# Ranking knobs
+MIN_SCORE = 0.35  # cosine below this is not a match
+DOMAIN_BONUS = 0.2  # added to datasets whose domain names one of the interests
+ENTITIES_PER_DATASET = 5  # a dataset scores the mean of its best entity matches
+CANDIDATE_ENTITIES = 2000  # best-matching entities considered for dataset scores
+MAX_RECOMMENDATIONS = 50  # largest limit a request may ask for
+
+class RecommendationsUnavailable(Exception):
+    pass
+
+_encoder = None
+_encoder_lock = threading.Lock()
+
+# Sentence encoder, loaded once on first use
+def get_encoder():
+    global _encoder
+    with _encoder_lock:
+        if _encoder is None:
+            try:
+                from sentence_transformers import SentenceTransformer
+            except ImportError:
+                raise RecommendationsUnavailable("sentence-transformers is not installed")
+            _encoder = SentenceTransformer(ENCODER_MODEL)
+    return _encoder
+
+# L2-normalised float32 embeddings of interest labels
+def encode_interests(labels):
+    vectors = np.asarray(get_encoder().encode(list(labels), show_progress_bar=False), dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+# One immutable load of the KG entity embeddings.
+# owners maps dataset id -> username of the KG account that owns it.
+class IndexSnapshot:
+    def __init__(self, signature=None, rows=(), datasets=None, owners=None):
+        self.signature = signature
+        self.datasets = datasets or {}
+        self.owners = owners or {}
+        rows = [row for row in rows if row[1] in self.datasets]
+        self.entity_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.dataset_ids = np.array([row[1] for row in rows], dtype=np.int64)
+        self.names = [row[2] for row in rows]
+        self.types = [row[3] for row in rows]
+        if rows:
+            self.vectors = np.frombuffer(b"".join(row[4] for row in rows), dtype=np.float32).reshape(len(rows), -1)
+        else:
+            self.vectors = np.zeros((0, 0), dtype=np.float32)
+        # owner -> positions of the rows of their datasets
+        self.rows_by_owner = {}
+        for position, dataset_id in enumerate(self.dataset_ids.tolist()):
+            self.rows_by_owner.setdefault(self.owners.get(dataset_id), []).append(position)
+
+# In-memory copy of the KG entity embedding index, reloaded when the KG database changes.
+# Requests rank against whole snapshots, so a reload never shows them a half-built index.
+class KGIndex:
+    def __init__(self, path):
+        self.path = path
+        self.current = IndexSnapshot()
+        self.checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if not self.path or not os.path.exists(self.path):
+            raise RecommendationsUnavailable("KG_DATABASE_PATH does not point at the CrossDomainKG database")
+        return sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+
+    # Current snapshot, reloaded first if the KG database changed since the last check
+    def snapshot(self):
+        with self._lock:
+            if time.monotonic() - self.checked_at >= INDEX_REFRESH_SECONDS:
+                conn = self._connect()
+                try:
+                    signature = conn.execute("SELECT COUNT(*), MAX(entity_id) FROM entity_embeddings").fetchone()
+                    if signature != self.current.signature:
+                        self.current = self._load(conn, signature)
+                finally:
+                    conn.close()
+                self.checked_at = time.monotonic()
+            return self.current
+
+    def _load(self, conn, signature):
+        rows = conn.execute(
+            "SELECT ee.entity_id, e.dataset_id, e.name, e.type, ee.vector "
+            "FROM entity_embeddings ee JOIN entities e ON e.id = ee.entity_id"
+        ).fetchall()
+        # Datasets marked as deleted keep their rows until the KG app's background purge
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(datasets)")}
+        query = "SELECT d.id, d.name, d.domain, u.username FROM datasets d JOIN users u ON u.id = d.user_id"
+        if "deleted" in columns:
+            query += " WHERE d.deleted = 0"
+        datasets, owners = {}, {}
+        for dataset_id, name, domain, owner in conn.execute(query):
+            datasets[dataset_id] = {"id": dataset_id, "name": name, "domain": domain}
+            owners[dataset_id] = owner
+        return IndexSnapshot(signature, rows, datasets, owners)
+
+_index = KGIndex(KG_DATABASE_PATH)
+
+# user id -> (expires at, index signature, limit, result)
+_cache = {}
+_cache_lock = threading.Lock()
+
+def cached(user_id, limit):
+    entry = _cache.get(user_id)
+    if entry and entry[0] > time.monotonic() and entry[1] == _index.current.signature and entry[2] == limit:
+        return entry[3]
+    return None
+
+def invalidate(user_id):
+    with _cache_lock:
+        _cache.pop(user_id, None)
+
+# Rank the KG datasets and entities of a user against their interests and cache the result.
+# KG accounts are matched by username: only datasets owned by the same username are ranked.
+def recommend(user_id, username, labels, vectors, limit=10):
+    index = _index.snapshot()
+    result = rank(index, username, labels, vectors, limit)
+    with _cache_lock:
+        _cache[user_id] = (time.monotonic() + CACHE_TTL_SECONDS, index.signature, limit, result)
+    return result
+
+def rank(index, owner, labels, vectors, limit):
+    keys = [" ".join(label.split()).lower() for label in labels]
+    dataset_scores = {}
+    dataset_matches = {}
+    entities = []
+    # Rows and datasets of the owner only
+    rows = np.asarray(index.rows_by_owner.get(owner, []), dtype=np.int64)
+    datasets = {dataset_id: dataset for dataset_id, dataset in index.datasets.items()
+                if index.owners.get(dataset_id) == owner}
+
+    if len(rows) and len(labels):
+        if index.vectors.shape[1] != vectors.shape[1]:
+            raise RecommendationsUnavailable(
+                f"KG embeddings have {index.vectors.shape[1]} dimensions, interests {vectors.shape[1]}; "
+                "set KG_ENCODER_MODEL to the model CrossDomainKG uses")
+
+        # Best-matching interest of every entity; i below indexes rows
+        scores = index.vectors[rows] @ vectors.T
+        best = scores.max(axis=1)
+        which = scores.argmax(axis=1)
+
+        k = min(CANDIDATE_ENTITIES, len(best))
+        top = np.argpartition(-best, k - 1)[:k]
+        top = top[np.argsort(-best[top], kind="stable")]
+        top = top[best[top] >= MIN_SCORE]
+
+        per_dataset = {}
+        for i in top:
+            position = rows[i]
+            dataset_id = int(index.dataset_ids[position])
+            hits = per_dataset.setdefault(dataset_id, [])
+            if len(hits) < ENTITIES_PER_DATASET:
+                hits.append(i)
+            if len(entities) < limit:
+                entities.append({
+                    "id": int(index.entity_ids[position]),
+                    "name": index.names[position],
+                    "type": index.types[position],
+                    "dataset_id": dataset_id,
+                    "interest": labels[which[i]],
+                    "score": round(float(best[i]), 4),
+                })
+
+        for dataset_id, hits in per_dataset.items():
+            dataset_scores[dataset_id] = float(np.mean(best[hits]))
+            dataset_matches[dataset_id] = {
+                "interests": list(dict.fromkeys(labels[which[i]] for i in hits)),
+                "top_entities": [index.names[rows[i]] for i in hits[:3]],
+            }
+
+    # Datasets whose domain is one of the interests rank higher, with or without entity matches
+    for dataset_id, dataset in datasets.items():
+        domain = (dataset["domain"] or "").lower()
+        matched = [label for label, key in zip(labels, keys) if domain and key and (key in domain or domain in key)]
+        if matched:
+            dataset_scores[dataset_id] = dataset_scores.get(dataset_id, 0.0) + DOMAIN_BONUS
+            match = dataset_matches.setdefault(dataset_id, {"interests": [], "top_entities": []})
+            match["interests"] = list(dict.fromkeys(match["interests"] + matched))
+
+    ranked = sorted(dataset_scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+    return {
+        "datasets": [
+            dict(index.datasets[dataset_id], score=round(score, 4), **dataset_matches[dataset_id])
+            for dataset_id, score in ranked
+        ],
+        "entities": entities,
+    }
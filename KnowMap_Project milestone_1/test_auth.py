@@ -0,0 +1,103 @@
+import os
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+# database.py opens ./knowmap.db and recommendations.py reads KG_DATABASE_PATH when imported
+_tmp = tempfile.mkdtemp()
+os.chdir(_tmp)
+os.environ["KG_DATABASE_PATH"] = os.path.join(_tmp, "kg.db")
+os.environ["BCRYPT_ROUNDS"] = "4"
+
+import main
+import recommendations
+from fastapi.testclient import TestClient
+from jose import jwt
+
+client = TestClient(main.app)
+
+# Deterministic stand-in for the sentence encoder: one dimension per known word
+WORDS = ["diabetes", "asthma", "finance", "healthcare"]
+
+def fake_encode(labels):
+    vectors = np.array([[1.0 if word in label.lower() else 0.0 for word in WORDS] for label in labels], dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+# A CrossDomainKG database where alice and bob each own a dataset mentioning diabetes
+def make_kg_database(path):
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        "CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT);"
+        "CREATE TABLE datasets (id INTEGER PRIMARY KEY, name TEXT, domain TEXT, user_id INTEGER, deleted INTEGER DEFAULT 0);"
+        "CREATE TABLE entities (id INTEGER PRIMARY KEY, name TEXT, type TEXT, dataset_id INTEGER);"
+        "CREATE TABLE entity_embeddings (entity_id INTEGER PRIMARY KEY, user_id INTEGER, domain TEXT, vector BLOB);"
+    )
+    conn.execute("INSERT INTO users VALUES (1, 'alice'), (2, 'bob')")
+    conn.execute("INSERT INTO datasets VALUES (1, 'alice_notes', 'healthcare', 1, 0), (2, 'bob_notes', 'healthcare', 2, 0)")
+    for entity_id, name, dataset_id in [(1, "Diabetes", 1), (2, "Diabetes", 2), (3, "Asthma", 2)]:
+        conn.execute("INSERT INTO entities VALUES (?, ?, 'DISEASE', ?)", (entity_id, name, dataset_id))
+        conn.execute("INSERT INTO entity_embeddings VALUES (?, ?, 'healthcare', ?)",
+                     (entity_id, dataset_id, fake_encode([name])[0].tobytes()))
+    conn.commit()
+    conn.close()
+
+@pytest.fixture(scope="module", autouse=True)
+def kg_database():
+    make_kg_database(os.environ["KG_DATABASE_PATH"])
+    recommendations._index = recommendations.KGIndex(os.environ["KG_DATABASE_PATH"])
+    original = recommendations.encode_interests
+    recommendations.encode_interests = fake_encode
+    yield
+    recommendations.encode_interests = original
+
+def login(username, password="secret1"):
+    client.post("/signup", json={"username": username, "password": password})
+    response = client.post("/login", json={"username": username, "password": password})
+    assert response.status_code == 200
+    return response.json()["access_token"]
+
+def bearer(token):
+    return {"Authorization": f"Bearer {token}"}
+
+# JWT verification
+def test_login_token_is_signed_and_carries_the_user():
+    claims = jwt.decode(login("carol"), main.SECRET_KEY, algorithms=[main.ALGORITHM])
+    assert claims["sub"] == "carol" and isinstance(claims["uid"], int)
+
+def test_tampered_expired_and_foreign_tokens_are_rejected():
+    token = login("dave")
+    assert client.get("/get_profile/dave", headers=bearer(token)).status_code == 200
+    assert client.get("/get_profile/dave", headers=bearer(token[:-2] + "xx")).status_code == 401
+
+    claims = jwt.decode(token, main.SECRET_KEY, algorithms=[main.ALGORITHM])
+    expired = jwt.encode(dict(claims, exp=datetime.utcnow() - timedelta(minutes=1)), main.SECRET_KEY, main.ALGORITHM)
+    assert client.get("/get_profile/dave", headers=bearer(expired)).status_code == 401
+    forged = jwt.encode(claims, "another_secret", main.ALGORITHM)
+    assert client.get("/get_profile/dave", headers=bearer(forged)).status_code == 401
+    no_uid = jwt.encode({"sub": "dave", "exp": claims["exp"]}, main.SECRET_KEY, main.ALGORITHM)
+    assert client.get("/get_profile/dave", headers=bearer(no_uid)).status_code == 401
+
+    login("erin")
+    assert client.get("/get_profile/erin", headers=bearer(token)).status_code == 403
+
+# Recommendations
+def test_recommendations_need_a_token_and_a_bounded_limit():
+    token = login("alice")
+    assert client.get("/recommendations/alice").status_code == 401
+    assert client.get("/recommendations/alice?limit=0", headers=bearer(token)).status_code == 422
+    assert client.get("/recommendations/alice?limit=51", headers=bearer(token)).status_code == 422
+    assert client.get("/recommendations/bob", headers=bearer(token)).status_code == 403
+
+def test_recommendations_rank_only_the_users_own_kg_data():
+    token = login("alice")
+    assert client.post("/save_profile", json={"username": "alice", "interests": ["Diabetes", "Asthma"]},
+                       headers=bearer(token)).status_code == 200
+
+    result = client.get("/recommendations/alice?limit=50", headers=bearer(token)).json()
+    assert [d["name"] for d in result["datasets"]] == ["alice_notes"]
+    assert [(e["name"], e["dataset_id"]) for e in result["entities"]] == [("Diabetes", 1)]
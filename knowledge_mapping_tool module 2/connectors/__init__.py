@@ -0,0 +1,9 @@
+# Asynchronous bulk ingestion from web sources (needs httpx):
+#
+#     from connectors import get_source, ingest
+#     for document, result in ingest(get_source("wikipedia"), ["Insulin", "Machine learning"]):
+#         print(document["title"], result["entities"])
+from connectors.cache import ResponseCache, request_key
+from connectors.fetcher import Fetcher, FetchError, RateLimiter
+from connectors.sources import Source, WikipediaSource, ArxivSource, SOURCES, register_source, get_source
+from connectors.stream import stream_documents, fetch_documents, ingest
@@ -0,0 +1,60 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "KNOWMAP_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "knowmap", "connectors"))
+# Seconds a cached response is served before the request is made again
+DEFAULT_MAX_AGE = 7 * 24 * 3600
+
+# Cache key of a request: SHA-256 of its method, URL and sorted query parameters
+def request_key(method, url, params=None):
+    canonical = json.dumps([method.upper(), url, sorted((params or {}).items())], default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+# Content-addressed response cache on disk.
+# Bodies are stored once under the SHA-256 of their bytes (objects/ab/abcd...),
+# and each request key points at a body hash (refs/ab/abcd...), so identical
+# responses to different requests share one file.
+class ResponseCache:
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_age=DEFAULT_MAX_AGE):
+        self.root = root
+        self.max_age = max_age
+
+    def _path(self, kind, digest):
+        return os.path.join(self.root, kind, digest[:2], digest)
+
+    # Write via a temporary file and rename, so readers never see partial files
+    def _write(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    # Cached body of a request key, or None when missing or older than max_age
+    def get(self, key):
+        ref = self._path("refs", key)
+        try:
+            if self.max_age is not None and time.time() - os.path.getmtime(ref) > self.max_age:
+                return None
+            with open(ref) as f:
+                digest = f.read().strip()
+            with open(self._path("objects", digest), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put(self, key, body):
+        digest = hashlib.sha256(body).hexdigest()
+        obj = self._path("objects", digest)
+        if not os.path.exists(obj):
+            self._write(obj, body)
+        self._write(self._path("refs", key), digest.encode("ascii"))
+        return digest
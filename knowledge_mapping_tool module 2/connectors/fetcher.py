@@ -0,0 +1,121 @@
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+import httpx
+
+from connectors.cache import request_key
+
+# Statuses worth retrying: rate limited or a temporary server failure
+RETRY_STATUS = {429, 500, 502, 503, 504}
+USER_AGENT = "KnowMap/1.0 (knowledge mapping tool)"
+
+class FetchError(Exception):
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+# Token bucket shared by all requests to one source: `rate` requests per second, bursts of `burst`
+class RateLimiter:
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+# Seconds asked for by a Retry-After header, if any
+def _retry_after(response):
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        try:
+            return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+        except (TypeError, ValueError):
+            return None
+
+# Concurrent HTTP GETs over one pooled client, with a cap on requests in flight,
+# retry with exponential backoff and jitter, and an optional on-disk cache
+class Fetcher:
+    def __init__(self, cache=None, concurrency=8, max_retries=3, backoff=0.5, timeout=20.0, client=None):
+        self.cache = cache
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.client = client
+        self._own_client = client is None
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.stats = {"requests": 0, "cache_hits": 0, "retries": 0, "errors": 0}
+
+    async def __aenter__(self):
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.concurrency),
+                headers={"User-Agent": USER_AGENT},
+                follow_redirects=True,
+            )
+        return self
+
+    async def __aexit__(self, *exc):
+        if self._own_client:
+            await self.client.aclose()
+            self.client = None
+
+    # Body of a GET request, from the cache when present
+    async def get(self, url, params=None, limiter=None):
+        key = request_key("GET", url, params)
+        if self.cache is not None:
+            body = await asyncio.to_thread(self.cache.get, key)
+            if body is not None:
+                self.stats["cache_hits"] += 1
+                return body
+
+        async with self._semaphore:
+            body = await self._get(url, params, limiter)
+
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.put, key, body)
+        return body
+
+    async def _get(self, url, params, limiter):
+        for attempt in range(self.max_retries + 1):
+            if limiter is not None:
+                await limiter.acquire()
+            self.stats["requests"] += 1
+            wait = None
+            try:
+                response = await self.client.get(url, params=params)
+            except httpx.TransportError as e:
+                error = FetchError(f"GET {url} failed: {e}")
+            else:
+                if response.status_code < 400:
+                    return response.content
+                error = FetchError(f"GET {url} returned {response.status_code}", response.status_code)
+                if response.status_code not in RETRY_STATUS:
+                    break
+                wait = _retry_after(response)
+
+            if attempt == self.max_retries:
+                break
+            self.stats["retries"] += 1
+            await asyncio.sleep(wait if wait is not None else self.backoff * 2 ** attempt * (1 + random.random()))
+
+        self.stats["errors"] += 1
+        raise error
@@ -0,0 +1,102 @@
+import json
+import re
+import xml.etree.ElementTree as ET
+from urllib.parse import quote
+
+ATOM = {"atom": "http://www.w3.org/2005/Atom"}
+
+# A source turns a query into GET requests and their response bodies into documents:
+# {"source", "id", "title", "text", "url"}
+class Source:
+    name = None
+    base_url = None
+    rate = 5.0   # requests per second
+    burst = 1
+
+    def __init__(self, base_url=None, rate=None):
+        if base_url:
+            self.base_url = base_url.rstrip("/")
+        if rate:
+            self.rate = rate
+
+    # [(url, params)] to fetch for a query
+    def requests(self, query):
+        raise NotImplementedError
+
+    # Documents in one response body
+    def parse(self, query, body):
+        raise NotImplementedError
+
+def _squash(text):
+    return re.sub(r"\s+", " ", text or "").strip()
+
+# Page summaries from the Wikipedia REST API; a query is a page title
+class WikipediaSource(Source):
+    name = "wikipedia"
+    base_url = "https://en.wikipedia.org"
+    rate = 10.0
+    burst = 5
+
+    def requests(self, query):
+        title = quote(query.strip().replace(" ", "_"), safe="")
+        return [(f"{self.base_url}/api/rest_v1/page/summary/{title}", None)]
+
+    def parse(self, query, body):
+        data = json.loads(body)
+        text = _squash(data.get("extract"))
+        if not text or data.get("type") == "disambiguation":
+            return []
+        return [{
+            "source": self.name,
+            "id": str(data.get("pageid") or data.get("title") or query),
+            "title": data.get("title", query),
+            "text": text,
+            "url": data.get("content_urls", {}).get("desktop", {}).get("page"),
+        }]
+
+# Paper abstracts from the arXiv export API; arXiv asks for one request every three seconds
+class ArxivSource(Source):
+    name = "arxiv"
+    base_url = "https://export.arxiv.org"
+    rate = 1 / 3
+
+    def __init__(self, base_url=None, rate=None, max_results=10):
+        super().__init__(base_url, rate)
+        self.max_results = max_results
+
+    def requests(self, query):
+        params = {"search_query": f"all:{query}", "start": 0, "max_results": self.max_results}
+        return [(f"{self.base_url}/api/query", params)]
+
+    def parse(self, query, body):
+        documents = []
+        for entry in ET.fromstring(body).findall("atom:entry", ATOM):
+            title = _squash(entry.findtext("atom:title", "", ATOM))
+            summary = _squash(entry.findtext("atom:summary", "", ATOM))
+            if not summary:
+                continue
+            url = _squash(entry.findtext("atom:id", "", ATOM))
+            documents.append({
+                "source": self.name,
+                "id": url.rsplit("/", 1)[-1] or title,
+                "title": title,
+                "text": f"{title}. {summary}" if title else summary,
+                "url": url,
+            })
+        return documents
+
+# Source name -> class; register_source() plugs in new sources
+SOURCES = {}
+
+def register_source(cls):
+    SOURCES[cls.name] = cls
+    return cls
+
+register_source(WikipediaSource)
+register_source(ArxivSource)
+
+def get_source(name, **options):
+    try:
+        return SOURCES[name](**options)
+    except KeyError:
+        raise ValueError(f"Unknown source {name!r}; available: {', '.join(sorted(SOURCES))}")
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import queue
+import threading
+
+from connectors.cache import ResponseCache
+from connectors.fetcher import Fetcher, FetchError, RateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Fetch all queries of a source concurrently and yield documents as responses arrive.
+# Failed requests are logged as warnings and skipped; documents seen before are not yielded twice.
+async def stream_documents(source, queries, fetcher):
+    limiter = RateLimiter(source.rate, source.burst)
+
+    async def fetch(query, url, params):
+        try:
+            body = await fetcher.get(url, params, limiter)
+        except FetchError as e:
+            logger.warning("Skipping %s %r: %s", source.name, query, e)
+            return []
+        try:
+            return source.parse(query, body)
+        except ValueError as e:  # includes JSON and XML parse errors
+            logger.warning("Skipping %s %r: unreadable response (%s)", source.name, query, e)
+            return []
+
+    tasks = [
+        asyncio.ensure_future(fetch(query, url, params))
+        for query in dict.fromkeys(queries)
+        for url, params in source.requests(query)
+    ]
+    seen = set()
+    try:
+        for done in asyncio.as_completed(tasks):
+            for document in await done:
+                key = (document["source"], document["id"])
+                if key not in seen:
+                    seen.add(key)
+                    yield document
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def fetch_documents(source, queries, cache=None, concurrency=8):
+    async with Fetcher(cache=cache, concurrency=concurrency) as fetcher:
+        return [document async for document in stream_documents(source, queries, fetcher)]
+
+_DONE = object()
+# Seconds a blocked producer waits before checking whether the consumer has gone
+_PUT_POLL_SECONDS = 0.1
+
+# Fetch documents on an event loop in a background thread and run them through the
+# batched NLP pipeline as they arrive: whatever is waiting (up to batch_size) is parsed
+# together while the next responses download. Yields (document, pipeline result).
+# A producer error is raised after the documents that arrived before it are yielded;
+# closing the generator early stops the producer.
+def ingest(source, queries, batch_size=16, cache=None, concurrency=8, pipeline=None):
+    if pipeline is None:
+        from nlp.nlp_pipeline import run_nlp_pipeline_many as pipeline
+    if cache is None:
+        cache = ResponseCache()
+
+    documents = queue.Queue(maxsize=batch_size * 4)
+    stop = threading.Event()
+
+    # Put unless the consumer stopped; False once it has
+    def put(item):
+        while not stop.is_set():
+            try:
+                documents.put(item, timeout=_PUT_POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        async def main():
+            async with Fetcher(cache=cache, concurrency=concurrency) as fetcher:
+                async for document in stream_documents(source, queries, fetcher):
+                    # Blocks while the pipeline is behind, without stalling the event loop
+                    if not await asyncio.to_thread(put, document):
+                        break
+
+        try:
+            asyncio.run(main())
+        except BaseException as e:
+            put(e)
+        finally:
+            put(_DONE)
+
+    threading.Thread(target=produce, name=f"{source.name}-fetch", daemon=True).start()
+
+    error = None
+    finished = False
+    try:
+        while not finished:
+            batch = []
+            item = documents.get()
+            while True:
+                if item is _DONE:
+                    finished = True
+                    break
+                if isinstance(item, BaseException):
+                    error = item
+                    finished = True
+                    break
+                batch.append(item)
+                if len(batch) >= batch_size:
+                    break
+                try:
+                    item = documents.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                results = pipeline([document["text"] for document in batch], batch_size=batch_size)
+                yield from zip(batch, results)
+        if error is not None:
+            raise error
+    finally:
+        stop.set()
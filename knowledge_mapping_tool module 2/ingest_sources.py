@@ -0,0 +1,72 @@
+import argparse
+import json
+import logging
+import time
+
+import networkx as nx
+
+from connectors import ResponseCache, get_source, ingest
+from connectors.cache import DEFAULT_CACHE_DIR
+
+# Bulk-ingest Wikipedia pages or arXiv abstracts into the NLP pipeline and knowledge graph:
+#
+#     python ingest_sources.py wikipedia "Machine learning" "Insulin" --graph kg.graphml
+#     python ingest_sources.py arxiv "graph neural networks" --max-results 50 --output papers.jsonl
+#
+# Responses are cached on disk, so re-running the same queries makes no requests.
+
+# Add the triples of one document to the graph, remembering where each edge came from
+def add_relations(G, document, relations):
+    for rel in relations:
+        G.add_node(rel["subject"])
+        G.add_node(rel["object"])
+        G.add_edge(rel["subject"], rel["object"], label=rel["relation"],
+                   source=document["source"], document=document["id"])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch documents from a web source and run the NLP pipeline on them")
+    parser.add_argument("source", help="wikipedia or arxiv")
+    parser.add_argument("queries", nargs="*", help="page titles or search queries")
+    parser.add_argument("--queries-file", help="file with one query per line")
+    parser.add_argument("--max-results", type=int, default=10, help="results per arXiv query")
+    parser.add_argument("--base-url", help="API base URL, e.g. a local mirror")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--output", help="write documents and pipeline results as JSON lines")
+    parser.add_argument("--graph", help="write the knowledge graph as GraphML")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")  # skipped requests
+
+    queries = list(args.queries)
+    if args.queries_file:
+        with open(args.queries_file, encoding="utf-8") as f:
+            queries += [line.strip() for line in f if line.strip()]
+    if not queries:
+        parser.error("no queries given")
+
+    options = {"base_url": args.base_url}
+    if args.source == "arxiv":
+        options["max_results"] = args.max_results
+    source = get_source(args.source, **options)
+
+    G = nx.DiGraph()
+    out = open(args.output, "w", encoding="utf-8") if args.output else None
+    start = time.perf_counter()
+    count = 0
+    try:
+        for document, result in ingest(source, queries, batch_size=args.batch_size,
+                                       cache=ResponseCache(args.cache_dir), concurrency=args.concurrency):
+            count += 1
+            add_relations(G, document, result["relations"])
+            print(f"{document['title']}: {len(result['entities'])} entities, {len(result['relations'])} relations")
+            if out:
+                out.write(json.dumps(dict(document, **result)) + "\n")
+    finally:
+        if out:
+            out.close()
+
+    print(f"\n{count} documents in {time.perf_counter() - start:.1f}s; "
+          f"graph has {G.number_of_nodes()} nodes and {G.number_of_edges()} edges")
+    if args.graph:
+        nx.write_graphml(G, args.graph)
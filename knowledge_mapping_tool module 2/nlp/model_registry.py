@@ -0,0 +1,64 @@
+import gc
+import os
+import threading
+import time
+
+import spacy
+
+DEFAULT_MODEL = "en_core_web_sm"
+
+# (model name, disabled components) -> loaded Language object
+_models = {}
+_stats = {}
+_lock = threading.Lock()
+
+# Resident memory of this process in bytes
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        try:
+            import resource
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        except ImportError:
+            return 0
+
+# Return the model, loading it once per process on first use
+def get_model(name=DEFAULT_MODEL, disable=()):
+    key = (name, tuple(sorted(disable)))
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _lock:
+        if key in _models:
+            return _models[key]
+
+        rss_before = _rss_bytes()
+        start = time.perf_counter()
+        model = spacy.load(name, disable=list(key[1]))
+        _stats[key] = {
+            "name": name,
+            "disable": list(key[1]),
+            "load_seconds": round(time.perf_counter() - start, 3),
+            "memory_bytes": max(_rss_bytes() - rss_before, 0),
+            "pid": os.getpid(),
+        }
+        _models[key] = model
+    return model
+
+# Load time and memory of every model loaded in this process
+def model_stats():
+    return [dict(stats) for stats in _stats.values()]
+
+# Load models in the parent process before forking workers; gc.freeze() keeps
+# the model objects out of garbage collection so copy-on-write pages stay shared
+def preload(*specs, freeze=True):
+    for spec in specs or (DEFAULT_MODEL,):
+        if isinstance(spec, str):
+            get_model(spec)
+        else:
+            get_model(*spec)
+    if freeze:
+        gc.freeze()
@@ -1,11 +1,12 @@
-import spacy
-
-# Load spaCy model
-nlp = spacy.load("en_core_web_sm")
+from nlp.model_registry import get_model
 
 # Function to extract named entities
 def extract_entities(text):
-    doc = nlp(text)
+    doc = get_model()(text)
+    return entities_from_doc(doc)
+
+# Entities of an already parsed Doc
+def entities_from_doc(doc):
     entities = []
 
     for ent in doc.ents:
@@ -1,20 +1,75 @@
-from nlp.preprocessing import preprocess_text
-from nlp.ner_spacy import extract_entities
-from nlp.relation_extraction import extract_relations
+from collections import OrderedDict
 
-# Main pipeline function
-def run_nlp_pipeline(text):
-    # Step 1: Preprocessing
-    cleaned_sentences = preprocess_text(text)
+from nlp.model_registry import get_model, DEFAULT_MODEL
+from nlp.preprocessing import preprocess_doc
+from nlp.ner_spacy import entities_from_doc
+from nlp.relation_extraction import relations_from_doc
+
+# Stages run on the shared Doc: (result key, function taking the Doc)
+DEFAULT_STAGES = [
+    ("cleaned_sentences", preprocess_doc),   # Step 1: Preprocessing
+    ("entities", entities_from_doc),         # Step 2: Named Entity Recognition
+    ("relations", relations_from_doc),       # Step 3: Relation Extraction (Triples)
+]
+
+# Staged pipeline: every text is parsed by spaCy once and all stages share the Doc
+class NLPPipeline:
+    def __init__(self, model=None, stages=None, cache_size=128, model_name=DEFAULT_MODEL):
+        self._model = model
+        self.model_name = model_name
+        self.stages = list(stages or DEFAULT_STAGES)
+        self.cache_size = cache_size
+        self._docs = OrderedDict()
+
+    # The spaCy model, taken from the shared registry on first use
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = get_model(self.model_name)
+        return self._model
+
+    # Parse a text, reusing the cached Doc for recently seen texts
+    def parse(self, text):
+        doc = self._docs.get(text)
+        if doc is None:
+            doc = self.model(text)
+            self._remember(text, doc)
+        else:
+            self._docs.move_to_end(text)
+        return doc
+
+    def _remember(self, text, doc):
+        if self.cache_size <= 0:
+            return
+        self._docs[text] = doc
+        if len(self._docs) > self.cache_size:
+            self._docs.popitem(last=False)
 
-    # Step 2: Named Entity Recognition
-    entities = extract_entities(text)
+    def run_stages(self, doc):
+        return {key: stage(doc) for key, stage in self.stages}
 
-    # Step 3: Relation Extraction (Triples)
-    relations = extract_relations(text)
+    def run(self, text):
+        return self.run_stages(self.parse(text))
+
+    # Batched entry point: uncached texts are parsed together with nlp.pipe()
+    def run_many(self, texts, batch_size=64, n_process=1):
+        texts = list(texts)
+        docs = {text: self._docs[text] for text in texts if text in self._docs}
+        missing = list(dict.fromkeys(t for t in texts if t not in docs))
+
+        parsed = self.model.pipe(missing, batch_size=batch_size, n_process=n_process)
+        for text, doc in zip(missing, parsed):
+            docs[text] = doc
+            self._remember(text, doc)
+
+        return [self.run_stages(docs[text]) for text in texts]
+
+default_pipeline = NLPPipeline()
+
+# Main pipeline function
+def run_nlp_pipeline(text):
+    return default_pipeline.run(text)
 
-    return {
-        "cleaned_sentences": cleaned_sentences,
-        "entities": entities,
-        "relations": relations
-    }
+# Batched pipeline function
+def run_nlp_pipeline_many(texts, batch_size=64, n_process=1):
+    return default_pipeline.run_many(texts, batch_size=batch_size, n_process=n_process)
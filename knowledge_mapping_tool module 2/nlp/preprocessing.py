@@ -1,8 +1,5 @@
 import re
-import spacy
-
-# Load spaCy model
-nlp = spacy.load("en_core_web_sm")
+from nlp.model_registry import get_model
 
 # Function to clean raw text
 def clean_text(text):
@@ -15,16 +12,22 @@ def clean_text(text):
 # Function for preprocessing
 def preprocess_text(text):
     text = clean_text(text)
-    doc = nlp(text)
+    doc = get_model()(text)
+    return preprocess_doc(doc)
 
+# Preprocessing on an already parsed Doc (shared with the other pipeline stages)
+def preprocess_doc(doc):
     processed_sentences = []
 
     for sent in doc.sents:
-        tokens = [
-            token.lemma_.lower()
-            for token in sent
-            if not token.is_stop and not token.is_punct
-        ]
+        tokens = []
+        for token in sent:
+            if token.is_stop or token.is_punct:
+                continue
+            # Same characters clean_text() would have dropped before parsing
+            lemma = re.sub(r'[^\w.]', '', token.lemma_.lower())
+            if lemma:
+                tokens.append(lemma)
         processed_sentences.append(" ".join(tokens))
 
     return processed_sentences
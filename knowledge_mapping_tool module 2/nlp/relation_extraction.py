@@ -1,36 +1,51 @@
-import spacy
+import numpy as np
+from spacy.attrs import DEP, POS, SENT_START
+from spacy.parts_of_speech import IDS as POS_IDS
+from spacy.strings import get_string_id
 
-# Load spaCy model
-nlp = spacy.load("en_core_web_sm")
+from nlp.model_registry import get_model
 
 # Improved relation extraction (more flexible for demo)
 def extract_relations(text):
-    doc = nlp(text)
-    relations = []
-
-    for sent in doc.sents:
-        subject = None
-        relation = None
-        obj = None
-
-        for token in sent:
-            # Find subject
-            if token.dep_ in ("nsubj", "nsubjpass"):
-                subject = token.text
+    doc = get_model()(text)
+    return relations_from_doc(doc)
+
+SUBJECT_DEPS = ("nsubj", "nsubjpass")
+OBJECT_DEPS = ("dobj", "pobj", "attr", "dative", "oprd")
+VERB_POS = "VERB"
+
+_SUBJECT_IDS = np.array([get_string_id(d) for d in SUBJECT_DEPS], dtype=np.uint64)
+_OBJECT_IDS = np.array([get_string_id(d) for d in OBJECT_DEPS], dtype=np.uint64)
+
+# Index of the last token of each sentence matching a mask, -1 where none does
+def _last_per_sentence(mask, sentence, sentences):
+    last = np.full(sentences, -1, dtype=np.int64)
+    np.maximum.at(last, sentence[mask], np.flatnonzero(mask))
+    return last
+
+# Relations of an already parsed Doc: per sentence the last subject, verb and object.
+# Works on doc.to_array integer columns instead of comparing dep_/pos_ strings per token.
+def relations_from_doc(doc):
+    if not len(doc):
+        return []
+
+    array = doc.to_array([DEP, POS, SENT_START])
+    starts = array[:, 2].astype(np.int64) == 1
+    starts[0] = True
+    sentence = np.cumsum(starts) - 1
+    sentences = int(sentence[-1]) + 1
+
+    subjects = _last_per_sentence(np.isin(array[:, 0], _SUBJECT_IDS), sentence, sentences)
+    verbs = _last_per_sentence(array[:, 1] == POS_IDS[VERB_POS], sentence, sentences)
+    objects = _last_per_sentence(np.isin(array[:, 0], _OBJECT_IDS), sentence, sentences)
 
-            # Find main verb (relation)
-            if token.pos_ == "VERB":
-                relation = token.text
-
-            # Find object
-            if token.dep_ in ("dobj", "pobj", "attr", "dative", "oprd"):
-                obj = token.text
-
-        if subject and relation and obj:
+    relations = []
+    for subject, relation, obj in zip(subjects.tolist(), verbs.tolist(), objects.tolist()):
+        if subject >= 0 and relation >= 0 and obj >= 0:
             relations.append({
-                "subject": subject,
-                "relation": relation,
-                "object": obj
+                "subject": doc[subject].text,
+                "relation": doc[relation].text,
+                "object": doc[obj].text
             })
 
     return relations
@@ -0,0 +1,288 @@
+"""Load-test the CrossDomainKG Flask app and the milestone 1 FastAPI backend.
+
+Seeds a scratch database, starts both services locally, drives a weighted
+mix of requests from concurrent virtual users for a fixed duration and
+reports p50/p95/p99 latency, throughput and error rate per operation:
+
+    python loadtest/loadtest.py --concurrency 16 --duration 60
+    python loadtest/loadtest.py --target kg --concurrency 4 --output run.json
+
+Each virtual user is a thread with its own cookie/token session, logged in
+as one of the seeded users.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+KG_DIR = os.path.join(ROOT, 'CrossDomainKG')
+API_DIR = os.path.join(ROOT, 'KnowMap_Project milestone_1')
+sys.path.insert(0, KG_DIR)
+
+from benchmarks.corpus import HEALTHCARE_HEADER, healthcare_rows
+
+# Operation weights of each traffic mix
+KG_MIX = {'login': 10, 'dashboard': 25, 'graph': 35, 'search': 20, 'upload': 10}
+API_MIX = {'login': 20, 'get_profile': 50, 'save_profile': 20, 'status': 10}
+
+SEARCH_QUERIES = ['diabetes treatment', 'hospital', 'machine learning', 'Dr. Sharma', 'heart disease monitor']
+INTERESTS = ['AI', 'Healthcare', 'Physics', 'Biology', 'Finance', 'Climate', 'Robotics']
+UPLOAD_ROWS = 20
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(int(round(pct / 100 * len(sorted_values))) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+def wait_until_up(url, timeout=120):
+    """Poll a URL until the service answers"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(url, timeout=2, allow_redirects=False)
+            return
+        except requests.RequestException:
+            time.sleep(0.5)
+    raise RuntimeError(f'{url} did not come up within {timeout}s')
+
+def start_kg(work_dir, port, users, rows, log):
+    """Seed a scratch database and start the Flask app on it"""
+    env = dict(os.environ,
+               KG_DATABASE_URI='sqlite:///' + os.path.join(work_dir, 'kg.db'),
+               KG_UPLOAD_FOLDER=os.path.join(work_dir, 'uploads'))
+    seed_file = os.path.join(work_dir, 'seed.json')
+    print(f'Seeding CrossDomainKG with {users} users x {rows} rows...')
+    subprocess.run([sys.executable, os.path.join(HERE, 'seed_kg.py'), '--users', str(users),
+                    '--rows', str(rows), '--output', seed_file],
+                   cwd=KG_DIR, env=env, check=True, stdout=log, stderr=subprocess.STDOUT)
+
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'flask', '--app', 'app', 'run', '--port', str(port),
+         '--with-threads', '--no-reload', '--no-debugger'],
+        cwd=KG_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    base_url = f'http://127.0.0.1:{port}'
+    wait_until_up(base_url + '/login')
+    with open(seed_file) as f:
+        return process, base_url, json.load(f)['users']
+
+def start_api(work_dir, port, users, log):
+    """Start the FastAPI backend in its own directory (it keeps knowmap.db in the cwd) and sign users up"""
+    api_dir = os.path.join(work_dir, 'api')
+    os.makedirs(api_dir, exist_ok=True)
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--app-dir', API_DIR, '--port', str(port)],
+        cwd=api_dir, stdout=log, stderr=subprocess.STDOUT)
+    base_url = f'http://127.0.0.1:{port}'
+    wait_until_up(base_url + '/')
+
+    accounts = []
+    for i in range(users):
+        account = {'username': f'load{i}', 'password': 'loadtest123'}
+        requests.post(base_url + '/signup', json=account, timeout=30)
+        accounts.append(account)
+    return process, base_url, accounts
+
+def stop(process):
+    if process and process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+def upload_bytes(rng):
+    """A small healthcare CSV with random rows, so each upload has new content to process"""
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(HEALTHCARE_HEADER)
+    writer.writerows(healthcare_rows(UPLOAD_ROWS, rng))
+    return out.getvalue().encode('utf-8')
+
+class VirtualUser:
+    """One simulated client; subclasses define `mix` and a method per operation"""
+    mix = {}
+
+    def __init__(self, base_url, account, rng):
+        self.base_url = base_url
+        self.account = account
+        self.rng = rng
+        self.session = requests.Session()
+
+    def succeeded(self, operation, response):
+        return response.status_code < 400
+
+class KGUser(VirtualUser):
+    """Virtual user of the Flask app"""
+    mix = KG_MIX
+
+    def succeeded(self, operation, response):
+        # A failed form login re-renders the page with 200 instead of redirecting
+        if operation == 'login':
+            return response.status_code == 302
+        return super().succeeded(operation, response)
+
+    def login(self):
+        return self.session.post(self.base_url + '/login', allow_redirects=False,
+                                 data={'email': self.account['email'], 'password': self.account['password']})
+
+    def dashboard(self):
+        return self.session.get(self.base_url + '/dashboard', allow_redirects=False)
+
+    def graph(self):
+        dataset_id = self.rng.choice(self.account['dataset_ids'])
+        return self.session.get(f'{self.base_url}/api/graph/{dataset_id}', allow_redirects=False)
+
+    def search(self):
+        return self.session.post(self.base_url + '/search', allow_redirects=False, data={
+            'query': self.rng.choice(SEARCH_QUERIES),
+            'dataset_id': self.rng.choice(self.account['dataset_ids']),
+        })
+
+    def upload(self):
+        files = {'file': ('loadtest_upload.csv', upload_bytes(self.rng), 'text/csv')}
+        return self.session.post(self.base_url + '/upload', allow_redirects=False,
+                                 data={'domain': 'healthcare'}, files=files)
+
+class APIUser(VirtualUser):
+    """Virtual user of the FastAPI backend"""
+    mix = API_MIX
+
+    def login(self):
+        response = self.session.post(self.base_url + '/login', json=self.account)
+        if response.ok:
+            token = response.json().get('access_token', '')
+            self.session.headers['Authorization'] = f'Bearer {token}'
+        return response
+
+    def get_profile(self):
+        return self.session.get(f"{self.base_url}/get_profile/{self.account['username']}")
+
+    def save_profile(self):
+        interests = self.rng.sample(INTERESTS, self.rng.randint(1, 4))
+        return self.session.post(self.base_url + '/save_profile',
+                                 json={'username': self.account['username'], 'interests': interests})
+
+    def status(self):
+        return self.session.get(self.base_url + '/')
+
+def drive(user_class, base_url, accounts, concurrency, duration, seed):
+    """Run `concurrency` virtual users for `duration` seconds.
+
+    Returns ({operation: [(seconds, ok)]}, elapsed seconds).
+    """
+    results = [defaultdict(list) for _ in range(concurrency)]
+    deadline = time.perf_counter() + duration
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        user = user_class(base_url, accounts[index % len(accounts)], rng)
+        user.login()
+        operations, weights = zip(*user.mix.items())
+        while time.perf_counter() < deadline:
+            operation = rng.choices(operations, weights)[0]
+            start = time.perf_counter()
+            try:
+                ok = user.succeeded(operation, getattr(user, operation)())
+            except requests.RequestException:
+                ok = False
+            results[index][operation].append((time.perf_counter() - start, ok))
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    merged = defaultdict(list)
+    for per_thread in results:
+        for operation, samples in per_thread.items():
+            merged[operation].extend(samples)
+    return merged, elapsed
+
+def summarize(samples, elapsed):
+    """Latency percentiles in ms, throughput and error rate of a list of (seconds, ok)"""
+    latencies = sorted(seconds * 1000 for seconds, _ in samples)
+    errors = sum(1 for _, ok in samples if not ok)
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'error_rate': round(errors / len(samples), 4) if samples else 0.0,
+        'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else None,
+        'p50_ms': round(percentile(latencies, 50), 2) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95), 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99), 2) if latencies else None,
+    }
+
+def report(name, merged, elapsed):
+    """Print and return the per-operation and overall summary of one target"""
+    summary = {operation: summarize(samples, elapsed) for operation, samples in sorted(merged.items())}
+    summary['total'] = summarize([s for samples in merged.values() for s in samples], elapsed)
+
+    print(f'\n{name} ({elapsed:.1f}s)')
+    print(f'{"operation":<14}{"requests":>9}{"errors":>8}{"rps":>9}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}')
+    for operation, values in summary.items():
+        print(f'{operation:<14}{values["requests"]:>9}{values["errors"]:>8}'
+              f'{values["throughput_rps"] or 0:>9.1f}{values["p50_ms"] or 0:>10.1f}'
+              f'{values["p95_ms"] or 0:>10.1f}{values["p99_ms"] or 0:>10.1f}')
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--target', choices=['kg', 'api', 'both'], default='both')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30, help='seconds of load per target')
+    parser.add_argument('--users', type=int, default=5, help='seeded accounts shared by the virtual users')
+    parser.add_argument('--rows', type=int, default=200, help='rows per seeded dataset')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--kg-port', type=int, default=5055)
+    parser.add_argument('--api-port', type=int, default=8055)
+    parser.add_argument('--output', help='write JSON results to this file')
+    args = parser.parse_args()
+
+    results = {'concurrency': args.concurrency, 'duration': args.duration, 'targets': {}}
+    with tempfile.TemporaryDirectory(prefix='kg_load_') as work_dir, \
+            open(os.path.join(work_dir, 'services.log'), 'wb') as log:
+        processes = []
+        try:
+            if args.target in ('kg', 'both'):
+                process, base_url, accounts = start_kg(work_dir, args.kg_port, args.users, args.rows, log)
+                processes.append(process)
+                merged, elapsed = drive(KGUser, base_url, accounts, args.concurrency, args.duration, args.seed)
+                results['targets']['kg'] = report('CrossDomainKG', merged, elapsed)
+
+            if args.target in ('api', 'both'):
+                process, base_url, accounts = start_api(work_dir, args.api_port, args.users, log)
+                processes.append(process)
+                merged, elapsed = drive(APIUser, base_url, accounts, args.concurrency, args.duration, args.seed)
+                results['targets']['api'] = report('milestone 1 API', merged, elapsed)
+        except Exception:
+            log.flush()
+            with open(os.path.join(work_dir, 'services.log'), 'rb') as f:
+                sys.stderr.write(f.read().decode('utf-8', 'replace')[-4000:])
+            raise
+        finally:
+            for process in processes:
+                stop(process)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
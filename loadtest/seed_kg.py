@@ -0,0 +1,66 @@
+"""Seed a CrossDomainKG database for load tests.
+
+Creates load-test users, each owning a processed healthcare and AI dataset
+built from the benchmark corpus, and writes their credentials and dataset
+ids as JSON. The database and upload folder come from KG_DATABASE_URI and
+KG_UPLOAD_FOLDER, which loadtest.py points at a scratch directory.
+
+    python loadtest/seed_kg.py --users 5 --rows 200 --output seed.json
+"""
+import argparse
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+KG_DIR = os.path.join(ROOT, 'CrossDomainKG')
+sys.path.insert(0, KG_DIR)
+
+PASSWORD = 'loadtest123'
+DATASETS = (('healthcare', 'healthcare'), ('ai', 'technology'))
+
+def seed(users, rows, seed_value):
+    """Create the users and their processed datasets; returns the seed description"""
+    import app as kg
+    from benchmarks.corpus import generate_corpus
+
+    upload_folder = kg.app.config['UPLOAD_FOLDER']
+    seeded = []
+    with kg.app.app_context():
+        kg.init_db()
+        for i in range(users):
+            email = f'load{i}@example.com'
+            user = kg.User.query.filter_by(email=email).first()
+            if user is None:
+                user = kg.User(username=f'load{i}', email=email,
+                               password_hash=kg.generate_password_hash(PASSWORD))
+                kg.db.session.add(user)
+                kg.db.session.commit()
+
+            corpus = generate_corpus(os.path.join(upload_folder, f'loadtest_{i}'), rows, seed_value + i)
+            dataset_ids = []
+            for kind, domain in DATASETS:
+                dataset = kg.Dataset(name=os.path.basename(corpus[kind]), domain=domain,
+                                     filename=os.path.relpath(corpus[kind], upload_folder), user_id=user.id)
+                kg.db.session.add(dataset)
+                kg.db.session.commit()
+                kg.process_dataset(dataset.id, corpus[kind])
+                dataset_ids.append(dataset.id)
+
+            seeded.append({'email': email, 'password': PASSWORD, 'dataset_ids': dataset_ids})
+    return {'users': seeded}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=5)
+    parser.add_argument('--rows', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', required=True)
+    args = parser.parse_args()
+
+    result = seed(args.users, args.rows, args.seed)
+    with open(args.output, 'w') as f:
+        json.dump(result, f, indent=2)
+
+if __name__ == '__main__':
+    main()